@@ -0,0 +1,503 @@
+import asyncio
+import codecs
+import csv
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from collections import Counter
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import openpyxl
+
+from banco_parsers import Movimiento, get_spec, iter_filas
+
+logger = logging.getLogger(__name__)
+
+# Statement rows per chunk: each chunk is staged with COPY and committed with its checkpoint
+BANCO_IMPORT_CHUNK_ROWS = int(os.environ.get('BANCO_IMPORT_CHUNK_ROWS', '5000'))
+BANCO_IMPORT_CONCURRENCY = int(os.environ.get('BANCO_IMPORT_CONCURRENCY', '2'))
+# A running job without a checkpoint for this long is considered dead and can be resumed
+BANCO_IMPORT_STALE_MINUTES = int(os.environ.get('BANCO_IMPORT_STALE_MINUTES', '10'))
+# Row errors stored per job (the total is always counted)
+BANCO_IMPORT_MAX_ERRORES = 200
+# Uploads are spooled here and kept until their import job completes
+BANCO_IMPORT_DIR = os.environ.get('BANCO_IMPORT_DIR', os.path.join(tempfile.gettempdir(), 'finanzas_banco_import'))
+SPOOL_CHUNK_BYTES = 1024 * 1024
+# Jobs that own their file hash (uq_cont_banco_import_job_hash in database.py has the same predicate)
+_JOB_VIGENTE_SQL = "estado IN ('en_cola', 'ejecutando', 'completado')"
+# Movements are upserted ON CONFLICT against this index; create_schema skips it while
+# reconciled duplicates remain
+_CLAVE_INDEX = 'finanzas2.idx_cont_banco_mov_raw_clave'
+_CLAVES_DUPLICADAS_MOSTRADAS = 20
+
+# CSV/TXT statements: bytes sampled to detect encoding, delimiter or fixed-width columns
+TEXT_SAMPLE_BYTES = 64 * 1024
+DELIMITADORES = '\t;|,'
+
+
+async def spool_upload(file, directory: Optional[str] = None, digest=None) -> str:
+    """Copy an upload to a temporary file in fixed-size chunks, feeding `digest` if given; the caller deletes it"""
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=os.path.splitext(file.filename or '')[1] or '.xlsx', dir=directory)
+    with os.fdopen(fd, 'wb') as out:
+        while chunk := await file.read(SPOOL_CHUNK_BYTES):
+            out.write(chunk)
+            if digest is not None:
+                digest.update(chunk)
+    return path
+
+
+def iter_excel_rows(path: str) -> Iterator[tuple]:
+    """Stream the active sheet's rows as value tuples without loading the workbook"""
+    wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from wb.active.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def detect_encoding(sample: bytes) -> str:
+    """UTF-8/UTF-16 by BOM, UTF-8 if the sample decodes, else Windows-1252 (common in bank exports)"""
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    try:
+        sample.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut at the end of the sample is still UTF-8
+        if e.start < len(sample) - 3:
+            return 'cp1252'
+    return 'utf-8'
+
+
+def detect_delimiter(lines: Sequence[str]) -> Optional[str]:
+    """
+    Delimiter that splits most sample lines into the same number of fields.
+
+    Returns None when no candidate is consistent on at least half of the
+    lines, i.e. the file is fixed-width.
+    """
+    lines = [line for line in lines if line.strip()]
+    best, best_score = None, 0.5
+    for delimiter in DELIMITADORES:
+        # Field counts as csv reads them, so quoted delimiters do not count
+        counts = Counter(len(row) for row in csv.reader(lines, delimiter=delimiter))
+        n, freq = counts.most_common(1)[0] if counts else (1, 0)
+        if n > 1 and freq / len(lines) > best_score:
+            best, best_score = delimiter, freq / len(lines)
+    return best
+
+
+def infer_fixed_width(lines: Sequence[str]) -> List[Tuple[int, int]]:
+    """Column spans of a fixed-width sample, split where 2+ positions are blank on (almost) every line"""
+    lines = [line for line in lines if line.strip()]
+    width = max((len(line) for line in lines), default=0)
+    ocupadas = [0] * width
+    for line in lines:
+        for i, ch in enumerate(line):
+            if ch != ' ':
+                ocupadas[i] += 1
+    # Tolerate a few title/metadata lines running across column gaps
+    tolerancia = len(lines) // 50
+    spans, start = [], None
+    for i in range(width + 1):
+        ocupada = i < width and ocupadas[i] > tolerancia
+        if ocupada and start is None:
+            if spans and i - spans[-1][1] == 1:
+                # A single blank column is a space between words, not a column gap
+                start = spans.pop()[0]
+            else:
+                start = i
+        elif not ocupada and start is not None:
+            spans.append((start, i))
+            start = None
+    return spans
+
+
+def iter_text_rows(path: str, anchos: Sequence[int] = ()) -> Iterator[tuple]:
+    """
+    Stream a CSV/TXT statement as row tuples (stripped text, None for blanks).
+
+    Encoding and delimiter are detected from the first TEXT_SAMPLE_BYTES.
+    Files without a delimiter are read as fixed-width: column `anchos`
+    from the bank spec if given, otherwise spans inferred from the sample.
+    """
+    with open(path, 'rb') as f:
+        sample = f.read(TEXT_SAMPLE_BYTES)
+    encoding = detect_encoding(sample)
+    lines = sample.decode(encoding, errors='replace').splitlines()
+    if len(sample) == TEXT_SAMPLE_BYTES:
+        lines = lines[:-1]  # likely cut mid-line
+    delimiter = None if anchos else detect_delimiter(lines)
+
+    with open(path, encoding=encoding, errors='replace', newline='') as f:
+        if delimiter:
+            for row in csv.reader(f, delimiter=delimiter):
+                yield tuple(c.strip() or None for c in row)
+            return
+        if anchos:
+            bordes = [0]
+            for ancho in anchos:
+                bordes.append(bordes[-1] + ancho)
+            spans = list(zip(bordes, bordes[1:]))
+        else:
+            spans = infer_fixed_width(lines)
+        for line in f:
+            line = line.rstrip('\r\n')
+            yield tuple(line[a:b].strip() or None for a, b in spans)
+
+
+def es_excel(path: str) -> bool:
+    """True for .xlsx workbooks (by content); ValueError for legacy .xls, which cannot be streamed"""
+    with open(path, 'rb') as f:
+        magic = f.read(8)
+    if magic.startswith(b'\xd0\xcf\x11\xe0'):
+        raise ValueError("Formato .xls no soportado: guarde el archivo como .xlsx o .csv")
+    return magic.startswith(b'PK')
+
+
+def iter_statement_rows(path: str, banco: str) -> Iterator[tuple]:
+    """Rows of a statement file: .xlsx workbooks by content, anything else as CSV/TXT"""
+    if es_excel(path):
+        return iter_excel_rows(path)
+    return iter_text_rows(path, get_spec(banco).anchos)
+
+
+# One statement per chunk: the last occurrence of a key wins (as the
+# row-by-row import did), reconciled rows are never touched. Only the rows
+# actually written (RETURNING) get their fingerprint recorded, so a row
+# skipped as procesado is still merged if a later upload brings it again.
+_MERGE_STAGING_SQL = """
+    WITH written AS (
+        INSERT INTO finanzas2.cont_banco_mov_raw
+            (cuenta_financiera_id, banco, fecha, descripcion, referencia, monto, banco_excel, procesado, empresa_id,
+             import_job_id)
+        SELECT DISTINCT ON (COALESCE(s.referencia, ''), s.fecha)
+            $1::int, $2::varchar, s.fecha, s.descripcion, NULLIF(s.referencia, ''), s.monto, $2::varchar, FALSE,
+            $3::int, $4::int
+        FROM tmp_banco_mov s
+        ORDER BY COALESCE(s.referencia, ''), s.fecha, s.fila DESC
+        ON CONFLICT (cuenta_financiera_id, banco, (COALESCE(referencia, '')), fecha) DO UPDATE SET
+            descripcion = EXCLUDED.descripcion,
+            monto = EXCLUDED.monto,
+            banco_excel = EXCLUDED.banco_excel,
+            import_job_id = EXCLUDED.import_job_id
+        WHERE cont_banco_mov_raw.procesado IS NOT TRUE
+        RETURNING (xmax = 0) AS inserted, COALESCE(referencia, '') AS referencia, fecha
+    ), huellas AS (
+        INSERT INTO finanzas2.cont_banco_import_huella (cuenta_financiera_id, banco, huella, import_job_id)
+        SELECT DISTINCT ON (w.referencia, w.fecha) $1::int, $2::varchar, s.huella, $4::int
+        FROM written w
+        JOIN tmp_banco_mov s ON COALESCE(s.referencia, '') = w.referencia AND s.fecha = w.fecha
+        ORDER BY w.referencia, w.fecha, s.fila DESC
+        ON CONFLICT DO NOTHING
+    )
+    SELECT inserted FROM written
+"""
+
+
+def huella_movimiento(mov: Movimiento) -> int:
+    """64-bit fingerprint of a movement's content (signed, to fit a BIGINT)"""
+    fecha, descripcion, referencia, monto = mov
+    clave = f"{fecha.isoformat()}|{descripcion}|{referencia}|{monto:.2f}".encode()
+    return int.from_bytes(hashlib.blake2b(clave, digest_size=8).digest(), 'big', signed=True)
+
+
+def iter_chunks(path: str, banco: str, desde_fila: int = 0,
+                chunk_rows: int = BANCO_IMPORT_CHUNK_ROWS) -> Iterator[Dict[str, Any]]:
+    """
+    Parse a statement in chunks of `chunk_rows` data rows, skipping rows up to `desde_fila`.
+
+    Each chunk carries its movements as (fila, fecha, descripcion, referencia,
+    monto) records with their content fingerprints, its row errors, the number
+    of rows read and the last file row, which is the checkpoint to resume from
+    once the chunk is stored.
+    """
+    filas = (f for f in iter_filas(iter_statement_rows(path, banco), banco) if f[0] > desde_fila)
+    while True:
+        chunk = list(islice(filas, chunk_rows))
+        if not chunk:
+            return
+        yield {
+            "movimientos": [(fila, *mov) for fila, mov, _ in chunk if mov],
+            "huellas": [huella_movimiento(mov) for _, mov, _ in chunk if mov],
+            "errores": [{"fila": fila, "error": error} for fila, _, error in chunk if error],
+            "filas": len(chunk),
+            "ultima_fila": chunk[-1][0],
+        }
+
+
+def contar_filas(path: str) -> Optional[int]:
+    """Cheap row count for progress: the sheet dimension of a workbook, the line count of a text file"""
+    if es_excel(path):
+        wb = openpyxl.load_workbook(path, read_only=True)
+        try:
+            return wb.active.max_row
+        finally:
+            wb.close()
+    with open(path, 'rb') as f:
+        lineas, ultimo = 0, b''
+        while block := f.read(SPOOL_CHUNK_BYTES):
+            lineas += block.count(b'\n')
+            ultimo = block[-1:]
+        return lineas + (1 if ultimo and ultimo != b'\n' else 0)
+
+
+async def merge_chunk(conn, movimientos: Sequence[tuple], huellas: Sequence[int], cuenta_financiera_id: int,
+                      banco: str, empresa_id: int, import_job_id: int) -> Dict[str, int]:
+    """
+    Store the movements of one chunk not seen before in cont_banco_mov_raw.
+
+    Fingerprints already recorded for the account and bank (rows of an
+    earlier, overlapping upload) are dropped first and counted as repeated.
+    The remaining (fila, fecha, descripcion, referencia, monto) records are
+    COPY-staged with their fingerprints and merged with one INSERT ... ON
+    CONFLICT keyed on (cuenta, banco, referencia, fecha), linked to the
+    import job that wrote them; the fingerprints of the rows written are
+    recorded in the same statement. Must run inside a transaction.
+    """
+    vistas = {r['huella'] for r in await conn.fetch("""
+        SELECT huella FROM finanzas2.cont_banco_import_huella
+        WHERE cuenta_financiera_id = $1 AND banco = $2 AND huella = ANY($3::bigint[])
+    """, cuenta_financiera_id, banco, list(set(huellas)))} if huellas else set()
+    movimientos = [(*m, h) for m, h in zip(movimientos, huellas) if h not in vistas]
+    repetidos = len(huellas) - len(movimientos)
+    if not movimientos:
+        return {"imported": 0, "updated": 0, "skipped": 0, "repetidos": repetidos}
+    await conn.execute("""
+        CREATE TEMP TABLE tmp_banco_mov (
+            fila INTEGER, fecha DATE, descripcion TEXT, referencia TEXT, monto NUMERIC(15, 2), huella BIGINT
+        ) ON COMMIT DROP
+    """)
+    await conn.copy_records_to_table('tmp_banco_mov', records=movimientos,
+                                     columns=['fila', 'fecha', 'descripcion', 'referencia', 'monto', 'huella'])
+    written = await conn.fetch(_MERGE_STAGING_SQL, cuenta_financiera_id, banco, empresa_id, import_job_id)
+    distintos = len({(m[3] or '', m[1]) for m in movimientos})
+    imported = sum(1 for r in written if r['inserted'])
+    # Rows repeated within the chunk count as updates of their first occurrence
+    return {
+        "imported": imported,
+        "updated": len(written) - imported + (len(movimientos) - distintos),
+        "skipped": distintos - len(written),
+        "repetidos": repetidos,
+    }
+
+
+async def assert_clave_index(conn, empresa_id: int):
+    """Fail with the empresa's duplicate movement keys while idx_cont_banco_mov_raw_clave is missing"""
+    if await conn.fetchval(f"SELECT to_regclass('{_CLAVE_INDEX}')"):
+        return
+    claves = await conn.fetch("""
+        SELECT cf.nombre AS cuenta, r.banco, COALESCE(r.referencia, '') AS referencia, r.fecha, COUNT(*) AS n
+        FROM finanzas2.cont_banco_mov_raw r
+        LEFT JOIN finanzas2.cont_cuenta_financiera cf ON cf.id = r.cuenta_financiera_id
+        WHERE r.empresa_id = $1 AND r.cuenta_financiera_id IS NOT NULL AND r.banco IS NOT NULL AND r.fecha IS NOT NULL
+        GROUP BY cf.nombre, r.cuenta_financiera_id, r.banco, COALESCE(r.referencia, ''), r.fecha
+        HAVING COUNT(*) > 1
+        ORDER BY r.fecha, r.banco
+        LIMIT $2
+    """, empresa_id, _CLAVES_DUPLICADAS_MOSTRADAS)
+    detalle = "; ".join(f"{c['cuenta']} {c['banco']} {c['referencia'] or '(sin referencia)'} {c['fecha']} x{c['n']}"
+                        for c in claves)
+    raise ValueError("La importación bancaria está deshabilitada: hay movimientos conciliados duplicados "
+                     "(cuenta, banco, referencia, fecha). Deshaga la conciliación de los duplicados y reinicie "
+                     f"el servidor para crear el índice. Duplicados: {detalle or 'en otras empresas'}")
+
+
+def import_job_to_dict(row) -> Dict[str, Any]:
+    job = dict(row)
+    job.pop('ruta', None)
+    job['stats'] = json.loads(job['stats']) if job.get('stats') else {}
+    job['errores'] = json.loads(job['errores']) if job.get('errores') else []
+    total = job.get('total_filas')
+    job['progreso'] = 100.0 if job['estado'] == 'completado' else (
+        round(min(job['fila_checkpoint'] / total, 1) * 100, 1) if total else None)
+    return job
+
+
+class BancoImportScheduler:
+    """
+    Runs bank statement imports as background jobs tracked in cont_banco_import_job.
+    Each job is one import batch: it records the file's content hash, the
+    fingerprints of the rows it stored (cont_banco_import_huella) and is
+    linked from the movements it wrote.
+
+    Every chunk is merged and its checkpoint (last file row stored) written in
+    one transaction on a connection taken for that chunk only, so a failed or
+    interrupted job keeps what it committed and resumes after its checkpoint.
+    Jobs left 'en_cola' or stale 'ejecutando' by a restart are resumed at startup;
+    the spooled file is kept until the job completes.
+    """
+
+    def __init__(self):
+        self._tasks = set()
+        self._slots = asyncio.Semaphore(BANCO_IMPORT_CONCURRENCY)
+
+    def _spawn(self, pool, job_id: int):
+        task = asyncio.create_task(self._run_job(pool, job_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def start_job(self, pool, path: str, archivo: str, archivo_hash: str, cuenta_financiera_id: int,
+                        banco: str, empresa_id: int, chunk_filas: int = BANCO_IMPORT_CHUNK_ROWS) -> Dict[str, Any]:
+        """
+        Queue the import of a spooled file (the job takes ownership of it) and return the job.
+
+        A file whose content hash was already imported, or is being imported,
+        into the same account and bank is not processed again: the existing
+        job is returned with `duplicado` set and the spooled file is deleted.
+        A partial unique index on the hash of live jobs settles concurrent uploads.
+        Raises ValueError listing the empresa's duplicate movement keys while the
+        movement key index is missing.
+        """
+        async with pool.acquire() as conn:
+            await assert_clave_index(conn, empresa_id)
+        total = await asyncio.to_thread(contar_filas, path)
+        async with pool.acquire() as conn:
+            job = await conn.fetchrow(f"""
+                INSERT INTO finanzas2.cont_banco_import_job
+                    (empresa_id, cuenta_financiera_id, banco, archivo, archivo_hash, ruta, chunk_filas, total_filas)
+                VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+                ON CONFLICT (empresa_id, cuenta_financiera_id, banco, archivo_hash) WHERE {_JOB_VIGENTE_SQL}
+                DO NOTHING
+                RETURNING *
+            """, empresa_id, cuenta_financiera_id, banco, archivo, archivo_hash, path, chunk_filas, total)
+            if not job:
+                previo = await conn.fetchrow(f"""
+                    SELECT * FROM finanzas2.cont_banco_import_job
+                    WHERE empresa_id = $1 AND cuenta_financiera_id = $2 AND banco = $3 AND archivo_hash = $4
+                      AND {_JOB_VIGENTE_SQL}
+                """, empresa_id, cuenta_financiera_id, banco, archivo_hash)
+        if not job:
+            os.unlink(path)
+            return {**import_job_to_dict(previo), "duplicado": True}
+        self._spawn(pool, job['id'])
+        return {**import_job_to_dict(job), "duplicado": False}
+
+    async def resume_job(self, pool, job_id: int, empresa_id: int) -> Optional[Dict[str, Any]]:
+        """Re-queue a failed (or dead) job from its checkpoint; None if there is no such job"""
+        async with pool.acquire() as conn:
+            # A failed job is not revived while another job holds its file hash
+            job = await conn.fetchrow(f"""
+                UPDATE finanzas2.cont_banco_import_job j
+                SET estado = 'en_cola', error = NULL, finished_at = NULL, updated_at = NOW()
+                WHERE id = $1 AND empresa_id = $2 AND (estado = 'error'
+                    OR (estado = 'ejecutando' AND updated_at < NOW() - make_interval(mins => $3)))
+                  AND NOT EXISTS (
+                    SELECT 1 FROM finanzas2.cont_banco_import_job o
+                    WHERE o.id <> j.id AND o.empresa_id = j.empresa_id AND o.cuenta_financiera_id = j.cuenta_financiera_id
+                      AND o.banco = j.banco AND o.archivo_hash = j.archivo_hash AND o.{_JOB_VIGENTE_SQL})
+                RETURNING *
+            """, job_id, empresa_id, BANCO_IMPORT_STALE_MINUTES)
+            if not job:
+                job = await conn.fetchrow("""
+                    SELECT * FROM finanzas2.cont_banco_import_job WHERE id = $1 AND empresa_id = $2
+                """, job_id, empresa_id)
+                return import_job_to_dict(job) if job else None
+        self._spawn(pool, job_id)
+        return import_job_to_dict(job)
+
+    async def resume_pending(self, pool):
+        """Resume jobs interrupted by a shutdown (queued, or running without a recent checkpoint)"""
+        async with pool.acquire() as conn:
+            rows = await conn.fetch("""
+                SELECT id FROM finanzas2.cont_banco_import_job
+                WHERE estado = 'en_cola'
+                   OR (estado = 'ejecutando' AND updated_at < NOW() - make_interval(mins => $1))
+                ORDER BY id
+            """, BANCO_IMPORT_STALE_MINUTES)
+        for row in rows:
+            self._spawn(pool, row['id'])
+        if rows:
+            logger.info(f"Resuming {len(rows)} bank import jobs")
+
+    async def _claim(self, pool, job_id: int):
+        async with pool.acquire() as conn:
+            return await conn.fetchrow("""
+                UPDATE finanzas2.cont_banco_import_job
+                SET estado = 'ejecutando', started_at = COALESCE(started_at, NOW()), updated_at = NOW()
+                WHERE id = $1 AND (estado = 'en_cola'
+                    OR (estado = 'ejecutando' AND updated_at < NOW() - make_interval(mins => $2)))
+                RETURNING *
+            """, job_id, BANCO_IMPORT_STALE_MINUTES)
+
+    async def _run_job(self, pool, job_id: int):
+        async with self._slots:
+            job = await self._claim(pool, job_id)
+            if not job:
+                return  # already taken by another worker
+            try:
+                await self._importar(pool, job)
+            except asyncio.CancelledError:
+                # Shutdown: back to the queue, resumed from the checkpoint at the next startup
+                async with pool.acquire() as conn:
+                    await conn.execute("""
+                        UPDATE finanzas2.cont_banco_import_job SET estado = 'en_cola', updated_at = NOW() WHERE id = $1
+                    """, job_id)
+                raise
+            except Exception as e:
+                logger.error(f"Bank import job {job_id} failed: {e}")
+                async with pool.acquire() as conn:
+                    await conn.execute("""
+                        UPDATE finanzas2.cont_banco_import_job
+                        SET estado = 'error', error = $2, finished_at = NOW(), updated_at = NOW()
+                        WHERE id = $1
+                    """, job_id, str(e))
+                return
+            try:
+                os.unlink(job['ruta'])
+            except OSError:
+                pass
+
+    async def _importar(self, pool, job):
+        stats = {"imported": 0, "updated": 0, "skipped": 0, "repetidos": 0, "errores": 0,
+                 **(json.loads(job['stats']) if job['stats'] else {})}
+        chunks = iter_chunks(job['ruta'], job['banco'], job['fila_checkpoint'], job['chunk_filas'])
+        await self._store_chunks(pool, job, chunks, stats)
+        async with pool.acquire() as conn:
+            await conn.execute("""
+                UPDATE finanzas2.cont_banco_import_job
+                SET estado = 'completado', stats = $2::jsonb, finished_at = NOW(), updated_at = NOW()
+                WHERE id = $1
+            """, job['id'], json.dumps(stats))
+        logger.info(f"Bank import job {job['id']} completed: {stats}")
+
+    async def _store_chunks(self, pool, job, chunks: Iterator[Dict[str, Any]], stats: Dict[str, int]):
+        """Parse chunks in a worker thread; merge each with its checkpoint in one transaction"""
+        while chunk := await asyncio.to_thread(next, chunks, None):
+            # Row errors beyond the cap are only counted
+            errores = chunk['errores'][:max(BANCO_IMPORT_MAX_ERRORES - stats['errores'], 0)]
+            async with pool.acquire() as conn, conn.transaction():
+                counts = await merge_chunk(conn, chunk['movimientos'], chunk['huellas'], job['cuenta_financiera_id'],
+                                           job['banco'], job['empresa_id'], job['id'])
+                for key, n in counts.items():
+                    stats[key] += n
+                stats['errores'] += len(chunk['errores'])
+                await conn.execute("""
+                    UPDATE finanzas2.cont_banco_import_job
+                    SET fila_checkpoint = $2, filas_procesadas = filas_procesadas + $3, stats = $4::jsonb,
+                        errores = COALESCE(errores, '[]'::jsonb) || $5::jsonb, updated_at = NOW()
+                    WHERE id = $1
+                """, job['id'], chunk['ultima_fila'], chunk['filas'], json.dumps(stats),
+                    json.dumps(errores, default=str))
+
+    async def status(self, pool, job_id: int, empresa_id: int) -> Optional[Dict[str, Any]]:
+        async with pool.acquire() as conn:
+            job = await conn.fetchrow("""
+                SELECT * FROM finanzas2.cont_banco_import_job WHERE id = $1 AND empresa_id = $2
+            """, job_id, empresa_id)
+        return import_job_to_dict(job) if job else None
+
+    async def stop(self):
+        """Cancel running jobs; they resume from their checkpoint on the next startup"""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+banco_import_jobs = BancoImportScheduler()
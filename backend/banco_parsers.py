@@ -0,0 +1,203 @@
+import logging
+from datetime import date, datetime
+from functools import lru_cache
+from itertools import chain, islice
+from typing import Callable, Dict, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+HEADER_SCAN_ROWS = 10
+FORMATOS_FECHA = ('%d/%m/%Y', '%d-%m-%Y', '%Y-%m-%d', '%d.%m.%Y', '%Y-%m-%d %H:%M:%S', '%d/%m/%Y %H:%M:%S', '%Y%m%d')
+
+Movimiento = Tuple[date, str, str, float]   # fecha, descripcion, referencia, monto
+RowParser = Callable[[tuple], Optional[Movimiento]]
+
+
+class BancoSpec(NamedTuple):
+    """
+    Column layout of one bank's statement (0-based column indexes).
+
+    The amount is either one signed `monto` column or a `cargo` (money out)
+    / `abono` (money in) pair. `numero` marks layouts whose data rows start
+    with an integer; `excluir` lists (column, text) pairs that flag summary
+    rows such as "Saldo Final". `anchos` gives the field widths of the
+    bank's fixed-width TXT export; without it they are inferred from the file.
+    """
+    fecha: int
+    descripcion: int
+    referencia: int
+    monto: Optional[int] = None
+    cargo: Optional[int] = None
+    abono: Optional[int] = None
+    numero: Optional[int] = None
+    min_columnas: int = 0
+    excluir: Tuple[Tuple[int, str], ...] = ()
+    anchos: Tuple[int, ...] = ()
+
+
+BANCOS: Dict[str, BancoSpec] = {
+    # Nº, Fecha, Fecha valuta, Descripción operación, Monto, Saldo, Sucursal, Operación-Número
+    'BCP': BancoSpec(fecha=1, descripcion=3, referencia=7, monto=4),
+    # N°, F. Operación, F. Valor, Código, Nº. Doc., Concepto, Importe, Oficina
+    'BBVA': BancoSpec(fecha=1, descripcion=5, referencia=4, monto=6, excluir=((5, 'saldo final'),)),
+    # Nº, Fecha de operación, Fecha de proceso, Nro. de operación, Movimiento,
+    # Descripción, Canal, Cargo, Abono, Saldo contable (after ~13 metadata rows)
+    'IBK': BancoSpec(fecha=1, descripcion=5, referencia=3, cargo=7, abono=8, numero=0, min_columnas=10),
+    # Fecha, Descripción, Referencia, Monto
+    'PERSONALIZADO': BancoSpec(fecha=0, descripcion=1, referencia=2, monto=3),
+}
+BANCO_DEFAULT = 'PERSONALIZADO'
+
+
+def parse_monto(value) -> Optional[float]:
+    """Amount cell to float: numbers as is, text without thousands separators; blanks are None"""
+    t = type(value)
+    if t is float or t is int:
+        return float(value)
+    if value is None:
+        return None
+    text = str(value).strip()
+    if not text or text == 'nan':
+        return None
+    return float(text.replace(',', ''))
+
+
+@lru_cache(maxsize=4096)
+def _fecha_texto(text: str) -> Optional[date]:
+    for fmt in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_fecha(value) -> Optional[date]:
+    """Date cell (datetime, date or d/m/Y-style text) to date; None if unrecognised"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str):
+        return _fecha_texto(value.strip())
+    return None
+
+
+def compile_spec(spec: BancoSpec) -> RowParser:
+    """Build the row -> Movimiento function of a layout; all spec lookups happen here, once"""
+    i_fecha, i_desc, i_ref = spec.fecha, spec.descripcion, spec.referencia
+    i_monto, i_cargo, i_abono, i_numero = spec.monto, spec.cargo, spec.abono, spec.numero
+    excluir = spec.excluir
+    # Short rows are padded so every used column can be indexed directly
+    width = max(i for i in (i_fecha, i_desc, i_ref, i_monto, i_cargo, i_abono, i_numero) if i is not None) + 1
+    min_columnas = spec.min_columnas
+    padding = (None,) * width
+
+    def parse(row: tuple) -> Optional[Movimiento]:
+        if not row or len(row) < min_columnas:
+            return None
+        if len(row) < width:
+            row = tuple(row) + padding[len(row):]
+        for col, texto in excluir:
+            if row[col] and texto in str(row[col]).lower():
+                return None
+        if i_numero is not None:
+            try:
+                if not int(row[i_numero]):
+                    return None
+            except (ValueError, TypeError):
+                return None
+
+        if i_monto is not None:
+            monto = parse_monto(row[i_monto]) if row[i_monto] else None
+        else:
+            cargo, abono = parse_monto(row[i_cargo]), parse_monto(row[i_abono])
+            monto = -abs(cargo) if cargo else (abs(abono) if abono else None)
+        if monto is None:
+            return None
+        fecha = parse_fecha(row[i_fecha])
+        if fecha is None:
+            return None
+        desc, ref = row[i_desc], row[i_ref]
+        return (fecha,
+                str(desc).strip()[:500] if desc else '',
+                str(ref).strip()[:200] if ref else '',
+                monto)
+
+    return parse
+
+
+_compiled: Dict[str, RowParser] = {}
+
+
+def register_banco(nombre: str, spec: BancoSpec):
+    """Add or replace a bank layout"""
+    BANCOS[nombre] = spec
+    _compiled.pop(nombre, None)
+
+
+def unregister_banco(nombre: str):
+    """Remove a bank layout added with register_banco"""
+    BANCOS.pop(nombre, None)
+    _compiled.pop(nombre, None)
+
+
+def get_spec(banco: str) -> BancoSpec:
+    return BANCOS.get(banco, BANCOS[BANCO_DEFAULT])
+
+
+def get_parser(banco: str) -> RowParser:
+    """Compiled row parser of a bank; unknown banks use the PERSONALIZADO layout"""
+    nombre = banco if banco in BANCOS else BANCO_DEFAULT
+    if nombre not in _compiled:
+        _compiled[nombre] = compile_spec(BANCOS[nombre])
+    return _compiled[nombre]
+
+
+def parse_movimiento(banco: str, row: tuple) -> Optional[Movimiento]:
+    return get_parser(banco)(row)
+
+
+def _is_header(row) -> bool:
+    if not row or not any(row):
+        return False
+    row_str = ' '.join(str(c or '') for c in row).lower()
+    return 'fecha' in row_str or 'f. valor' in row_str or 'f. operación' in row_str
+
+
+def _split_header(rows: Iterable[tuple]) -> Tuple[int, Iterator[tuple]]:
+    """0-based index of the first data row, and an iterator over the data rows"""
+    rows = iter(rows)
+    head = list(islice(rows, HEADER_SCAN_ROWS))
+    header = next((i for i, row in enumerate(head) if _is_header(row)), 0)
+    return header + 1, chain(head[header + 1:], rows)
+
+
+def iter_data_rows(rows: Iterable[tuple]) -> Iterator[tuple]:
+    """Skip everything up to the header row (searched in the first rows; row 1 if none)"""
+    return _split_header(rows)[1]
+
+
+def iter_filas(rows: Iterable[tuple], banco: str) -> Iterator[Tuple[int, Optional[Movimiento], Optional[str]]]:
+    """
+    (fila, movimiento, error) for every data row; fila is the 1-based row of the file.
+
+    Rows that are not movements (blanks, totals) give (fila, None, None);
+    rows that fail to parse give (fila, None, error message).
+    """
+    parse = get_parser(banco)
+    start, data = _split_header(rows)
+    for fila, row in enumerate(data, start=start + 1):
+        try:
+            yield fila, parse(row), None
+        except Exception as row_error:
+            yield fila, None, str(row_error)
+
+
+def iter_movimientos(rows: Iterable[tuple], banco: str) -> Iterator[Movimiento]:
+    """Parsed movements of a statement; rows that fail to parse are logged and skipped"""
+    for fila, mov, error in iter_filas(rows, banco):
+        if error:
+            logger.warning(f"Error parsing row {fila}: {error}")
+        elif mov:
+            yield mov
@@ -0,0 +1,237 @@
+import logging
+import os
+import re
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import date, timedelta
+from difflib import SequenceMatcher
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Days a bank movement may lie before/after the payment it settles
+CONCILIACION_VENTANA_DIAS = int(os.environ.get('CONCILIACION_VENTANA_DIAS', '5'))
+# Proposals at or above this score are accepted by "accept all"
+CONCILIACION_SCORE_MINIMO = float(os.environ.get('CONCILIACION_SCORE_MINIMO', '0.8'))
+
+PESO_REFERENCIA = 0.6
+PESO_FECHA = 0.4
+
+
+class MovBanco(NamedTuple):
+    id: int
+    fecha: date
+    monto: float          # abono > 0, cargo < 0
+    referencia: str
+    descripcion: str
+
+
+class PagoSistema(NamedTuple):
+    id: int
+    fecha: date
+    monto: float          # ingreso > 0, egreso < 0
+    referencia: str
+    numero: str
+
+
+class Propuesta(NamedTuple):
+    banco: MovBanco
+    pago: PagoSistema
+    score: float
+    similitud_referencia: float
+    dias: int
+
+
+def _centimos(monto) -> int:
+    return int(round(float(monto) * 100))
+
+
+_NO_ALFANUM = re.compile(r'[^0-9A-Z]')
+
+
+def normalizar_referencia(texto: Optional[str]) -> str:
+    """Upper-case alphanumerics only, numbers without leading zeros ("Op. 000123" -> "OP123")"""
+    norm = _NO_ALFANUM.sub('', (texto or '').upper())
+    return norm.lstrip('0') if norm.isdigit() else norm
+
+
+def similitud_referencia(banco_ref: str, banco_desc: str, pago_refs: Iterable[str]) -> float:
+    """
+    0..1 similarity between a bank movement and a payment's references.
+
+    Inputs are normalised. Equal references score 1; one contained in the
+    other 0.8; a payment reference found in the bank description 0.7;
+    otherwise a scaled character similarity of the references.
+    """
+    best = 0.0
+    for ref in pago_refs:
+        if len(ref) < 3:
+            continue
+        if banco_ref and ref == banco_ref:
+            return 1.0
+        if banco_ref and min(len(ref), len(banco_ref)) >= 4 and (ref in banco_ref or banco_ref in ref):
+            best = max(best, 0.8)
+        elif ref in banco_desc:
+            best = max(best, 0.7)
+        elif banco_ref and best < 0.5:
+            best = max(best, 0.5 * SequenceMatcher(None, banco_ref, ref).ratio())
+    return best
+
+
+def proponer_conciliacion(movimientos: Sequence[MovBanco], pagos: Sequence[PagoSistema],
+                          ventana_dias: int = CONCILIACION_VENTANA_DIAS) -> List[Propuesta]:
+    """
+    Pair unreconciled bank movements with unreconciled payments, best first.
+
+    Candidates must have the same signed amount (to the cent) and dates at
+    most `ventana_dias` apart. Payments are bucketed by amount and sorted by
+    date within a bucket, so each movement only looks at a bisected date
+    window of its bucket instead of scanning every payment. Candidates are
+    scored by reference similarity and date distance and assigned greedily,
+    each movement and payment at most once.
+    """
+    buckets: Dict[int, List[Tuple[int, PagoSistema]]] = defaultdict(list)
+    for pago in pagos:
+        buckets[_centimos(pago.monto)].append((pago.fecha.toordinal(), pago))
+    for bucket in buckets.values():
+        bucket.sort(key=lambda item: item[0])
+    fechas = {cents: [ordinal for ordinal, _ in bucket] for cents, bucket in buckets.items()}
+    pago_refs = {p.id: [r for r in (normalizar_referencia(p.referencia), normalizar_referencia(p.numero)) if r]
+                 for p in pagos}
+
+    candidatos: List[Propuesta] = []
+    for mov in movimientos:
+        cents = _centimos(mov.monto)
+        bucket = buckets.get(cents)
+        if not bucket:
+            continue
+        dia = mov.fecha.toordinal()
+        lo = bisect_left(fechas[cents], dia - ventana_dias)
+        hi = bisect_right(fechas[cents], dia + ventana_dias)
+        if lo == hi:
+            continue
+        banco_ref = normalizar_referencia(mov.referencia)
+        banco_desc = normalizar_referencia(mov.descripcion)
+        for ordinal, pago in bucket[lo:hi]:
+            dias = abs(dia - ordinal)
+            ref = similitud_referencia(banco_ref, banco_desc, pago_refs[pago.id])
+            score = PESO_REFERENCIA * ref + PESO_FECHA * (1 - dias / (ventana_dias + 1))
+            candidatos.append(Propuesta(mov, pago, round(score, 4), round(ref, 4), dias))
+
+    candidatos.sort(key=lambda p: (-p.score, p.dias, p.banco.id, p.pago.id))
+    usados_banco, usados_pago, propuestas = set(), set(), []
+    for prop in candidatos:
+        if prop.banco.id in usados_banco or prop.pago.id in usados_pago:
+            continue
+        usados_banco.add(prop.banco.id)
+        usados_pago.add(prop.pago.id)
+        propuestas.append(prop)
+    return propuestas
+
+
+def confianza(score: float) -> str:
+    if score >= CONCILIACION_SCORE_MINIMO:
+        return 'alta'
+    return 'media' if score >= 0.5 else 'baja'
+
+
+def propuesta_to_dict(prop: Propuesta) -> Dict[str, Any]:
+    return {
+        "banco_id": prop.banco.id,
+        "pago_id": prop.pago.id,
+        "score": prop.score,
+        "confianza": confianza(prop.score),
+        "similitud_referencia": prop.similitud_referencia,
+        "dias": prop.dias,
+        "monto": prop.banco.monto,
+        "fecha_banco": prop.banco.fecha,
+        "fecha_pago": prop.pago.fecha,
+        "referencia_banco": prop.banco.referencia,
+        "descripcion_banco": prop.banco.descripcion,
+        "referencia_pago": prop.pago.referencia,
+        "numero_pago": prop.pago.numero,
+    }
+
+
+async def cargar_pendientes(conn, empresa_id: int, cuenta_financiera_id: int, fecha_desde: Optional[date] = None,
+                            fecha_hasta: Optional[date] = None,
+                            ventana_dias: int = CONCILIACION_VENTANA_DIAS) -> Tuple[List[MovBanco], List[PagoSistema]]:
+    """Unreconciled bank movements and payments of one account (payments with the date window margin)"""
+    movs = await conn.fetch("""
+        SELECT id, fecha, monto, COALESCE(referencia, '') AS referencia, COALESCE(descripcion, '') AS descripcion
+        FROM finanzas2.cont_banco_mov_raw
+        WHERE empresa_id = $1 AND cuenta_financiera_id = $2
+          AND procesado IS NOT TRUE AND conciliado IS NOT TRUE
+          AND monto IS NOT NULL AND fecha IS NOT NULL
+          AND ($3::date IS NULL OR fecha >= $3::date)
+          AND ($4::date IS NULL OR fecha <= $4::date)
+    """, empresa_id, cuenta_financiera_id, fecha_desde, fecha_hasta)
+    margen = timedelta(days=ventana_dias)
+    pagos = await conn.fetch("""
+        SELECT id, fecha, CASE WHEN tipo = 'egreso' THEN -monto_total ELSE monto_total END AS monto,
+               COALESCE(referencia, '') AS referencia, COALESCE(numero, '') AS numero
+        FROM finanzas2.cont_pago
+        WHERE empresa_id = $1 AND cuenta_financiera_id = $2
+          AND conciliado IS NOT TRUE AND fecha IS NOT NULL
+          AND ($3::date IS NULL OR fecha >= $3::date)
+          AND ($4::date IS NULL OR fecha <= $4::date)
+    """, empresa_id, cuenta_financiera_id,
+        fecha_desde - margen if fecha_desde else None, fecha_hasta + margen if fecha_hasta else None)
+    return ([MovBanco(r['id'], r['fecha'], float(r['monto']), r['referencia'], r['descripcion']) for r in movs],
+            [PagoSistema(r['id'], r['fecha'], float(r['monto']), r['referencia'], r['numero']) for r in pagos])
+
+
+async def aceptar_pares(conn, empresa_id: int, cuenta_financiera_id: int,
+                        pares: Sequence[Tuple[int, int]]) -> Dict[str, Any]:
+    """
+    Reconcile (banco_id, pago_id) pairs in one conciliacion, set-based.
+
+    Both sides are locked and re-checked: pairs whose movement or payment is
+    already reconciled, or belongs to another account, are skipped. Must run
+    inside a transaction.
+    """
+    banco_ids = [b for b, _ in pares]
+    pago_ids = [p for _, p in pares]
+    bancos_libres = {r['id']: r['monto'] for r in await conn.fetch("""
+        SELECT id, monto FROM finanzas2.cont_banco_mov_raw
+        WHERE id = ANY($1::int[]) AND empresa_id = $2 AND cuenta_financiera_id = $3
+          AND procesado IS NOT TRUE AND conciliado IS NOT TRUE
+        FOR UPDATE
+    """, banco_ids, empresa_id, cuenta_financiera_id)}
+    pagos_libres = {r['id']: r['monto_total'] for r in await conn.fetch("""
+        SELECT id, monto_total FROM finanzas2.cont_pago
+        WHERE id = ANY($1::int[]) AND empresa_id = $2 AND cuenta_financiera_id = $3 AND conciliado IS NOT TRUE
+        FOR UPDATE
+    """, pago_ids, empresa_id, cuenta_financiera_id)}
+    vistos_banco, vistos_pago, validos = set(), set(), []
+    for banco_id, pago_id in pares:
+        if banco_id in bancos_libres and pago_id in pagos_libres \
+                and banco_id not in vistos_banco and pago_id not in vistos_pago:
+            vistos_banco.add(banco_id)
+            vistos_pago.add(pago_id)
+            validos.append((banco_id, pago_id))
+    if not validos:
+        return {"conciliados": 0, "omitidos": len(pares), "conciliacion_id": None}
+
+    banco_ids = [b for b, _ in validos]
+    pago_ids = [p for _, p in validos]
+    await conn.execute("""
+        UPDATE finanzas2.cont_banco_mov_raw SET procesado = TRUE, conciliado = TRUE WHERE id = ANY($1::int[])
+    """, banco_ids)
+    await conn.execute("UPDATE finanzas2.cont_pago SET conciliado = TRUE WHERE id = ANY($1::int[])", pago_ids)
+    conciliacion_id = await conn.fetchval("""
+        INSERT INTO finanzas2.cont_conciliacion
+            (cuenta_financiera_id, fecha_inicio, fecha_fin, saldo_final, estado, notas, empresa_id)
+        VALUES ($1, CURRENT_DATE, CURRENT_DATE, $2, 'completado', $3, $4)
+        RETURNING id
+    """, cuenta_financiera_id, sum(float(bancos_libres[b]) for b in banco_ids),
+        f"Conciliación automática: {len(validos)} pares banco/sistema", empresa_id)
+    await conn.execute("""
+        INSERT INTO finanzas2.cont_conciliacion_linea
+            (conciliacion_id, banco_mov_id, pago_id, tipo, monto, conciliado, empresa_id)
+        SELECT $1, u.banco_mov_id, u.pago_id, 'pago', u.monto, TRUE, $5
+        FROM unnest($2::int[], $3::int[], $4::numeric[]) AS u(banco_mov_id, pago_id, monto)
+    """, conciliacion_id, banco_ids, pago_ids, [pagos_libres[p] for p in pago_ids], empresa_id)
+
+    logger.info(f"Auto-reconciled {len(validos)} pairs on cuenta {cuenta_financiera_id} (empresa {empresa_id})")
+    return {"conciliados": len(validos), "omitidos": len(pares) - len(validos), "conciliacion_id": conciliacion_id}
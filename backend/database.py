@@ -547,6 +547,78 @@ async def create_schema():
             )
         """)
 
+        # x_pagos of each POS sale parsed into payments at sync time
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS finanzas2.cont_venta_pos_pago_odoo (
+                id SERIAL PRIMARY KEY,
+                empresa_id INTEGER NOT NULL REFERENCES finanzas2.cont_empresa(id),
+                venta_pos_id INTEGER NOT NULL REFERENCES finanzas2.cont_venta_pos(id) ON DELETE CASCADE,
+                secuencia SMALLINT NOT NULL,
+                forma_pago VARCHAR(50) NOT NULL,
+                monto DECIMAL(15, 2) NOT NULL,
+                referencia VARCHAR(100),
+                UNIQUE(venta_pos_id, secuencia)
+            )
+        """)
+        await conn.execute("""
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_schema='finanzas2' AND table_name='cont_venta_pos_pago' AND column_name='cuenta_financiera_id') THEN
+                    ALTER TABLE finanzas2.cont_venta_pos_pago ADD COLUMN cuenta_financiera_id INTEGER REFERENCES finanzas2.cont_cuenta_financiera(id);
+                END IF;
+                -- Odoo currency code of the order (currency_id); NULL means the principal currency
+                IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_schema='finanzas2' AND table_name='cont_venta_pos' AND column_name='moneda') THEN
+                    ALTER TABLE finanzas2.cont_venta_pos ADD COLUMN moneda VARCHAR(10);
+                END IF;
+            END $$;
+        """)
+
+        # Local mirror of the Odoo product catalog (product.product + product.template),
+        # refreshed by write_date and used to enrich POS lines without RPC lookups
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS finanzas2.cont_producto_odoo (
+                product_id INTEGER PRIMARY KEY,
+                template_id INTEGER,
+                default_code VARCHAR(50),
+                marca VARCHAR(100),
+                tipo VARCHAR(100),
+                product_write_date TIMESTAMP,
+                template_write_date TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT NOW()
+            )
+        """)
+
+        # Incremental Odoo sync: last (write_date, id) seen per company and empresa
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS finanzas2.cont_odoo_sync_state (
+                company VARCHAR(50) NOT NULL,
+                empresa_id INTEGER NOT NULL REFERENCES finanzas2.cont_empresa(id),
+                last_write_date TIMESTAMP NOT NULL,
+                last_odoo_id INTEGER NOT NULL,
+                updated_at TIMESTAMP DEFAULT NOW(),
+                PRIMARY KEY (company, empresa_id)
+            )
+        """)
+
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS finanzas2.cont_odoo_sync_job (
+                id SERIAL PRIMARY KEY,
+                company VARCHAR(50) NOT NULL,
+                empresa_id INTEGER NOT NULL REFERENCES finanzas2.cont_empresa(id),
+                run_id VARCHAR(36),
+                origen VARCHAR(20) NOT NULL DEFAULT 'manual',
+                full_resync BOOLEAN NOT NULL DEFAULT FALSE,
+                days_back INTEGER NOT NULL DEFAULT 30,
+                estado VARCHAR(20) NOT NULL DEFAULT 'en_cola',
+                stats JSONB,
+                error TEXT,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP,
+                created_at TIMESTAMP DEFAULT NOW(),
+                updated_at TIMESTAMP DEFAULT NOW()
+            )
+        """)
+
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS finanzas2.cont_cxc (
                 id SERIAL PRIMARY KEY,
@@ -610,6 +682,40 @@ async def create_schema():
             )
         """)
 
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS finanzas2.cont_banco_import_job (
+                id SERIAL PRIMARY KEY,
+                empresa_id INTEGER NOT NULL REFERENCES finanzas2.cont_empresa(id),
+                cuenta_financiera_id INTEGER REFERENCES finanzas2.cont_cuenta_financiera(id),
+                banco VARCHAR(50) NOT NULL,
+                archivo VARCHAR(255),
+                ruta TEXT NOT NULL,
+                chunk_filas INTEGER NOT NULL,
+                estado VARCHAR(20) NOT NULL DEFAULT 'en_cola',
+                total_filas INTEGER,
+                fila_checkpoint INTEGER NOT NULL DEFAULT 0,
+                filas_procesadas INTEGER NOT NULL DEFAULT 0,
+                stats JSONB,
+                errores JSONB,
+                error TEXT,
+                started_at TIMESTAMP,
+                finished_at TIMESTAMP,
+                created_at TIMESTAMP DEFAULT NOW(),
+                updated_at TIMESTAMP DEFAULT NOW()
+            )
+        """)
+
+        # Content fingerprints of every statement row imported per account and bank
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS finanzas2.cont_banco_import_huella (
+                cuenta_financiera_id INTEGER NOT NULL REFERENCES finanzas2.cont_cuenta_financiera(id),
+                banco VARCHAR(50) NOT NULL,
+                huella BIGINT NOT NULL,
+                import_job_id INTEGER REFERENCES finanzas2.cont_banco_import_job(id),
+                PRIMARY KEY (cuenta_financiera_id, banco, huella)
+            )
+        """)
+
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS finanzas2.cont_banco_mov (
                 id SERIAL PRIMARY KEY,
@@ -765,6 +871,192 @@ async def create_schema():
             END $$;
         """)
 
+        # ── Category hierarchy cache: closure table + materialized path ──
+        await conn.execute("""
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_schema='finanzas2' AND table_name='cont_categoria' AND column_name='nombre_completo') THEN
+                    ALTER TABLE finanzas2.cont_categoria ADD COLUMN nombre_completo TEXT;
+                END IF;
+                IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_schema='finanzas2' AND table_name='cont_categoria' AND column_name='nivel') THEN
+                    ALTER TABLE finanzas2.cont_categoria ADD COLUMN nivel INTEGER DEFAULT 1;
+                END IF;
+            END $$;
+        """)
+
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS finanzas2.cont_categoria_closure (
+                empresa_id INTEGER NOT NULL REFERENCES finanzas2.cont_empresa(id),
+                ancestor_id INTEGER NOT NULL REFERENCES finanzas2.cont_categoria(id) ON DELETE CASCADE,
+                descendant_id INTEGER NOT NULL REFERENCES finanzas2.cont_categoria(id) ON DELETE CASCADE,
+                depth INTEGER NOT NULL,
+                PRIMARY KEY (ancestor_id, descendant_id)
+            )
+        """)
+
+        # ── Period locks (closed months) + cached payloads of closed-period reports ──
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS finanzas2.cont_periodo_cerrado (
+                id SERIAL PRIMARY KEY,
+                empresa_id INTEGER NOT NULL REFERENCES finanzas2.cont_empresa(id),
+                anio INTEGER NOT NULL,
+                mes INTEGER NOT NULL CHECK (mes BETWEEN 1 AND 12),
+                notas TEXT,
+                created_at TIMESTAMP DEFAULT NOW(),
+                UNIQUE(empresa_id, anio, mes)
+            )
+        """)
+
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS finanzas2.cont_reporte_cache (
+                empresa_id INTEGER NOT NULL REFERENCES finanzas2.cont_empresa(id),
+                clave TEXT NOT NULL,
+                fecha_desde DATE NOT NULL,
+                fecha_hasta DATE NOT NULL,
+                etag VARCHAR(80) NOT NULL,
+                media_type VARCHAR(100) NOT NULL,
+                payload BYTEA NOT NULL,
+                created_at TIMESTAMP DEFAULT NOW(),
+                PRIMARY KEY (empresa_id, clave)
+            )
+        """)
+
+        # Reject writes dated inside a closed period. Enforced in the database so every
+        # write path is covered; reports for closed ranges can then be cached forever.
+        await conn.execute("""
+            CREATE OR REPLACE FUNCTION finanzas2.fn_assert_periodo_abierto(emp INTEGER, fecha DATE) RETURNS void AS $$
+            BEGIN
+                IF fecha IS NOT NULL AND EXISTS (
+                    SELECT 1 FROM finanzas2.cont_periodo_cerrado p
+                    WHERE p.empresa_id = emp
+                      AND p.anio = EXTRACT(YEAR FROM fecha) AND p.mes = EXTRACT(MONTH FROM fecha)
+                ) THEN
+                    RAISE EXCEPTION 'El periodo %-% está cerrado', EXTRACT(YEAR FROM fecha), LPAD(EXTRACT(MONTH FROM fecha)::text, 2, '0')
+                        USING HINT = 'periodo_cerrado';
+                END IF;
+            END;
+            $$ LANGUAGE plpgsql
+        """)
+        await conn.execute("""
+            CREATE OR REPLACE FUNCTION finanzas2.fn_check_periodo_cerrado() RETURNS trigger AS $$
+            DECLARE
+                col TEXT := TG_ARGV[0];
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    PERFORM finanzas2.fn_assert_periodo_abierto(OLD.empresa_id, (to_jsonb(OLD) ->> col)::date);
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    PERFORM finanzas2.fn_assert_periodo_abierto(NEW.empresa_id, (to_jsonb(NEW) ->> col)::date);
+                END IF;
+                RETURN COALESCE(NEW, OLD);
+            END;
+            $$ LANGUAGE plpgsql
+        """)
+        # Line tables carry no date: check the parent document's date (old and new parent,
+        # so a line can't be moved out of or into a closed document either)
+        await conn.execute("""
+            CREATE OR REPLACE FUNCTION finanzas2.fn_check_periodo_cerrado_linea() RETURNS trigger AS $$
+            DECLARE
+                padre TEXT := TG_ARGV[0];
+                fk TEXT := TG_ARGV[1];
+                col TEXT := TG_ARGV[2];
+                fecha DATE;
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    EXECUTE format('SELECT %I FROM finanzas2.%I WHERE id = $1', col, padre)
+                        INTO fecha USING (to_jsonb(OLD) ->> fk)::int;
+                    PERFORM finanzas2.fn_assert_periodo_abierto(OLD.empresa_id, fecha);
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    EXECUTE format('SELECT %I FROM finanzas2.%I WHERE id = $1', col, padre)
+                        INTO fecha USING (to_jsonb(NEW) ->> fk)::int;
+                    PERFORM finanzas2.fn_assert_periodo_abierto(NEW.empresa_id, fecha);
+                END IF;
+                RETURN COALESCE(NEW, OLD);
+            END;
+            $$ LANGUAGE plpgsql
+        """)
+
+        # (table, trigger suffix, date column, timing/events, optional WHEN clause)
+        periodo_triggers = [
+            ('cont_factura_proveedor', 'ins_del', 'fecha_factura', 'INSERT OR DELETE', ''),
+            ('cont_factura_proveedor', 'upd', 'fecha_factura',
+             'UPDATE OF fecha_factura, fecha_contable, numero, proveedor_id, moneda_id, tipo_comprobante_sunat, '
+             'subtotal, igv, total, base_gravada, igv_sunat, base_no_gravada, isc, tipo_cambio', ''),
+            ('cont_gasto', 'ins_del', 'fecha', 'INSERT OR DELETE', ''),
+            ('cont_gasto', 'upd', 'fecha',
+             'UPDATE OF fecha, fecha_contable, numero_documento, proveedor_id, moneda_id, tipo_comprobante_sunat, '
+             'subtotal, igv, total, base_gravada, igv_sunat, base_no_gravada, isc, tipo_cambio', ''),
+            ('cont_pago', 'ins_del', 'fecha', 'INSERT OR DELETE', ''),
+            ('cont_pago', 'upd', 'fecha', 'UPDATE OF fecha, tipo, monto_total, notas, cuenta_financiera_id', ''),
+            ('cont_venta_pos', 'upd', 'date_order', 'UPDATE OF estado_local, amount_total, date_order, moneda',
+             "WHEN (OLD.estado_local = 'confirmada' OR NEW.estado_local = 'confirmada')"),
+            ('cont_venta_pos', 'del', 'date_order', 'DELETE', "WHEN (OLD.estado_local = 'confirmada')"),
+        ]
+        for table, suffix, col, events, when in periodo_triggers:
+            trigger = f"trg_{table}_periodo_{suffix}"
+            await conn.execute(f"DROP TRIGGER IF EXISTS {trigger} ON finanzas2.{table}")
+            await conn.execute(f"""
+                CREATE TRIGGER {trigger} BEFORE {events} ON finanzas2.{table}
+                FOR EACH ROW {when} EXECUTE FUNCTION finanzas2.fn_check_periodo_cerrado('{col}')
+            """)
+        # (line table, parent table, foreign key, parent date column)
+        periodo_linea_triggers = [
+            ('cont_gasto_linea', 'cont_gasto', 'gasto_id', 'fecha'),
+            ('cont_factura_proveedor_linea', 'cont_factura_proveedor', 'factura_id', 'fecha_factura'),
+        ]
+        for table, padre, fk, col in periodo_linea_triggers:
+            trigger = f"trg_{table}_periodo"
+            await conn.execute(f"DROP TRIGGER IF EXISTS {trigger} ON finanzas2.{table}")
+            await conn.execute(f"""
+                CREATE TRIGGER {trigger} BEFORE INSERT OR UPDATE OR DELETE ON finanzas2.{table}
+                FOR EACH ROW EXECUTE FUNCTION finanzas2.fn_check_periodo_cerrado_linea('{padre}', '{fk}', '{col}')
+            """)
+
+        # Cached closed-period reports also depend on data that is not dated per empresa:
+        # exchange rates (global, used as-of) and category names/hierarchy. Changing those
+        # purges the affected cache rows so the next request recomputes them.
+        await conn.execute("""
+            CREATE OR REPLACE FUNCTION finanzas2.fn_purge_reporte_cache_tipo_cambio() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'UPDATE' AND (OLD.moneda_id, OLD.fecha, OLD.tasa_compra, OLD.tasa_venta)
+                        IS NOT DISTINCT FROM (NEW.moneda_id, NEW.fecha, NEW.tasa_compra, NEW.tasa_venta) THEN
+                    RETURN NULL;
+                END IF;
+                -- an as-of rate applies from its fecha onwards, so every range ending later may change
+                DELETE FROM finanzas2.cont_reporte_cache
+                WHERE fecha_hasta >= LEAST(
+                    CASE WHEN TG_OP <> 'INSERT' THEN OLD.fecha END,
+                    CASE WHEN TG_OP <> 'DELETE' THEN NEW.fecha END);
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """)
+        await conn.execute("""
+            CREATE OR REPLACE FUNCTION finanzas2.fn_purge_reporte_cache_categoria() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'UPDATE' AND (OLD.nombre, OLD.nombre_completo, OLD.padre_id, OLD.nivel)
+                        IS NOT DISTINCT FROM (NEW.nombre, NEW.nombre_completo, NEW.padre_id, NEW.nivel) THEN
+                    RETURN NULL;
+                END IF;
+                DELETE FROM finanzas2.cont_reporte_cache WHERE empresa_id = OLD.empresa_id;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """)
+        await conn.execute("DROP TRIGGER IF EXISTS trg_cont_tipo_cambio_reporte_cache ON finanzas2.cont_tipo_cambio")
+        await conn.execute("""
+            CREATE TRIGGER trg_cont_tipo_cambio_reporte_cache
+            AFTER INSERT OR UPDATE OF fecha, moneda_id, tasa_compra, tasa_venta OR DELETE ON finanzas2.cont_tipo_cambio
+            FOR EACH ROW EXECUTE FUNCTION finanzas2.fn_purge_reporte_cache_tipo_cambio()
+        """)
+        await conn.execute("DROP TRIGGER IF EXISTS trg_cont_categoria_reporte_cache ON finanzas2.cont_categoria")
+        await conn.execute("""
+            CREATE TRIGGER trg_cont_categoria_reporte_cache
+            AFTER UPDATE OF nombre, nombre_completo, padre_id, nivel OR DELETE ON finanzas2.cont_categoria
+            FOR EACH ROW EXECUTE FUNCTION finanzas2.fn_purge_reporte_cache_categoria()
+        """)
+
         # ── Table: cont_cuenta (chart of accounts) ──
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS finanzas2.cont_cuenta (
@@ -790,6 +1082,52 @@ async def create_schema():
             )
         """)
 
+        # Cached closed-period reports also read lookup data that the period triggers do
+        # not lock: supplier and account fields, default accounts, what is still owed on a
+        # factura. Changing any of it purges the empresa's cached reports (only those
+        # covering the document's date when one is given; every empresa for monedas).
+        await conn.execute("""
+            CREATE OR REPLACE FUNCTION finanzas2.fn_purge_reporte_cache() RETURNS trigger AS $$
+            DECLARE
+                fila JSONB := CASE WHEN TG_OP = 'INSERT' THEN to_jsonb(NEW) ELSE to_jsonb(OLD) END;
+                col TEXT := TG_ARGV[0];
+            BEGIN
+                DELETE FROM finanzas2.cont_reporte_cache c
+                WHERE (fila ->> 'empresa_id' IS NULL OR c.empresa_id = (fila ->> 'empresa_id')::int)
+                  AND (col IS NULL OR (fila ->> col)::date BETWEEN c.fecha_desde AND c.fecha_hasta);
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """)
+        # (table, columns read by cached reports, document date column or None)
+        reporte_cache_inputs = [
+            ('cont_factura_proveedor', ['saldo_pendiente', 'vou_numero', 'fecha_vencimiento'], 'fecha_factura'),
+            ('cont_gasto', ['vou_numero'], 'fecha'),
+            ('cont_categoria', ['cuenta_gasto_id'], None),
+            ('cont_cuenta', ['codigo'], None),
+            ('cont_tercero', ['nombre', 'numero_documento'], None),
+            ('cont_cuenta_financiera', ['nombre'], None),
+            ('cont_moneda', ['codigo', 'es_principal'], None),
+            ('cont_config_empresa', ['cta_gastos_default_id', 'cta_igv_default_id', 'cta_xpagar_default_id'], None),
+        ]
+        for table, cols, col in reporte_cache_inputs:
+            trigger = f"trg_{table}_reporte_cache_upd"
+            old = ', '.join(f"OLD.{c}" for c in cols)
+            new = ', '.join(f"NEW.{c}" for c in cols)
+            await conn.execute(f"DROP TRIGGER IF EXISTS {trigger} ON finanzas2.{table}")
+            await conn.execute(f"""
+                CREATE TRIGGER {trigger} AFTER UPDATE OF {', '.join(cols)} ON finanzas2.{table}
+                FOR EACH ROW WHEN (ROW({old}) IS DISTINCT FROM ROW({new}))
+                EXECUTE FUNCTION finanzas2.fn_purge_reporte_cache({f"'{col}'" if col else ''})
+            """)
+        # Adding or removing the config row switches every default account at once
+        await conn.execute("DROP TRIGGER IF EXISTS trg_cont_config_empresa_reporte_cache_ins_del ON finanzas2.cont_config_empresa")
+        await conn.execute("""
+            CREATE TRIGGER trg_cont_config_empresa_reporte_cache_ins_del
+            AFTER INSERT OR DELETE ON finanzas2.cont_config_empresa
+            FOR EACH ROW EXECUTE FUNCTION finanzas2.fn_purge_reporte_cache()
+        """)
+
         # ── Migration: Fix FK on conciliacion_linea to point to banco_mov_raw ──
         await conn.execute("""
             DO $$
@@ -819,12 +1157,106 @@ async def create_schema():
             END $$;
         """)
 
+        # POS lines are upserted by odoo_line_id; drop duplicates left by older syncs
+        # before the unique index is created
+        if not await conn.fetchval("SELECT to_regclass('finanzas2.idx_cont_venta_pos_linea_odoo_line')"):
+            await conn.execute("""
+                DELETE FROM finanzas2.cont_venta_pos_linea a
+                USING finanzas2.cont_venta_pos_linea b
+                WHERE a.odoo_line_id = b.odoo_line_id AND a.id < b.id
+            """)
+
+        # Bank movements are merged by (cuenta, banco, referencia, fecha); drop duplicates
+        # left by older imports that nothing references before the unique index is created
+        await conn.execute("""
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_schema='finanzas2' AND table_name='cont_banco_mov_raw' AND column_name='monto') THEN
+                    ALTER TABLE finanzas2.cont_banco_mov_raw ADD COLUMN monto DECIMAL(15, 2);
+                END IF;
+                IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_schema='finanzas2' AND table_name='cont_banco_mov_raw' AND column_name='banco_excel') THEN
+                    ALTER TABLE finanzas2.cont_banco_mov_raw ADD COLUMN banco_excel VARCHAR(50);
+                END IF;
+                IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_schema='finanzas2' AND table_name='cont_banco_mov_raw' AND column_name='conciliado') THEN
+                    ALTER TABLE finanzas2.cont_banco_mov_raw ADD COLUMN conciliado BOOLEAN DEFAULT FALSE;
+                END IF;
+                IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_schema='finanzas2' AND table_name='cont_pago' AND column_name='conciliado') THEN
+                    ALTER TABLE finanzas2.cont_pago ADD COLUMN conciliado BOOLEAN DEFAULT FALSE;
+                END IF;
+                IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_schema='finanzas2' AND table_name='cont_banco_mov_raw' AND column_name='import_job_id') THEN
+                    ALTER TABLE finanzas2.cont_banco_mov_raw ADD COLUMN import_job_id INTEGER REFERENCES finanzas2.cont_banco_import_job(id);
+                END IF;
+                IF NOT EXISTS (SELECT 1 FROM information_schema.columns WHERE table_schema='finanzas2' AND table_name='cont_banco_import_job' AND column_name='archivo_hash') THEN
+                    ALTER TABLE finanzas2.cont_banco_import_job ADD COLUMN archivo_hash VARCHAR(64);
+                END IF;
+            END $$;
+        """)
+        # One live (queued, running or completed) import job per file hash, account and bank.
+        # Older duplicates created before the index existed give up their hash claim.
+        if not await conn.fetchval("SELECT to_regclass('finanzas2.uq_cont_banco_import_job_hash')"):
+            await conn.execute("""
+                UPDATE finanzas2.cont_banco_import_job a SET archivo_hash = NULL
+                FROM (
+                    SELECT id, ROW_NUMBER() OVER (
+                        PARTITION BY empresa_id, cuenta_financiera_id, banco, archivo_hash ORDER BY id DESC) AS rn
+                    FROM finanzas2.cont_banco_import_job
+                    WHERE archivo_hash IS NOT NULL AND estado IN ('en_cola', 'ejecutando', 'completado')
+                ) d
+                WHERE a.id = d.id AND d.rn > 1
+            """)
+            await conn.execute("""
+                CREATE UNIQUE INDEX uq_cont_banco_import_job_hash
+                ON finanzas2.cont_banco_import_job (empresa_id, cuenta_financiera_id, banco, archivo_hash)
+                WHERE estado IN ('en_cola', 'ejecutando', 'completado')
+            """)
+        if not await conn.fetchval("SELECT to_regclass('finanzas2.idx_cont_banco_mov_raw_clave')"):
+            await conn.execute("""
+                DELETE FROM finanzas2.cont_banco_mov_raw a
+                USING (
+                    SELECT id, ROW_NUMBER() OVER (
+                        PARTITION BY cuenta_financiera_id, banco, COALESCE(referencia, ''), fecha
+                        ORDER BY procesado IS TRUE DESC, id DESC) AS rn
+                    FROM finanzas2.cont_banco_mov_raw
+                ) d
+                WHERE a.id = d.id AND d.rn > 1 AND a.procesado IS NOT TRUE
+                  AND NOT EXISTS (SELECT 1 FROM finanzas2.cont_conciliacion_linea cl WHERE cl.banco_mov_id = a.id)
+                  AND NOT EXISTS (SELECT 1 FROM finanzas2.cont_banco_mov m WHERE m.raw_id = a.id)
+            """)
+            try:
+                await conn.execute("""
+                    CREATE UNIQUE INDEX idx_cont_banco_mov_raw_clave ON finanzas2.cont_banco_mov_raw
+                        (cuenta_financiera_id, banco, (COALESCE(referencia, '')), fecha)
+                """)
+            except asyncpg.UniqueViolationError:
+                # Bank imports refuse to start (listing the keys) until the duplicates are resolved
+                claves = await conn.fetch("""
+                    SELECT empresa_id, cuenta_financiera_id, banco, COALESCE(referencia, '') AS referencia, fecha
+                    FROM finanzas2.cont_banco_mov_raw
+                    WHERE cuenta_financiera_id IS NOT NULL AND banco IS NOT NULL AND fecha IS NOT NULL
+                    GROUP BY empresa_id, cuenta_financiera_id, banco, COALESCE(referencia, ''), fecha
+                    HAVING COUNT(*) > 1
+                """)
+                logger.error("Bank import disabled: idx_cont_banco_mov_raw_clave needs these reconciled duplicates "
+                             f"resolved: {[tuple(c) for c in claves]}")
+
         # ── Indexes ──
         index_stmts = [
             "CREATE INDEX IF NOT EXISTS idx_cont_venta_pos_pago_venta ON finanzas2.cont_venta_pos_pago(venta_pos_id)",
             "CREATE INDEX IF NOT EXISTS idx_cont_venta_pos_linea_venta ON finanzas2.cont_venta_pos_linea(venta_pos_id)",
             "CREATE INDEX IF NOT EXISTS idx_cont_venta_pos_linea_marca ON finanzas2.cont_venta_pos_linea(marca)",
             "CREATE INDEX IF NOT EXISTS idx_cont_venta_pos_linea_tipo ON finanzas2.cont_venta_pos_linea(tipo)",
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_cont_venta_pos_linea_odoo_line ON finanzas2.cont_venta_pos_linea(odoo_line_id)",
+            "CREATE INDEX IF NOT EXISTS idx_cont_odoo_sync_job_company ON finanzas2.cont_odoo_sync_job(company, empresa_id, id DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_cont_odoo_sync_job_run ON finanzas2.cont_odoo_sync_job(run_id)",
+            "CREATE INDEX IF NOT EXISTS idx_cont_banco_import_job_empresa ON finanzas2.cont_banco_import_job(empresa_id, id DESC)",
+            "CREATE INDEX IF NOT EXISTS idx_cont_banco_mov_raw_import_job ON finanzas2.cont_banco_mov_raw(import_job_id)",
+            "CREATE INDEX IF NOT EXISTS idx_cont_banco_import_job_pendiente ON finanzas2.cont_banco_import_job(estado) WHERE estado IN ('en_cola', 'ejecutando')",
+            "CREATE INDEX IF NOT EXISTS idx_cont_producto_odoo_template ON finanzas2.cont_producto_odoo(template_id)",
+            "CREATE INDEX IF NOT EXISTS idx_cont_venta_pos_pago_odoo_forma ON finanzas2.cont_venta_pos_pago_odoo(empresa_id, forma_pago)",
+            "CREATE INDEX IF NOT EXISTS idx_cont_banco_mov_raw_pendiente ON finanzas2.cont_banco_mov_raw(cuenta_financiera_id, fecha) WHERE procesado IS NOT TRUE",
+            "CREATE INDEX IF NOT EXISTS idx_cont_pago_pendiente ON finanzas2.cont_pago(cuenta_financiera_id, fecha) WHERE conciliado IS NOT TRUE",
+            "CREATE INDEX IF NOT EXISTS idx_cont_categoria_closure_desc ON finanzas2.cont_categoria_closure(descendant_id, depth)",
+            "CREATE INDEX IF NOT EXISTS idx_cont_categoria_closure_empresa ON finanzas2.cont_categoria_closure(empresa_id)",
         ]
         for stmt in index_stmts:
             await conn.execute(stmt)
@@ -0,0 +1,105 @@
+import hashlib
+import logging
+import os
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CACHE_DIR = os.environ.get('EXPORT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'finanzas_exports'))
+EXPORT_CACHE_MAX_MB = float(os.environ.get('EXPORT_CACHE_MAX_MB', '200'))
+
+
+def _canonical(value: Any) -> str:
+    """Stable text form of a value for fingerprinting"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return format(value.normalize(), 'f')
+    if isinstance(value, dict):
+        return "{" + ",".join(f"{k}={_canonical(value[k])}" for k in sorted(value)) + "}"
+    if isinstance(value, (list, tuple)):
+        return "[" + ",".join(_canonical(v) for v in value) + "]"
+    return repr(value)
+
+
+def fingerprint(*parts: Any) -> str:
+    """SHA-256 over the canonical form of every input that shapes an export"""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(_canonical(part).encode())
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class ExportFileCache:
+    """
+    Content-addressed on-disk cache of generated export files.
+
+    Files are named by the fingerprint of their inputs, so identical inputs
+    map to the same file. Reads bump the file's mtime; writes evict the least
+    recently used files until the directory fits in max_bytes. Both return the
+    contents rather than a path, since a concurrent write may evict any file
+    but its own once the call returns.
+    """
+
+    def __init__(self, directory: str = EXPORT_CACHE_DIR, max_bytes: int = int(EXPORT_CACHE_MAX_MB * 1024 * 1024),
+                 suffix: str = ".xlsx"):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}{self.suffix}"
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            os.utime(path)
+            return path.read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: bytes) -> bytes:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, path)
+        except Exception:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        self._evict(keep=path)
+        return data
+
+    def _evict(self, keep: Path):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(self.suffix):
+                st = entry.stat()
+                entries.append((st.st_mtime, st.st_size, Path(entry.path)))
+                total += st.st_size
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                path.unlink()
+                total -= size
+                logger.info(f"Evicted cached export {path.name}")
+            except FileNotFoundError:
+                pass
+
+
+export_file_cache = ExportFileCache()
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List, Union
+from typing import Optional, List, Union, Dict
 from datetime import datetime, date
 from decimal import Decimal
 
@@ -49,6 +49,23 @@ class Moneda(MonedaBase):
     id: int
     created_at: Optional[datetime] = None
 
+# =====================
+# TIPO DE CAMBIO
+# =====================
+class TipoCambioBase(BaseModel):
+    moneda_id: int
+    fecha: date
+    tasa_compra: float
+    tasa_venta: float
+
+class TipoCambioCreate(TipoCambioBase):
+    pass
+
+class TipoCambio(TipoCambioBase):
+    id: int
+    moneda_codigo: Optional[str] = None
+    created_at: Optional[datetime] = None
+
 # =====================
 # CATEGORIA
 # =====================
@@ -76,6 +93,8 @@ class CategoriaUpdate(BaseModel):
 class Categoria(CategoriaBase):
     id: int
     empresa_id: Optional[int] = None
+    nombre_completo: Optional[str] = None
+    nivel: Optional[int] = None
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
@@ -338,6 +357,7 @@ class FacturaLinea(FacturaLineaBase):
     categoria_nombre: Optional[str] = None
     categoria_padre_id: Optional[int] = None
     categoria_padre_nombre: Optional[str] = None
+    categoria_nombre_completo: Optional[str] = None
     linea_negocio_nombre: Optional[str] = None
     centro_costo_nombre: Optional[str] = None
     created_at: Optional[datetime] = None
@@ -518,6 +538,7 @@ class GastoLinea(GastoLineaBase):
     categoria_nombre: Optional[str] = None
     categoria_padre_id: Optional[int] = None
     categoria_padre_nombre: Optional[str] = None
+    categoria_nombre_completo: Optional[str] = None
     created_at: Optional[datetime] = None
 
 class GastoBase(BaseModel):
@@ -667,6 +688,12 @@ class VentaPOS(BaseModel):
     num_pagos_oficiales: Optional[int] = 0
     synced_at: Optional[datetime] = None
 
+class AceptarPagosOdooRequest(BaseModel):
+    cuentas: Dict[str, int]  # forma de pago (as in x_pagos) -> cuenta_financiera_id
+    venta_ids: Optional[List[int]] = None
+    fecha_desde: Optional[date] = None
+    fecha_hasta: Optional[date] = None
+
 # =====================
 # CXC (Cuentas por Cobrar)
 # =====================
@@ -787,6 +814,34 @@ class Conciliacion(ConciliacionBase):
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
+class ParConciliacion(BaseModel):
+    banco_id: int
+    pago_id: int
+
+class AceptarPropuestasRequest(BaseModel):
+    cuenta_financiera_id: int
+    pares: Optional[List[ParConciliacion]] = None  # None: every proposal with score >= score_minimo
+    score_minimo: Optional[float] = None
+    fecha_desde: Optional[date] = None
+    fecha_hasta: Optional[date] = None
+    ventana_dias: Optional[int] = Field(None, ge=0, le=60)
+
+# =====================
+# PERIODOS CERRADOS
+# =====================
+class PeriodoCerradoBase(BaseModel):
+    anio: int
+    mes: int = Field(..., ge=1, le=12)
+    notas: Optional[str] = None
+
+class PeriodoCerradoCreate(PeriodoCerradoBase):
+    pass
+
+class PeriodoCerrado(PeriodoCerradoBase):
+    id: int
+    empresa_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+
 # =====================
 # REPORTES
 # =====================
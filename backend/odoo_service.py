@@ -1,15 +1,129 @@
 import xmlrpc.client
+import asyncio
+import http.client
+import json
 import os
 import logging
-from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
+from urllib.parse import urlsplit
 
 logger = logging.getLogger(__name__)
 
+# Blocking XML-RPC calls run here so they never stall the event loop.
+# The pool size bounds how many Odoo requests are in flight per worker.
+ODOO_MAX_WORKERS = int(os.environ.get('ODOO_MAX_WORKERS', '4'))
+_odoo_executor = ThreadPoolExecutor(max_workers=ODOO_MAX_WORKERS, thread_name_prefix='odoo-rpc')
+
+ODOO_COMPANIES = ("ambission", "proyectomoda")
+ODOO_PROTOCOLS = ("xmlrpc", "jsonrpc")
+
+# Sessions (keep-alive connections) per company and socket timeout per call
+ODOO_POOL_SIZE = int(os.environ.get('ODOO_POOL_SIZE', '2'))
+ODOO_TIMEOUT = float(os.environ.get('ODOO_TIMEOUT', '120'))
+
+
+class _KeepAliveMixin:
+    """
+    xmlrpc Transport that keeps its HTTP(S) connection open between calls and
+    applies a socket timeout. One transport is shared by the common and
+    object endpoints of a session, so a session holds a single connection.
+    """
+
+    def __init__(self, timeout: float, **kwargs):
+        super().__init__(**kwargs)
+        self.timeout = timeout
+
+    def make_connection(self, host):
+        conn = super().make_connection(host)
+        conn.timeout = self.timeout
+        return conn
+
+
+class KeepAliveTransport(_KeepAliveMixin, xmlrpc.client.Transport):
+    pass
+
+
+class KeepAliveSafeTransport(_KeepAliveMixin, xmlrpc.client.SafeTransport):
+    pass
+
+
+class JsonRpcClient:
+    """
+    Minimal client for Odoo's /jsonrpc endpoint over one keep-alive connection.
+
+    Errors are raised as xmlrpc.client.Fault / ProtocolError so callers handle
+    both transports the same way.
+    """
+
+    def __init__(self, url: str, timeout: float):
+        parts = urlsplit(url)
+        self.url = f"{url}/jsonrpc"
+        self.netloc = parts.netloc
+        self.https = parts.scheme == 'https'
+        self.timeout = timeout
+        self._conn = None
+        self._id = 0
+
+    def _connection(self):
+        if self._conn is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            self._conn = cls(self.netloc, timeout=self.timeout)
+        return self._conn
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _post(self, body: bytes):
+        conn = self._connection()
+        conn.request("POST", "/jsonrpc", body, {"Content-Type": "application/json"})
+        response = conn.getresponse()
+        return response, response.read()
+
+    def call(self, service: str, method: str, *args):
+        self._id += 1
+        body = json.dumps({"jsonrpc": "2.0", "method": "call", "id": self._id,
+                           "params": {"service": service, "method": method, "args": args}}).encode()
+        try:
+            response, data = self._post(body)
+        except (http.client.HTTPException, OSError):
+            # The server may have closed the idle keep-alive connection; reconnect once
+            self.close()
+            response, data = self._post(body)
+        if response.status != 200:
+            raise xmlrpc.client.ProtocolError(self.url, response.status, response.reason, dict(response.getheaders()))
+        reply = json.loads(data)
+        if reply.get("error"):
+            error = reply["error"]
+            detail = error.get("data") or {}
+            raise xmlrpc.client.Fault(error.get("code", 0),
+                                      f"{detail.get('name', '')}: {detail.get('message') or error.get('message')}")
+        return reply.get("result")
+
+
+class JsonRpcProxy:
+    """ServerProxy look-alike for one JSON-RPC service (common or object)"""
+
+    def __init__(self, client: JsonRpcClient, service: str):
+        self._client = client
+        self._service = service
+
+    def __getattr__(self, method: str):
+        return lambda *args: self._client.call(self._service, method, *args)
+
+
+def _is_access_denied(fault: xmlrpc.client.Fault) -> bool:
+    return 'AccessDenied' in fault.faultString or 'Access Denied' in fault.faultString
+
+
 class OdooService:
-    """Service for connecting to Odoo via XML-RPC"""
+    """Service for connecting to Odoo via XML-RPC (or JSON-RPC, see `protocol`)"""
     
-    def __init__(self, company: str = "ambission"):
+    def __init__(self, company: str = "ambission", protocol: Optional[str] = None):
         """Initialize Odoo connection for specified company"""
         self.company = company
         
@@ -26,16 +140,37 @@ class OdooService:
         else:
             raise ValueError(f"Unknown company: {company}")
         
+        # Point every company at another server (e.g. the local stub in tests/odoo_stub.py)
+        self.url = os.environ.get('ODOO_URL', self.url)
+        
+        # Wire protocol: "xmlrpc" (default) or "jsonrpc", per company via ODOO_PROTOCOL_<COMPANY>
+        self.protocol = (protocol or os.environ.get(f'ODOO_PROTOCOL_{company.upper()}')
+                         or os.environ.get('ODOO_PROTOCOL', 'xmlrpc'))
+        if self.protocol not in ODOO_PROTOCOLS:
+            raise ValueError(f"Unknown Odoo protocol: {self.protocol}")
+        
         self.uid = None
         self.models = None
         self.common = None
+        self._transport = None
+    
+    def _proxy(self, endpoint: str):
+        if self.protocol == 'jsonrpc':
+            if self._transport is None:
+                self._transport = JsonRpcClient(self.url, timeout=ODOO_TIMEOUT)
+            return JsonRpcProxy(self._transport, endpoint)
+        if self._transport is None:
+            transport_cls = KeepAliveSafeTransport if self.url.startswith('https') else KeepAliveTransport
+            self._transport = transport_cls(timeout=ODOO_TIMEOUT)
+        return xmlrpc.client.ServerProxy(f"{self.url}/xmlrpc/2/{endpoint}", allow_none=True,
+                                         transport=self._transport)
     
     def authenticate(self) -> bool:
         """Authenticate with Odoo server"""
         try:
             logger.info(f"Authenticating with Odoo ({self.company}) at {self.url}")
             
-            self.common = xmlrpc.client.ServerProxy(f"{self.url}/xmlrpc/2/common", allow_none=True)
+            self.common = self.common or self._proxy("common")
             
             self.uid = self.common.authenticate(self.db, self.username, self.password, {})
             
@@ -43,7 +178,7 @@ class OdooService:
                 logger.error(f"Odoo authentication failed for {self.company}")
                 return False
             
-            self.models = xmlrpc.client.ServerProxy(f"{self.url}/xmlrpc/2/object", allow_none=True)
+            self.models = self.models or self._proxy("object")
             
             logger.info(f"Successfully authenticated with Odoo (uid: {self.uid})")
             return True
@@ -52,9 +187,31 @@ class OdooService:
             logger.error(f"Odoo authentication error: {e}")
             return False
     
-    def get_pos_orders(self, days_back: int = 30, limit: int = 500) -> List[Dict[str, Any]]:
+    def adopt_uid(self, uid: int):
+        """Reuse a uid obtained by another session with the same credentials"""
+        self.uid = uid
+        self.models = self.models or self._proxy("object")
+    
+    def execute_kw(self, model: str, method: str, args: list, kwargs: Optional[dict] = None):
+        """execute_kw with the session credentials; re-authenticates once if the uid was revoked"""
+        call_args = [model, method, args] + ([kwargs] if kwargs is not None else [])
+        try:
+            return self.models.execute_kw(self.db, self.uid, self.password, *call_args)
+        except xmlrpc.client.Fault as fault:
+            if not _is_access_denied(fault) or not self.authenticate():
+                raise
+            return self.models.execute_kw(self.db, self.uid, self.password, *call_args)
+    
+    def get_pos_orders(self, days_back: int = 30, limit: int = 500,
+                       since: Optional[Tuple[str, int]] = None,
+                       after: Optional[Tuple[str, List[int]]] = None) -> List[Dict[str, Any]]:
         """
-        Retrieve POS orders from Odoo
+        Retrieve POS orders from Odoo, oldest modification first
+        
+        With `since=(write_date, id)` only orders created or modified since that
+        watermark's second are returned; otherwise orders from the last `days_back`
+        days. Results are ordered by (write_date, id); pass page_cursor(page, after)
+        as `after` to read the next page.
         
         Fields requested per user specification:
         - id, date_order, name, tipo_comp, num_comp
@@ -62,62 +219,66 @@ class OdooService:
         - x_pagos, quantity_pos_order, amount_total, state
         - x_reserva_pendiente, x_reserva_facturada
         - is_cancel, order_cancel, reserva, is_credit, reserva_use_id
+        - currency_id
+        
+        RPC failures propagate: an empty list always means there are no more orders.
         """
         if not self.uid or not self.models:
-            logger.error("Not authenticated with Odoo")
-            return []
+            raise RuntimeError(f"Not authenticated with Odoo ({self.company})")
         
-        try:
-            cutoff_date = (datetime.now() - timedelta(days=days_back)).strftime('%Y-%m-%d 00:00:00')
-            
-            domain = [
-                ('date_order', '>=', cutoff_date),
-            ]
-            
+        domain = _orders_domain(days_back, since)
+        if since:
+            logger.info(f"Fetching POS orders from Odoo ({self.company}) modified since {since[0]} (id {since[1]})")
+        else:
             logger.info(f"Fetching POS orders from Odoo ({self.company}) from last {days_back} days")
-            
-            # Request all fields as specified by user
-            orders = self.models.execute_kw(
-                self.db,
-                self.uid,
-                self.password,
-                'pos.order',
-                'search_read',
-                [domain],
-                {
-                    'fields': [
-                        'id',
-                        'date_order',
-                        'name',
-                        'tipo_comp',
-                        'num_comp',
-                        'partner_id',
-                        'x_tienda',
-                        'vendedor_id',
-                        'company_id',
-                        'x_pagos',
-                        'quantity_pos_order',
-                        'amount_total',
-                        'state',
-                        'x_reserva_pendiente',
-                        'x_reserva_facturada',
-                        'is_cancel',
-                        'order_cancel',
-                        'reserva',
-                        'is_credit',
-                        'reserva_use_id',
-                    ],
-                    'limit': limit,
-                    'order': 'date_order desc'
-                }
-            )
-            
-            logger.info(f"Retrieved {len(orders)} POS orders from Odoo")
-            return orders
-            
+        if after:
+            domain = domain + _after_domain(after)
+        
+        # Request all fields as specified by user
+        orders = self.execute_kw(
+            'pos.order',
+            'search_read',
+            [domain],
+            {
+                'fields': [
+                    'id',
+                    'date_order',
+                    'name',
+                    'tipo_comp',
+                    'num_comp',
+                    'partner_id',
+                    'x_tienda',
+                    'vendedor_id',
+                    'company_id',
+                    'x_pagos',
+                    'quantity_pos_order',
+                    'amount_total',
+                    'state',
+                    'x_reserva_pendiente',
+                    'x_reserva_facturada',
+                    'is_cancel',
+                    'order_cancel',
+                    'reserva',
+                    'is_credit',
+                    'reserva_use_id',
+                    'currency_id',
+                    'write_date',
+                ],
+                'limit': limit,
+                'order': 'write_date asc, id asc'
+            }
+        )
+        
+        logger.info(f"Retrieved {len(orders)} POS orders from Odoo")
+        return orders
+    
+    def count_pos_orders(self, days_back: int = 30, since: Optional[Tuple[str, int]] = None) -> Optional[int]:
+        """Number of orders get_pos_orders would page through, or None if Odoo can't tell"""
+        try:
+            return self.execute_kw('pos.order', 'search_count', [_orders_domain(days_back, since)])
         except Exception as e:
-            logger.error(f"Error retrieving POS orders from Odoo: {e}")
-            return []
+            logger.error(f"Error counting POS orders in Odoo: {e}")
+            return None
     
     def get_order_details(self, order_id: int) -> Optional[Dict[str, Any]]:
         """Get detailed information about a specific POS order"""
@@ -125,10 +286,7 @@ class OdooService:
             return None
         
         try:
-            order = self.models.execute_kw(
-                self.db,
-                self.uid,
-                self.password,
+            order = self.execute_kw(
                 'pos.order',
                 'read',
                 [[order_id]]
@@ -145,77 +303,247 @@ class OdooService:
         Get POS order lines with product details including marca and tipo
         Returns lines with: product, qty, price_unit, price_subtotal, marca, tipo
         """
+        return self.get_order_lines_batch([order_id]).get(order_id, [])
+    
+    def get_order_lines_batch(self, order_ids: List[int], enrich: bool = True) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        Get POS order lines for several orders at once, grouped by order id.
+        
+        Uses a fixed number of round trips regardless of how many orders or
+        lines there are: one search_read on pos.order.line, one read on
+        product.product and one read on product.template. With enrich=False
+        only the lines are fetched and callers resolve products themselves.
+        RPC failures propagate rather than looking like orders without lines.
+        """
         if not self.uid or not self.models:
-            logger.error("Not authenticated with Odoo")
-            return []
+            raise RuntimeError(f"Not authenticated with Odoo ({self.company})")
         
-        try:
-            # Get order lines
-            lines = self.models.execute_kw(
-                self.db,
-                self.uid,
-                self.password,
-                'pos.order.line',
-                'search_read',
-                [[('order_id', '=', order_id)]],
-                {
-                    'fields': [
-                        'id',
-                        'product_id',
-                        'qty',
-                        'price_unit',
-                        'price_subtotal',
-                        'price_subtotal_incl',
-                        'discount',
-                    ]
-                }
-            )
-            
-            # Enrich lines with product details (marca, tipo from product.template)
+        order_ids = list(order_ids)
+        if not order_ids:
+            return {}
+        
+        lines = self.execute_kw(
+            'pos.order.line',
+            'search_read',
+            [[('order_id', 'in', order_ids)]],
+            {
+                'fields': [
+                    'id',
+                    'order_id',
+                    'product_id',
+                    'qty',
+                    'price_unit',
+                    'price_subtotal',
+                    'price_subtotal_incl',
+                    'discount',
+                ],
+                'order': 'order_id, id'
+            }
+        )
+        
+        if not enrich:
+            lines_by_order: Dict[int, List[Dict[str, Any]]] = {order_id: [] for order_id in order_ids}
             for line in lines:
-                if line.get('product_id'):
-                    product_id = line['product_id'][0] if isinstance(line['product_id'], list) else line['product_id']
-                    
-                    # Get product.product to get template_id
-                    product = self.models.execute_kw(
-                        self.db,
-                        self.uid,
-                        self.password,
-                        'product.product',
-                        'read',
-                        [[product_id]],
-                        {'fields': ['product_tmpl_id', 'default_code']}
-                    )
-                    
-                    if product:
-                        line['product_code'] = product[0].get('default_code', '')
-                        template_id = product[0].get('product_tmpl_id')
-                        
-                        if template_id:
-                            tmpl_id = template_id[0] if isinstance(template_id, list) else template_id
-                            
-                            # Get product.template with marca and tipo
-                            template = self.models.execute_kw(
-                                self.db,
-                                self.uid,
-                                self.password,
-                                'product.template',
-                                'read',
-                                [[tmpl_id]],
-                                {'fields': ['marca', 'tipo']}
-                            )
-                            
-                            if template:
-                                # Handle marca and tipo - they come as [id, name] tuples from Odoo
-                                marca_raw = template[0].get('marca', '')
-                                tipo_raw = template[0].get('tipo', '')
-                                
-                                line['marca'] = marca_raw[1] if isinstance(marca_raw, list) and len(marca_raw) > 1 else (marca_raw if marca_raw else '')
-                                line['tipo'] = tipo_raw[1] if isinstance(tipo_raw, list) and len(tipo_raw) > 1 else (tipo_raw if tipo_raw else '')
-            
-            logger.info(f"Retrieved {len(lines)} order lines for order {order_id}")
-            return lines
-            
-        except Exception as e:
-            logger.error(f"Error retrieving order lines: {e}")
+                lines_by_order.setdefault(m2o_id(line.get('order_id')), []).append(line)
+            logger.info(f"Retrieved {len(lines)} order lines for {len(order_ids)} orders")
+            return lines_by_order
+        
+        # Resolve every distinct product, then every distinct template, once
+        product_ids = sorted({m2o_id(line.get('product_id')) for line in lines} - {None})
+        products = {}
+        if product_ids:
+            for product in self.execute_kw(
+                'product.product', 'read', [product_ids],
+                {'fields': ['product_tmpl_id', 'default_code']}
+            ):
+                products[product['id']] = product
+        
+        template_ids = sorted({m2o_id(p.get('product_tmpl_id')) for p in products.values()} - {None})
+        templates = {}
+        if template_ids:
+            for template in self.execute_kw(
+                'product.template', 'read', [template_ids],
+                {'fields': ['marca', 'tipo']}
+            ):
+                templates[template['id']] = template
+        
+        lines_by_order = {order_id: [] for order_id in order_ids}
+        for line in lines:
+            product = products.get(m2o_id(line.get('product_id')))
+            if product:
+                line['product_code'] = product.get('default_code', '')
+                template = templates.get(m2o_id(product.get('product_tmpl_id')))
+                if template:
+                    # marca and tipo come as [id, name] tuples from Odoo
+                    line['marca'] = m2o_name(template.get('marca', ''))
+                    line['tipo'] = m2o_name(template.get('tipo', ''))
+            lines_by_order.setdefault(m2o_id(line.get('order_id')), []).append(line)
+        
+        logger.info(f"Retrieved {len(lines)} order lines for {len(order_ids)} orders "
+                    f"({len(product_ids)} products, {len(template_ids)} templates)")
+        return lines_by_order
+
+    
+    def get_products_since(self, write_date: Optional[str] = None) -> List[Dict[str, Any]]:
+        """product.product rows (id, template, code) modified at or after write_date, archived included"""
+        domain = [('write_date', '>=', write_date)] if write_date else []
+        return self.execute_kw(
+            'product.product', 'search_read', [domain],
+            {'fields': ['id', 'product_tmpl_id', 'default_code', 'write_date'],
+             'order': 'write_date asc, id asc', 'context': {'active_test': False}}
+        )
+    
+    def get_templates_since(self, write_date: Optional[str] = None) -> List[Dict[str, Any]]:
+        """product.template rows (id, marca, tipo) modified at or after write_date, archived included"""
+        domain = [('write_date', '>=', write_date)] if write_date else []
+        return self.execute_kw(
+            'product.template', 'search_read', [domain],
+            {'fields': ['id', 'marca', 'tipo', 'write_date'],
+             'order': 'write_date asc, id asc', 'context': {'active_test': False}}
+        )
+    
+    def get_templates(self, template_ids: List[int]) -> List[Dict[str, Any]]:
+        """product.template rows (id, marca, tipo) by id"""
+        if not template_ids:
             return []
+        return self.execute_kw(
+            'product.template', 'read', [list(template_ids)],
+            {'fields': ['marca', 'tipo', 'write_date']}
+        )
+
+
+def _orders_domain(days_back: int, since: Optional[Tuple[str, int]]) -> list:
+    """Base pos.order domain: changed since a watermark, or dated within the last days_back days"""
+    if since:
+        # Odoo returns write_date cut to whole seconds but stores microseconds, so the
+        # watermark second is read again (re-upserting those orders is a no-op)
+        return [('write_date', '>=', since[0])]
+    cutoff_date = (datetime.now() - timedelta(days=days_back)).strftime('%Y-%m-%d 00:00:00')
+    return [
+        ('date_order', '>=', cutoff_date),
+    ]
+
+
+def _after_domain(cursor: Tuple[str, List[int]]) -> list:
+    """Odoo domain for rows after a page_cursor() position"""
+    write_date, seen_ids = cursor
+    return [('write_date', '>=', write_date), ('id', 'not in', list(seen_ids))]
+
+
+def page_cursor(orders: List[Dict[str, Any]],
+                after: Optional[Tuple[str, List[int]]] = None) -> Tuple[str, List[int]]:
+    """
+    Cursor for the page after `orders` (ordered by write_date, id), given the cursor
+    that fetched them: the last write_date second and the ids already read at it.
+
+    write_date comes back cut to whole seconds while Odoo compares (and sorts) the
+    stored microseconds, so neither `>` nor `=` on the second is exact. Reading
+    `>=` the second minus the ids seen there always advances, even when more than
+    a page of orders share one second.
+    """
+    write_date = orders[-1]['write_date']
+    seen = set(after[1]) if after and after[0] == write_date else set()
+    seen.update(o['id'] for o in orders if o['write_date'] == write_date)
+    return write_date, sorted(seen)
+
+
+def m2o_id(value) -> Optional[int]:
+    """Id part of an Odoo many2one value ([id, name], bare id or False)"""
+    if isinstance(value, (list, tuple)):
+        return value[0] if value else None
+    return value or None
+
+
+def m2o_name(value) -> str:
+    """Display name of an Odoo many2one value, or the raw value for plain fields"""
+    if isinstance(value, (list, tuple)):
+        return value[1] if len(value) > 1 else ''
+    return value if value else ''
+
+
+class AsyncOdooService:
+    """
+    Async facade over a small pool of OdooService sessions for one company.
+
+    Each call checks out a session, runs in the shared Odoo thread pool and
+    returns the session, so a session (and its ServerProxy, which is not
+    thread-safe) is never used by two calls at once. The uid is obtained once
+    and shared by every session until Odoo rejects it.
+    """
+
+    def __init__(self, company: str = "ambission", pool_size: int = ODOO_POOL_SIZE):
+        self.company = company
+        self.sessions = [OdooService(company=company) for _ in range(max(1, pool_size))]
+        self._idle: Optional[asyncio.Queue] = None
+        self._auth_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def uid(self) -> Optional[int]:
+        return self.sessions[0].uid
+
+    async def _run(self, name: str, *args, **kwargs):
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for session in self.sessions:
+                self._idle.put_nowait(session)
+        session = await self._idle.get()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(_odoo_executor, partial(getattr(session, name), *args, **kwargs))
+        finally:
+            self._idle.put_nowait(session)
+
+    async def authenticate(self, force: bool = False) -> bool:
+        """Authenticate once per process; later calls reuse the cached uid"""
+        if self._auth_lock is None:
+            self._auth_lock = asyncio.Lock()
+        async with self._auth_lock:
+            if self.uid and not force:
+                return True
+            leader = self.sessions[0]
+            loop = asyncio.get_running_loop()
+            if not await loop.run_in_executor(_odoo_executor, leader.authenticate):
+                return False
+            for session in self.sessions[1:]:
+                session.adopt_uid(leader.uid)
+            return True
+
+    async def get_pos_orders(self, **kwargs) -> List[Dict[str, Any]]:
+        return await self._run('get_pos_orders', **kwargs)
+
+    async def count_pos_orders(self, **kwargs) -> Optional[int]:
+        return await self._run('count_pos_orders', **kwargs)
+
+    async def get_order_details(self, order_id: int) -> Optional[Dict[str, Any]]:
+        return await self._run('get_order_details', order_id)
+
+    async def get_order_lines(self, order_id: int) -> List[Dict[str, Any]]:
+        return await self._run('get_order_lines', order_id)
+
+    async def get_order_lines_batch(self, order_ids: List[int], enrich: bool = True) -> Dict[int, List[Dict[str, Any]]]:
+        return await self._run('get_order_lines_batch', order_ids, enrich=enrich)
+
+    async def get_products_since(self, write_date: Optional[str] = None) -> List[Dict[str, Any]]:
+        return await self._run('get_products_since', write_date)
+
+    async def get_templates_since(self, write_date: Optional[str] = None) -> List[Dict[str, Any]]:
+        return await self._run('get_templates_since', write_date)
+
+    async def get_templates(self, template_ids: List[int]) -> List[Dict[str, Any]]:
+        return await self._run('get_templates', template_ids)
+
+
+class OdooClientRegistry:
+    """Process-wide AsyncOdooService per company, so connections and uid survive between syncs"""
+
+    def __init__(self):
+        self._clients: Dict[str, AsyncOdooService] = {}
+
+    def get(self, company: str) -> AsyncOdooService:
+        client = self._clients.get(company)
+        if client is None:
+            client = self._clients[company] = AsyncOdooService(company)
+        return client
+
+
+odoo_clients = OdooClientRegistry()
@@ -0,0 +1,175 @@
+import logging
+import re
+from datetime import date, datetime
+from typing import Any, Dict, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# Entries in x_pagos are separated by newlines, ';' or '|', or by a comma
+# that is not part of an amount ("Efectivo: 1,250.00, Yape: 30")
+_SEPARADOR = re.compile(r'\s*(?:[;\n|]|,(?=\s*[^\d\s]))\s*')
+_PAGO = re.compile(r'^(?P<forma>[^\d:]*[^\d\s:=-])\s*[:=-]?\s*(?P<monto>-?\d[\d,]*(?:\.\d+)?)\s*(?P<resto>.*)$')
+_MONEDA = re.compile(r'\s*(?:S/\.?|PEN|USD|US\$|\$)$', re.IGNORECASE)
+_REFERENCIA = re.compile(
+    r'^\(?\s*(?:ref(?:erencia)?|op(?:eraci[oó]n)?|nro|n[°º])?\.?\s*[:#]?\s*(?P<ref>.*?)\s*\)?$', re.IGNORECASE)
+
+
+class PagoOdoo(NamedTuple):
+    forma_pago: str
+    monto: float
+    referencia: Optional[str]
+
+
+def _monto(texto: str) -> float:
+    if ',' in texto and '.' not in texto and re.search(r',\d{1,2}$', texto):
+        return float(texto.replace(',', '.'))   # decimal comma: "30,50"
+    return float(texto.replace(',', ''))
+
+
+def parse_x_pagos(x_pagos: Optional[str]) -> List[PagoOdoo]:
+    """
+    Parse the free-text x_pagos of a pos.order into payments.
+
+    Accepts "Efectivo: 50.00, Yape S/ 30 (Op. 123456)" style text. Entries
+    that do not carry a forma de pago and an amount are skipped; the
+    acceptance step only trusts ventas whose parsed total matches.
+    """
+    pagos = []
+    for entrada in _SEPARADOR.split(x_pagos or ''):
+        m = _PAGO.match(entrada)
+        if not m:
+            continue
+        forma = _MONEDA.sub('', m.group('forma')).strip()
+        referencia = _REFERENCIA.match(m.group('resto')).group('ref') or None
+        if forma:
+            pagos.append(PagoOdoo(forma[:50], _monto(m.group('monto')), referencia and referencia[:100]))
+    return pagos
+
+
+# Parsed payments are upserted by (venta_pos_id, secuencia); unchanged rows are not rewritten
+_UPSERT_PAGOS_ODOO_SQL = """
+    INSERT INTO finanzas2.cont_venta_pos_pago_odoo (venta_pos_id, secuencia, forma_pago, monto, referencia, empresa_id)
+    SELECT u.*, $6::int FROM unnest($1::int[], $2::int[], $3::text[], $4::numeric[], $5::text[]) AS u
+    ON CONFLICT (venta_pos_id, secuencia) DO UPDATE SET
+        forma_pago = EXCLUDED.forma_pago, monto = EXCLUDED.monto, referencia = EXCLUDED.referencia
+    WHERE (cont_venta_pos_pago_odoo.forma_pago, cont_venta_pos_pago_odoo.monto, cont_venta_pos_pago_odoo.referencia)
+        IS DISTINCT FROM (EXCLUDED.forma_pago, EXCLUDED.monto, EXCLUDED.referencia)
+"""
+
+
+async def sync_pagos_odoo(conn, x_pagos_by_venta: Dict[int, Optional[str]], empresa_id: int) -> int:
+    """
+    Store the parsed x_pagos of the given ventas in cont_venta_pos_pago_odoo.
+
+    `x_pagos_by_venta` maps cont_venta_pos.id to its raw x_pagos. Returns the
+    number of payments parsed.
+    """
+    if not x_pagos_by_venta:
+        return 0
+    parsed = {venta_id: parse_x_pagos(texto) for venta_id, texto in x_pagos_by_venta.items()}
+    rows = [(venta_id, seq, *pago) for venta_id, pagos in parsed.items() for seq, pago in enumerate(pagos, start=1)]
+
+    # Payments beyond the new count vanished from x_pagos
+    await conn.execute("""
+        DELETE FROM finanzas2.cont_venta_pos_pago_odoo p
+        USING unnest($1::int[], $2::int[]) AS n(venta_pos_id, pagos)
+        WHERE p.venta_pos_id = n.venta_pos_id AND p.secuencia > n.pagos
+    """, list(parsed), [len(p) for p in parsed.values()])
+    if rows:
+        await conn.execute(_UPSERT_PAGOS_ODOO_SQL, *(list(col) for col in zip(*rows)), empresa_id)
+    return len(rows)
+
+
+async def backfill_pagos_odoo(conn, empresa_id: int) -> int:
+    """Parse x_pagos of pending ventas synced before payments were parsed at sync time"""
+    rows = await conn.fetch("""
+        SELECT v.id, v.x_pagos FROM finanzas2.cont_venta_pos v
+        WHERE v.empresa_id = $1 AND v.x_pagos IS NOT NULL
+          AND COALESCE(v.estado_local, 'pendiente') = 'pendiente'
+          AND NOT EXISTS (SELECT 1 FROM finanzas2.cont_venta_pos_pago_odoo o WHERE o.venta_pos_id = v.id)
+    """, empresa_id)
+    return await sync_pagos_odoo(conn, {r['id']: r['x_pagos'] for r in rows}, empresa_id)
+
+
+async def aceptar_pagos_odoo(conn, empresa_id: int, cuentas: Dict[str, int], venta_ids: Optional[List[int]] = None,
+                             fecha_desde: Optional[date] = None, fecha_hasta: Optional[date] = None) -> Dict[str, Any]:
+    """
+    Accept the Odoo payments of pending ventas and confirm them, set-based.
+
+    `cuentas` maps each forma de pago (case-insensitive) to the
+    cont_cuenta_financiera that receives it. A venta is accepted only when it
+    has no manual payments yet, every parsed payment has a mapped cuenta and
+    the parsed total matches amount_total within 0.01. For the accepted
+    ventas this writes cont_venta_pos_pago and, as confirming does one by one,
+    a cont_pago ingreso with its detalle and aplicacion per payment.
+    Must run inside a transaction.
+    """
+    por_forma = {forma.strip().lower(): int(cuenta) for forma, cuenta in cuentas.items()}
+    formas, cuenta_ids = list(por_forma), list(por_forma.values())
+    await backfill_pagos_odoo(conn, empresa_id)
+
+    confirmadas = await conn.fetch("""
+        UPDATE finanzas2.cont_venta_pos v SET estado_local = 'confirmada'
+        WHERE v.empresa_id = $1
+          AND COALESCE(v.estado_local, 'pendiente') = 'pendiente'
+          AND ($2::int[] IS NULL OR v.id = ANY($2::int[]))
+          AND ($3::date IS NULL OR v.date_order >= $3::date)
+          AND ($4::date IS NULL OR v.date_order < $4::date + 1)
+          AND NOT EXISTS (SELECT 1 FROM finanzas2.cont_venta_pos_pago p WHERE p.venta_pos_id = v.id)
+          AND (SELECT bool_and(lower(o.forma_pago) = ANY($5::text[])) AND ABS(SUM(o.monto) - v.amount_total) < 0.01
+               FROM finanzas2.cont_venta_pos_pago_odoo o WHERE o.venta_pos_id = v.id)
+        RETURNING v.id
+    """, empresa_id, venta_ids, fecha_desde, fecha_hasta, formas)
+    ids = [r['id'] for r in confirmadas]
+    if not ids:
+        return {"confirmadas": 0, "pagos": 0}
+
+    pagos = await conn.fetch("""
+        INSERT INTO finanzas2.cont_venta_pos_pago
+            (venta_pos_id, forma_pago, cuenta_financiera_id, monto, referencia, fecha_pago, observaciones, empresa_id)
+        SELECT o.venta_pos_id, o.forma_pago, m.cuenta_financiera_id, o.monto, o.referencia, v.date_order::date,
+               'Pago Odoo ' || v.name, $4
+        FROM finanzas2.cont_venta_pos_pago_odoo o
+        JOIN finanzas2.cont_venta_pos v ON v.id = o.venta_pos_id
+        JOIN unnest($2::text[], $3::int[]) AS m(forma, cuenta_financiera_id) ON lower(o.forma_pago) = m.forma
+        WHERE o.venta_pos_id = ANY($1::int[])
+        ORDER BY o.venta_pos_id, o.secuencia
+        RETURNING venta_pos_id, forma_pago, cuenta_financiera_id, monto, referencia, fecha_pago, observaciones
+    """, ids, formas, cuenta_ids, empresa_id)
+
+    # Reserve one block of PAG-I numbers instead of one correlativo round trip per payment
+    prefijo = f"PAG-I-{datetime.now().year}-"
+    ultimo = await conn.fetchval("""
+        INSERT INTO finanzas2.cont_correlativos (empresa_id, tipo_documento, prefijo, ultimo_numero, updated_at)
+        VALUES ($1, 'pago_ingreso', $2, $3, NOW())
+        ON CONFLICT (empresa_id, tipo_documento, prefijo)
+        DO UPDATE SET ultimo_numero = finanzas2.cont_correlativos.ultimo_numero + $3, updated_at = NOW()
+        RETURNING ultimo_numero
+    """, empresa_id, prefijo, len(pagos))
+    numeros = [f"{prefijo}{n:05d}" for n in range(ultimo - len(pagos) + 1, ultimo + 1)]
+
+    creados = await conn.fetch("""
+        INSERT INTO finanzas2.cont_pago
+            (numero, tipo, fecha, cuenta_financiera_id, moneda_id, monto_total, referencia, notas, empresa_id)
+        SELECT u.numero, 'ingreso', u.fecha, u.cuenta, 1, u.monto, u.referencia, u.notas, $7
+        FROM unnest($1::text[], $2::date[], $3::int[], $4::numeric[], $5::text[], $6::text[])
+            AS u(numero, fecha, cuenta, monto, referencia, notas)
+        RETURNING id, numero
+    """, numeros, [p['fecha_pago'] for p in pagos], [p['cuenta_financiera_id'] for p in pagos],
+        [p['monto'] for p in pagos], [p['referencia'] for p in pagos], [p['observaciones'] for p in pagos], empresa_id)
+    pago_by_numero = {r['numero']: r['id'] for r in creados}
+    pago_ids = [pago_by_numero[n] for n in numeros]
+
+    await conn.execute("""
+        INSERT INTO finanzas2.cont_pago_detalle (pago_id, cuenta_financiera_id, medio_pago, monto, referencia, empresa_id)
+        SELECT u.*, $6 FROM unnest($1::int[], $2::int[], $3::text[], $4::numeric[], $5::text[]) AS u
+    """, pago_ids, [p['cuenta_financiera_id'] for p in pagos], [p['forma_pago'] for p in pagos],
+        [p['monto'] for p in pagos], [p['referencia'] for p in pagos], empresa_id)
+    await conn.execute("""
+        INSERT INTO finanzas2.cont_pago_aplicacion (pago_id, tipo_documento, documento_id, monto_aplicado, empresa_id)
+        SELECT u.pago_id, 'venta_pos', u.venta_pos_id, u.monto, $4
+        FROM unnest($1::int[], $2::int[], $3::numeric[]) AS u(pago_id, venta_pos_id, monto)
+    """, pago_ids, [p['venta_pos_id'] for p in pagos], [p['monto'] for p in pagos], empresa_id)
+
+    logger.info(f"Accepted Odoo payments: {len(ids)} ventas, {len(pagos)} pagos (empresa {empresa_id})")
+    return {"confirmadas": len(ids), "pagos": len(pagos)}
@@ -0,0 +1,630 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from odoo_service import m2o_id, odoo_clients, page_cursor
+from pos_pagos import sync_pagos_odoo
+from producto_odoo import producto_dimension
+from sync_events import sync_event_bus
+
+logger = logging.getLogger(__name__)
+
+# Orders per Odoo page and how many fetched pages may wait for the writer.
+# Memory stays bounded by roughly (prefetch + 2) pages whatever the history size.
+POS_SYNC_PAGE_SIZE = int(os.environ.get('POS_SYNC_PAGE_SIZE', '200'))
+POS_SYNC_PREFETCH_PAGES = int(os.environ.get('POS_SYNC_PREFETCH_PAGES', '1'))
+
+# Background schedule: minutes between runs (0 disables it) and the
+# "company:empresa_id" pairs to sync, e.g. "ambission:1,proyectomoda:1"
+POS_SYNC_INTERVAL_MINUTES = float(os.environ.get('POS_SYNC_INTERVAL_MINUTES', '0'))
+POS_SYNC_TARGETS = os.environ.get('POS_SYNC_TARGETS', '')
+# Syncs allowed to run at once per Odoo company (across empresas)
+POS_SYNC_COMPANY_CONCURRENCY = int(os.environ.get('POS_SYNC_COMPANY_CONCURRENCY', '1'))
+# A queued/running job with no progress for this long is considered dead
+POS_SYNC_STALE_MINUTES = int(os.environ.get('POS_SYNC_STALE_MINUTES', '10'))
+# Pool connections a running job may use at once (its own, the producer's reads and
+# event notifies) and how many to leave free for API requests; together they cap
+# how many jobs run at once across all companies
+POS_SYNC_CONNECTIONS_PER_JOB = 3
+POS_SYNC_POOL_RESERVE = int(os.environ.get('POS_SYNC_POOL_RESERVE', '4'))
+
+ESTADOS_PROCESADOS = ('confirmada', 'credito', 'descartada')
+
+ODOO_DATETIME = '%Y-%m-%d %H:%M:%S'
+
+
+class OdooAuthError(Exception):
+    """Odoo rejected the configured credentials"""
+
+
+async def get_sync_watermark(conn, company: str, empresa_id: int) -> Optional[Tuple[str, int]]:
+    """Last (write_date, odoo_id) synced for a company/empresa, or None"""
+    row = await conn.fetchrow("""
+        SELECT last_write_date, last_odoo_id FROM finanzas2.cont_odoo_sync_state
+        WHERE company = $1 AND empresa_id = $2
+    """, company, empresa_id)
+    if not row:
+        return None
+    return row['last_write_date'].strftime(ODOO_DATETIME), row['last_odoo_id']
+
+
+async def save_sync_watermark(conn, company: str, empresa_id: int, order: dict):
+    """Advance the watermark to an order's (write_date, id); never moves it backwards"""
+    write_date = datetime.strptime(order['write_date'], ODOO_DATETIME)
+    await conn.execute("""
+        INSERT INTO finanzas2.cont_odoo_sync_state (company, empresa_id, last_write_date, last_odoo_id)
+        VALUES ($1, $2, $3, $4)
+        ON CONFLICT (company, empresa_id) DO UPDATE SET
+            last_write_date = EXCLUDED.last_write_date,
+            last_odoo_id = EXCLUDED.last_odoo_id,
+            updated_at = NOW()
+        WHERE (EXCLUDED.last_write_date, EXCLUDED.last_odoo_id)
+            > (cont_odoo_sync_state.last_write_date, cont_odoo_sync_state.last_odoo_id)
+    """, company, empresa_id, write_date, order['id'])
+
+
+def parse_order(order: Dict[str, Any]) -> Dict[str, Any]:
+    """Map an Odoo pos.order record to cont_venta_pos column values"""
+    # Parse date_order (comes as string from Odoo)
+    date_order = order.get('date_order')
+    if date_order and isinstance(date_order, str):
+        date_order = datetime.strptime(date_order, ODOO_DATETIME)
+
+    def m2o(field):
+        # many2one fields come as [id, name] tuples from Odoo, False when empty
+        value = order.get(field)
+        if isinstance(value, list):
+            return value[0], value[1]
+        return value or None, None
+
+    def char(field):
+        # empty char fields come as False from Odoo
+        value = order.get(field)
+        return value if value else None
+
+    partner_id, partner_name = m2o('partner_id')
+    vendedor_id, vendedor_name = m2o('vendedor_id')
+    company_id, company_name = m2o('company_id')
+    _, moneda = m2o('currency_id')  # Odoo names currencies by ISO code
+    tienda_raw = order.get('x_tienda')
+    tienda_id = tienda_raw[0] if isinstance(tienda_raw, list) else None
+    tienda_name = tienda_raw[1] if isinstance(tienda_raw, list) else (tienda_raw or None)
+
+    # x_pagos: convert False to None
+    x_pagos = order.get('x_pagos')
+    if x_pagos == False or x_pagos == 'False':
+        x_pagos = None
+
+    # order_cancel: can be False, string, or [id, name] list
+    order_cancel = order.get('order_cancel')
+    if order_cancel == False or order_cancel == 'False':
+        order_cancel = None
+    elif isinstance(order_cancel, list) and len(order_cancel) > 1:
+        order_cancel = order_cancel[1]  # Use the name part
+
+    # reserva_use_id: can be False, int, or [id, name] list
+    reserva_use_id = order.get('reserva_use_id')
+    if reserva_use_id == False or reserva_use_id == 'False':
+        reserva_use_id = None
+    elif isinstance(reserva_use_id, list) and len(reserva_use_id) > 0:
+        reserva_use_id = reserva_use_id[0]  # Use the ID part
+
+    return {
+        'odoo_id': order.get('id'),
+        'date_order': date_order,
+        'name': char('name'),
+        'tipo_comp': char('tipo_comp'),
+        'num_comp': char('num_comp'),
+        'partner_id': partner_id,
+        'partner_name': partner_name,
+        'tienda_id': tienda_id,
+        'tienda_name': tienda_name,
+        'vendedor_id': vendedor_id,
+        'vendedor_name': vendedor_name,
+        'company_id': company_id,
+        'company_name': company_name,
+        'x_pagos': x_pagos,
+        'quantity_total': order.get('quantity_pos_order'),
+        'amount_total': order.get('amount_total'),
+        'state': char('state'),
+        'reserva_pendiente': order.get('x_reserva_pendiente', 0),
+        'reserva_facturada': order.get('x_reserva_facturada', 0),
+        'is_cancel': order.get('is_cancel', False),
+        'order_cancel': order_cancel,
+        'reserva': order.get('reserva', False),
+        'is_credit': order.get('is_credit', False),
+        'reserva_use_id': reserva_use_id,
+        'moneda': moneda,
+    }
+
+
+# Postgres array type of each cont_venta_pos column, for unnest-based bulk writes
+ORDER_COLUMN_TYPES = {
+    'odoo_id': 'int', 'date_order': 'timestamp', 'name': 'text', 'tipo_comp': 'text',
+    'num_comp': 'text', 'partner_id': 'int', 'partner_name': 'text', 'tienda_id': 'int',
+    'tienda_name': 'text', 'vendedor_id': 'int', 'vendedor_name': 'text', 'company_id': 'int',
+    'company_name': 'text', 'x_pagos': 'text', 'quantity_total': 'numeric',
+    'amount_total': 'numeric', 'state': 'text', 'reserva_pendiente': 'numeric',
+    'reserva_facturada': 'numeric', 'is_cancel': 'bool', 'order_cancel': 'text',
+    'reserva': 'bool', 'is_credit': 'bool', 'reserva_use_id': 'int', 'moneda': 'text',
+}
+ORDER_COLUMNS = list(ORDER_COLUMN_TYPES)
+
+_ESTADOS_PROCESADOS_SQL = ", ".join(f"'{e}'" for e in ESTADOS_PROCESADOS)
+
+# Orders whose values did not change are not rewritten (synced_at marks the last real
+# change); their ids still come back from the statement snapshot so lines get synced
+_UPSERT_ORDERS_SQL = f"""
+    WITH written AS (
+        INSERT INTO finanzas2.cont_venta_pos ({", ".join(ORDER_COLUMNS)}, empresa_id, synced_at)
+        SELECT u.*, ${len(ORDER_COLUMNS) + 1}::int, NOW()
+        FROM unnest({", ".join(f"${i}::{t}[]" for i, t in enumerate(ORDER_COLUMN_TYPES.values(), start=1))}) AS u
+        ON CONFLICT (odoo_id) DO UPDATE SET
+            {", ".join(f"{c} = EXCLUDED.{c}" for c in ORDER_COLUMNS[1:])},
+            synced_at = NOW()
+        WHERE (cont_venta_pos.estado_local IS NULL OR cont_venta_pos.estado_local NOT IN ({_ESTADOS_PROCESADOS_SQL}))
+          AND ({", ".join(f"cont_venta_pos.{c}" for c in ORDER_COLUMNS[1:])})
+              IS DISTINCT FROM ({", ".join(f"EXCLUDED.{c}" for c in ORDER_COLUMNS[1:])})
+        RETURNING id, odoo_id
+    )
+    SELECT id, odoo_id FROM written
+    UNION ALL
+    SELECT v.id, v.odoo_id FROM finanzas2.cont_venta_pos v
+    WHERE v.odoo_id = ANY($1::int[])
+      AND (v.estado_local IS NULL OR v.estado_local NOT IN ({_ESTADOS_PROCESADOS_SQL}))
+      AND v.odoo_id NOT IN (SELECT odoo_id FROM written)
+"""
+
+
+async def upsert_orders(conn, orders: List[Dict[str, Any]], empresa_id: int) -> Dict[int, int]:
+    """
+    Insert or update a page of Odoo orders in one statement.
+
+    Orders already processed locally (confirmada/credito/descartada) are left
+    untouched, as are orders whose values did not change. Returns
+    {odoo_id: cont_venta_pos.id} for every order not processed locally.
+    """
+    if not orders:
+        return {}
+    rows = [parse_order(o) for o in orders]
+    columns = [[row[c] for row in rows] for c in ORDER_COLUMNS]
+    written = await conn.fetch(_UPSERT_ORDERS_SQL, *columns, empresa_id)
+    return {r['odoo_id']: r['id'] for r in written}
+
+
+LINE_COLUMN_TYPES = {
+    'odoo_line_id': 'int', 'venta_pos_id': 'int', 'product_id': 'int', 'product_name': 'text',
+    'product_code': 'text', 'qty': 'numeric', 'price_unit': 'numeric', 'price_subtotal': 'numeric',
+    'price_subtotal_incl': 'numeric', 'discount': 'numeric', 'marca': 'text', 'tipo': 'text',
+}
+LINE_COLUMNS = list(LINE_COLUMN_TYPES)
+
+# Rows whose values did not change are filtered by the WHERE clause, so a
+# re-sync of an unchanged order writes nothing (no dead tuples, no WAL)
+_UPSERT_LINES_SQL = f"""
+    INSERT INTO finanzas2.cont_venta_pos_linea ({", ".join(LINE_COLUMNS)}, empresa_id)
+    SELECT u.*, ${len(LINE_COLUMNS) + 1}::int
+    FROM unnest({", ".join(f"${i}::{t}[]" for i, t in enumerate(LINE_COLUMN_TYPES.values(), start=1))}) AS u
+    ON CONFLICT (odoo_line_id) DO UPDATE SET
+        {", ".join(f"{c} = EXCLUDED.{c}" for c in LINE_COLUMNS[1:])}
+    WHERE ({", ".join(f"cont_venta_pos_linea.{c}" for c in LINE_COLUMNS[1:])})
+        IS DISTINCT FROM ({", ".join(f"EXCLUDED.{c}" for c in LINE_COLUMNS[1:])})
+    RETURNING (xmax = 0) AS inserted
+"""
+
+
+def parse_line(line: Dict[str, Any], venta_pos_id: int) -> Dict[str, Any]:
+    """Map an enriched Odoo pos.order.line record to cont_venta_pos_linea column values"""
+    product = line.get('product_id')
+    return {
+        'odoo_line_id': line.get('id'),
+        'venta_pos_id': venta_pos_id,
+        'product_id': product[0] if isinstance(product, list) else (product or None),
+        'product_name': product[1] if isinstance(product, list) else 'Producto',
+        'product_code': line.get('product_code') or '',
+        'qty': line.get('qty', 0),
+        'price_unit': line.get('price_unit', 0),
+        'price_subtotal': line.get('price_subtotal', 0),
+        'price_subtotal_incl': line.get('price_subtotal_incl', 0),
+        'discount': line.get('discount', 0),
+        'marca': line.get('marca', ''),
+        'tipo': line.get('tipo', ''),
+    }
+
+
+async def sync_lines(conn, venta_ids: Dict[int, int], lines_by_order: Dict[int, List[Dict[str, Any]]],
+                     empresa_id: int) -> Dict[str, int]:
+    """
+    Bring the product lines of the given ventas in line with Odoo.
+
+    Lines are upserted by odoo_line_id and only lines that vanished from Odoo
+    are deleted. Returns counts of inserted, updated and deleted lines.
+    """
+    counts = {"lines_inserted": 0, "lines_updated": 0, "lines_deleted": 0}
+    if not venta_ids:
+        return counts
+    rows = [parse_line(line, venta_pos_id)
+            for odoo_id, venta_pos_id in venta_ids.items()
+            for line in lines_by_order.get(odoo_id, [])]
+
+    deleted = await conn.execute("""
+        DELETE FROM finanzas2.cont_venta_pos_linea
+        WHERE venta_pos_id = ANY($1::int[])
+          AND (odoo_line_id IS NULL OR odoo_line_id <> ALL($2::int[]))
+    """, list(venta_ids.values()), [r['odoo_line_id'] for r in rows])
+    counts["lines_deleted"] = int(deleted.split()[-1])
+
+    if rows:
+        columns = [[row[c] for row in rows] for c in LINE_COLUMNS]
+        written = await conn.fetch(_UPSERT_LINES_SQL, *columns, empresa_id)
+        counts["lines_inserted"] = sum(1 for r in written if r['inserted'])
+        counts["lines_updated"] = len(written) - counts["lines_inserted"]
+    return counts
+
+
+async def sync_pos_orders(pool, company: str, empresa_id: int, days_back: int = 30,
+                          full_resync: bool = False, page_size: int = POS_SYNC_PAGE_SIZE,
+                          on_progress: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None,
+                          conn=None) -> Dict[str, Any]:
+    """
+    Sync POS orders from Odoo into cont_venta_pos / cont_venta_pos_linea, with
+    x_pagos parsed into cont_venta_pos_pago_odoo (see pos_pagos.py).
+
+    Runs as a two-stage pipeline: a producer pages through Odoo by
+    (write_date, id) and fetches each page's lines (enriched from the local
+    product catalog, see producto_odoo.py), while the consumer writes
+    the previous page to Postgres. The queue between them is bounded, so
+    memory does not grow with history size. Each written page advances the
+    watermark, so an interrupted sync resumes where it stopped.
+    `on_progress` is awaited with the running stats after every page.
+    Pages are written on `conn` when given (the caller's connection), so a
+    job does not hold a second pool connection for the writer.
+    """
+    odoo = odoo_clients.get(company)
+    if not await odoo.authenticate():
+        raise OdooAuthError(f"Could not authenticate with Odoo ({company})")
+
+    def writer():
+        return contextlib.nullcontext(conn) if conn is not None else pool.acquire()
+
+    async with writer() as wconn:
+        since = None if full_resync else await get_sync_watermark(wconn, company, empresa_id)
+    # Bring the local product catalog up to date once; lines are enriched from it
+    await producto_dimension.refresh(pool, odoo)
+
+    queue: asyncio.Queue = asyncio.Queue(maxsize=POS_SYNC_PREFETCH_PAGES)
+
+    async def producer():
+        after = None
+        try:
+            while True:
+                page = await odoo.get_pos_orders(days_back=days_back, since=since, after=after, limit=page_size)
+                # A page of ids already read would repeat forever: stop when a page makes no progress
+                seen = set(after[1]) if after else set()
+                orders = [o for o in page if not (o['id'] in seen and o['write_date'] == after[0])]
+                if not orders:
+                    break
+                after = page_cursor(orders, after)
+                # Orders already processed locally are never re-imported, so skip their lines
+                procesadas = {r['odoo_id'] for r in await pool.fetch("""
+                    SELECT odoo_id FROM finanzas2.cont_venta_pos
+                    WHERE odoo_id = ANY($1::int[]) AND estado_local = ANY($2::text[])
+                """, [o['id'] for o in orders], list(ESTADOS_PROCESADOS))}
+                pendientes = [o for o in orders if o['id'] not in procesadas]
+                # Raises on RPC failure, so lines are never diffed against a failed (empty) fetch
+                lines_by_order = await odoo.get_order_lines_batch([o['id'] for o in pendientes], enrich=False)
+                lines = [line for ls in lines_by_order.values() for line in ls]
+                if producto_dimension.missing(m2o_id(line.get('product_id')) for line in lines):
+                    await producto_dimension.refresh(pool, odoo)
+                producto_dimension.enrich(lines)
+                await queue.put((orders[-1], pendientes, lines_by_order, len(orders)))
+                if len(page) < page_size:
+                    break
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            await queue.put(None)
+            raise
+        await queue.put(None)
+
+    stats = {"fetched": 0, "synced": 0, "pages": 0, "lines_inserted": 0, "lines_updated": 0, "lines_deleted": 0,
+             "pagos_odoo": 0,
+             "total": await odoo.count_pos_orders(days_back=days_back, since=since)}
+    producer_task = asyncio.create_task(producer())
+    try:
+        async with writer() as wconn:
+            while (page := await queue.get()) is not None:
+                ultima, pendientes, lines_by_order, fetched = page
+                async with wconn.transaction():
+                    venta_ids = await upsert_orders(wconn, pendientes, empresa_id)
+                    line_counts = await sync_lines(wconn, venta_ids, lines_by_order, empresa_id)
+                    x_pagos = {o['id']: o.get('x_pagos') or None for o in pendientes}
+                    stats["pagos_odoo"] += await sync_pagos_odoo(
+                        wconn, {venta_id: x_pagos.get(odoo_id) for odoo_id, venta_id in venta_ids.items()}, empresa_id)
+                    await save_sync_watermark(wconn, company, empresa_id, ultima)
+                stats["fetched"] += fetched
+                stats["pages"] += 1
+                stats["synced"] += len(venta_ids)
+                for key, n in line_counts.items():
+                    stats[key] += n
+                if on_progress:
+                    await on_progress(dict(stats))
+    except BaseException:
+        producer_task.cancel()
+        raise
+    await producer_task
+
+    stats["mode"] = "full" if since is None else "incremental"
+    logger.info(f"POS sync {company}/empresa {empresa_id}: {stats}")
+    return stats
+
+
+def parse_sync_targets(spec: str) -> List[Tuple[str, int]]:
+    """Parse "company:empresa_id,..." into [(company, empresa_id), ...]"""
+    targets = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        company, _, empresa = item.partition(':')
+        targets.append((company.strip(), int(empresa)))
+    return targets
+
+
+def empresa_sync_targets(spec: str, empresa_id: int, companies: List[str]) -> List[Tuple[str, int]]:
+    """
+    Targets of one empresa: its entries in the "company:empresa_id" spec or, when
+    the spec is empty, every company. A configured spec never yields other
+    empresas' targets (an empresa it does not list gets none).
+    """
+    configured = parse_sync_targets(spec)
+    if configured:
+        return [(c, e) for c, e in configured if e == empresa_id]
+    return [(c, empresa_id) for c in companies]
+
+
+def job_to_dict(row) -> Dict[str, Any]:
+    job = dict(row)
+    job['stats'] = json.loads(job['stats']) if job.get('stats') else {}
+    if job.get('started_at'):
+        end = job.get('finished_at') or datetime.now()
+        job['duration_seconds'] = round((end - job['started_at']).total_seconds(), 1)
+    else:
+        job['duration_seconds'] = None
+    return job
+
+
+def estimate_eta(stats: Dict[str, Any], elapsed: float) -> Optional[float]:
+    """Seconds left at the current order rate, if Odoo reported a total"""
+    total, fetched = stats.get("total"), stats.get("fetched", 0)
+    if not total or not fetched:
+        return None
+    return round(max(total - fetched, 0) * elapsed / fetched, 1)
+
+
+def build_run_report(run_id: str, jobs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Aggregate the jobs of one fan-out run into a single report"""
+    estados = {j['estado'] for j in jobs}
+    if estados & {'en_cola', 'ejecutando'}:
+        estado = 'ejecutando'
+    elif estados == {'completado'}:
+        estado = 'completado'
+    elif 'completado' in estados:
+        estado = 'parcial'
+    else:
+        estado = 'error'
+
+    totals: Dict[str, int] = {}
+    for job in jobs:
+        for key, value in (job.get('stats') or {}).items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                totals[key] = totals.get(key, 0) + value
+
+    started = [j['started_at'] for j in jobs if j.get('started_at')]
+    finished = [j['finished_at'] for j in jobs if j.get('finished_at')]
+    duration = None
+    if started and finished and estado != 'ejecutando':
+        # Wall-clock time of the whole run: set by the slowest target, not their sum
+        duration = round((max(finished) - min(started)).total_seconds(), 1)
+
+    return {
+        "run_id": run_id,
+        "estado": estado,
+        "duration_seconds": duration,
+        "totals": totals,
+        "errors": [{"company": j['company'], "empresa_id": j['empresa_id'], "error": j.get('error')}
+                   for j in jobs if j['estado'] in ('error', 'omitido')],
+        "jobs": jobs,
+    }
+
+
+class PosSyncScheduler:
+    """
+    Runs POS syncs as background jobs tracked in cont_odoo_sync_job.
+
+    A job for (company, empresa) holds a session-level pg_advisory_lock for its
+    whole run, so overlapping syncs are impossible across workers; a trigger
+    while one is in flight returns the running job instead of starting another.
+    The locked connection is also the one the sync writes on, and the number
+    of jobs running at once is capped against the pool size.
+    """
+
+    def __init__(self):
+        self._tasks = set()
+        self._loop_task: Optional[asyncio.Task] = None
+        self._company_slots: Dict[str, asyncio.Semaphore] = {}
+        self._pool_slots: Optional[asyncio.Semaphore] = None
+
+    def _slot(self, company: str) -> asyncio.Semaphore:
+        if company not in self._company_slots:
+            self._company_slots[company] = asyncio.Semaphore(POS_SYNC_COMPANY_CONCURRENCY)
+        return self._company_slots[company]
+
+    def _pool_slot(self, pool) -> asyncio.Semaphore:
+        if self._pool_slots is None:
+            jobs = (pool.get_max_size() - POS_SYNC_POOL_RESERVE) // POS_SYNC_CONNECTIONS_PER_JOB
+            self._pool_slots = asyncio.Semaphore(max(1, jobs))
+        return self._pool_slots
+
+    async def start_job(self, pool, company: str, empresa_id: int, days_back: int = 30,
+                        full_resync: bool = False, origen: str = 'manual',
+                        run_id: Optional[str] = None) -> Dict[str, Any]:
+        """Queue a sync job and return it immediately (or the one already in flight)"""
+        async with pool.acquire() as conn:
+            en_curso = await conn.fetchrow("""
+                SELECT * FROM finanzas2.cont_odoo_sync_job
+                WHERE company = $1 AND empresa_id = $2 AND estado IN ('en_cola', 'ejecutando')
+                  AND updated_at > NOW() - make_interval(mins => $3)
+                ORDER BY id DESC LIMIT 1
+            """, company, empresa_id, POS_SYNC_STALE_MINUTES)
+            if en_curso:
+                return job_to_dict(en_curso)
+            job = await conn.fetchrow("""
+                INSERT INTO finanzas2.cont_odoo_sync_job (company, empresa_id, origen, full_resync, days_back, run_id)
+                VALUES ($1, $2, $3, $4, $5, $6)
+                RETURNING *
+            """, company, empresa_id, origen, full_resync, days_back, run_id)
+        task = asyncio.create_task(self._run_job(pool, job['id'], company, empresa_id, days_back, full_resync))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job_to_dict(job)
+
+    async def _run_job(self, pool, job_id: int, company: str, empresa_id: int, days_back: int, full_resync: bool):
+        def event(tipo: str, **data) -> Dict[str, Any]:
+            return {"tipo": tipo, "job_id": job_id, "company": company, "empresa_id": empresa_id, **data}
+
+        # Wait for a company slot, then a pool slot (job stays 'en_cola') before taking a connection
+        async with self._slot(company), self._pool_slot(pool), pool.acquire() as conn:
+            locked = await conn.fetchval("SELECT pg_try_advisory_lock(hashtext($1), $2)",
+                                         f"pos_sync:{company}", empresa_id)
+            if not locked:
+                error = 'Otra sincronización en curso'
+                await conn.execute("""
+                    UPDATE finanzas2.cont_odoo_sync_job
+                    SET estado = 'omitido', error = $2, finished_at = NOW(), updated_at = NOW()
+                    WHERE id = $1
+                """, job_id, error)
+                await sync_event_bus.publish(pool, event('omitido', error=error))
+                return
+            try:
+                await conn.execute("""
+                    UPDATE finanzas2.cont_odoo_sync_job
+                    SET estado = 'ejecutando', started_at = NOW(), updated_at = NOW()
+                    WHERE id = $1
+                """, job_id)
+                await sync_event_bus.publish(pool, event('inicio'))
+                inicio = time.monotonic()
+
+                async def progress(stats):
+                    await conn.execute("""
+                        UPDATE finanzas2.cont_odoo_sync_job SET stats = $2::jsonb, updated_at = NOW() WHERE id = $1
+                    """, job_id, json.dumps(stats))
+                    await sync_event_bus.publish(pool, event('progreso', stats=stats,
+                                                             eta_seconds=estimate_eta(stats, time.monotonic() - inicio)))
+
+                stats = await sync_pos_orders(pool, company, empresa_id, days_back=days_back,
+                                              full_resync=full_resync, on_progress=progress, conn=conn)
+                await conn.execute("""
+                    UPDATE finanzas2.cont_odoo_sync_job
+                    SET estado = 'completado', stats = $2::jsonb, finished_at = NOW(), updated_at = NOW()
+                    WHERE id = $1
+                """, job_id, json.dumps(stats))
+                await sync_event_bus.publish(pool, event('completado', stats=stats,
+                                                         duration_seconds=round(time.monotonic() - inicio, 1)))
+            except Exception as e:
+                logger.error(f"POS sync job {job_id} ({company}/empresa {empresa_id}) failed: {e}")
+                await conn.execute("""
+                    UPDATE finanzas2.cont_odoo_sync_job
+                    SET estado = 'error', error = $2, finished_at = NOW(), updated_at = NOW()
+                    WHERE id = $1
+                """, job_id, str(e))
+                await sync_event_bus.publish(pool, event('error', error=str(e)))
+            finally:
+                await conn.execute("SELECT pg_advisory_unlock(hashtext($1), $2)", f"pos_sync:{company}", empresa_id)
+
+    async def status(self, pool, company: str, empresa_id: int, job_id: Optional[int] = None) -> Dict[str, Any]:
+        """Latest (or given) job for a company/empresa plus the last success and last error"""
+        async with pool.acquire() as conn:
+            if job_id is not None:
+                job = await conn.fetchrow("""
+                    SELECT * FROM finanzas2.cont_odoo_sync_job WHERE id = $1 AND empresa_id = $2
+                """, job_id, empresa_id)
+            else:
+                job = await conn.fetchrow("""
+                    SELECT * FROM finanzas2.cont_odoo_sync_job
+                    WHERE company = $1 AND empresa_id = $2 ORDER BY id DESC LIMIT 1
+                """, company, empresa_id)
+            ultimo_ok = await conn.fetchval("""
+                SELECT MAX(finished_at) FROM finanzas2.cont_odoo_sync_job
+                WHERE company = $1 AND empresa_id = $2 AND estado = 'completado'
+            """, company, empresa_id)
+            ultimo_error = await conn.fetchrow("""
+                SELECT error, finished_at FROM finanzas2.cont_odoo_sync_job
+                WHERE company = $1 AND empresa_id = $2 AND estado = 'error'
+                ORDER BY id DESC LIMIT 1
+            """, company, empresa_id)
+        return {
+            "job": job_to_dict(job) if job else None,
+            "last_success_at": ultimo_ok,
+            "last_error": ultimo_error['error'] if ultimo_error else None,
+            "last_error_at": ultimo_error['finished_at'] if ultimo_error else None,
+        }
+
+    async def start_run(self, pool, targets: List[Tuple[str, int]], days_back: int = 30,
+                        full_resync: bool = False, origen: str = 'manual') -> Dict[str, Any]:
+        """
+        Fan a sync out to every (company, empresa) target at once.
+
+        Companies run concurrently as far as the pool allows; each company runs
+        at most POS_SYNC_COMPANY_CONCURRENCY jobs at a time. Jobs share a run_id, so
+        run_report() can aggregate their results into one report.
+        """
+        run_id = str(uuid.uuid4())
+        jobs = []
+        for company, empresa_id in targets:
+            try:
+                jobs.append(await self.start_job(pool, company, empresa_id, days_back=days_back,
+                                                 full_resync=full_resync, origen=origen, run_id=run_id))
+            except Exception as e:
+                logger.error(f"Could not start POS sync for {company}/empresa {empresa_id}: {e}")
+                jobs.append({"company": company, "empresa_id": empresa_id, "estado": "error", "error": str(e)})
+        return {"run_id": run_id, "jobs": jobs}
+
+    async def run_report(self, pool, run_id: str, empresa_id: int) -> Optional[Dict[str, Any]]:
+        """Per-target results of a fan-out run for one empresa plus totals; None if the run is unknown"""
+        async with pool.acquire() as conn:
+            rows = await conn.fetch("""
+                SELECT * FROM finanzas2.cont_odoo_sync_job WHERE run_id = $1 AND empresa_id = $2
+                ORDER BY company, empresa_id
+            """, run_id, empresa_id)
+        if not rows:
+            return None
+        return build_run_report(run_id, [job_to_dict(r) for r in rows])
+
+    def start_schedule(self, pool):
+        """Start the periodic sync loop if POS_SYNC_INTERVAL_MINUTES and POS_SYNC_TARGETS are set"""
+        targets = parse_sync_targets(POS_SYNC_TARGETS)
+        if POS_SYNC_INTERVAL_MINUTES <= 0 or not targets:
+            return
+        logger.info(f"POS sync scheduled every {POS_SYNC_INTERVAL_MINUTES} min for {targets}")
+        self._loop_task = asyncio.create_task(self._schedule_loop(pool, targets))
+
+    async def _schedule_loop(self, pool, targets: List[Tuple[str, int]]):
+        while True:
+            await self.start_run(pool, targets, origen='programado')
+            await asyncio.sleep(POS_SYNC_INTERVAL_MINUTES * 60)
+
+    async def stop(self):
+        tasks = list(self._tasks) + ([self._loop_task] if self._loop_task else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+pos_sync_scheduler = PosSyncScheduler()
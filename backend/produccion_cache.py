@@ -0,0 +1,170 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PRODUCCION_CACHE_TTL = float(os.environ.get('PRODUCCION_CACHE_TTL', '300'))
+
+
+class IndiceBusqueda:
+    """
+    Case-insensitive substring search over a pre-sorted list of rows.
+
+    Mirrors `campo ILIKE '%q%'` across several fields. Queries of 3+ chars
+    are answered through a trigram posting index (candidates are then
+    verified); shorter queries fall back to a linear scan.
+    """
+
+    def __init__(self, rows: List[Dict[str, Any]], campos: List[str]):
+        self.rows = rows
+        # '\n' separates fields so a match never spans two of them
+        self.textos = [
+            "\n".join(str(r[c]).lower() for c in campos if r.get(c) is not None)
+            for r in rows
+        ]
+        self.trigramas: Dict[str, List[int]] = {}
+        for i, texto in enumerate(self.textos):
+            for tri in {texto[j:j + 3] for j in range(len(texto) - 2)}:
+                self.trigramas.setdefault(tri, []).append(i)
+
+    def buscar(self, search: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        if not search:
+            return self.rows[:limit]
+        q = search.lower()
+        if len(q) < 3:
+            candidatos = range(len(self.rows))
+        else:
+            postings = []
+            for tri in {q[j:j + 3] for j in range(len(q) - 2)}:
+                p = self.trigramas.get(tri)
+                if not p:
+                    return []
+                postings.append(p)
+            postings.sort(key=len)
+            comunes = set(postings[0])
+            for p in postings[1:]:
+                comunes.intersection_update(p)
+                if not comunes:
+                    return []
+            candidatos = sorted(comunes)
+        result = []
+        for i in candidatos:
+            if q in self.textos[i]:
+                result.append(self.rows[i])
+                if len(result) >= limit:
+                    break
+        return result
+
+
+class ProduccionCache:
+    """
+    In-memory read model of the `produccion` schema lookups
+    (prod_inventario, prod_registros, prod_modelos).
+
+    The first access loads a snapshot; afterwards a stale snapshot is served
+    while a background refresh runs. Whether the schema exists is checked
+    once per refresh, so callers never hit the missing-relation error path.
+    """
+
+    def __init__(self, ttl: float = PRODUCCION_CACHE_TTL):
+        self.ttl = ttl
+        self.disponible: Optional[bool] = None
+        self.inventario: Optional[IndiceBusqueda] = None
+        self.articulos: Optional[IndiceBusqueda] = None
+        self.modelos_cortes: Optional[IndiceBusqueda] = None
+        self.modelos: Optional[IndiceBusqueda] = None
+        self._loaded_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def _load(self, pool):
+        async with pool.acquire() as conn:
+            disponible = await conn.fetchval("""
+                SELECT to_regclass('produccion.prod_inventario') IS NOT NULL
+                   AND to_regclass('produccion.prod_registros') IS NOT NULL
+                   AND to_regclass('produccion.prod_modelos') IS NOT NULL
+            """)
+            if not disponible:
+                self.disponible = False
+                self.inventario = self.articulos = self.modelos_cortes = self.modelos = None
+                self._loaded_at = time.monotonic()
+                logger.info("produccion schema not available; lookups use local tables")
+                return
+
+            inv_rows = await conn.fetch("""
+                SELECT id, codigo, nombre, descripcion, categoria, unidad_medida,
+                       COALESCE(stock_actual, 0) as stock_actual,
+                       COALESCE(stock_minimo, 0) as stock_minimo,
+                       COALESCE(precio_ref, 0) as precio_ref,
+                       COALESCE(costo_compra, 0) as costo_compra,
+                       modelo, marca, activo
+                FROM produccion.prod_inventario
+                ORDER BY nombre
+            """)
+            reg_rows = await conn.fetch("""
+                SELECT r.id, r.n_corte, r.modelo_id, r.estado,
+                       m.nombre as modelo_nombre,
+                       CONCAT(m.nombre, ' - Corte ', r.n_corte) as display_name
+                FROM produccion.prod_registros r
+                LEFT JOIN produccion.prod_modelos m ON r.modelo_id = m.id
+                ORDER BY r.fecha_creacion DESC
+            """)
+            mod_rows = await conn.fetch("""
+                SELECT id, nombre
+                FROM produccion.prod_modelos
+                ORDER BY nombre
+            """)
+
+        ahora = datetime.now()
+        inventario = [dict(r) for r in inv_rows]
+        articulos = [{
+            "id": r["id"],
+            "prod_inventario_id": r["id"],
+            "codigo": r["codigo"] or "",
+            "nombre": r["nombre"] or r["descripcion"] or "Sin nombre",
+            "descripcion": r["descripcion"],
+            "precio_referencia": r["precio_ref"],
+            "activo": True,
+            "created_at": ahora,
+        } for r in inventario]
+
+        self.inventario = IndiceBusqueda(inventario, ["nombre", "codigo", "descripcion"])
+        self.articulos = IndiceBusqueda(articulos, ["nombre", "codigo"])
+        self.modelos_cortes = IndiceBusqueda([dict(r) for r in reg_rows], ["modelo_nombre", "n_corte"])
+        self.modelos = IndiceBusqueda([dict(r) for r in mod_rows], ["nombre"])
+        self.disponible = True
+        self._loaded_at = time.monotonic()
+        logger.info(
+            f"produccion cache loaded: {len(inventario)} inventario, "
+            f"{len(reg_rows)} registros, {len(mod_rows)} modelos"
+        )
+
+    async def refresh(self, pool, only_if_unloaded: bool = False):
+        async with self._lock:
+            if only_if_unloaded and self._loaded_at is not None:
+                return
+            try:
+                await self._load(pool)
+            except Exception as e:
+                logger.error(f"Error refreshing produccion cache: {e}")
+                if self.disponible is None:
+                    self.disponible = False
+                # Keep serving the previous snapshot; retry after the next TTL
+                self._loaded_at = time.monotonic()
+
+    async def ensure_loaded(self, pool):
+        if self._loaded_at is None:
+            await self.refresh(pool, only_if_unloaded=True)
+        elif time.monotonic() - self._loaded_at >= self.ttl:
+            if self._refresh_task is None or self._refresh_task.done():
+                self._refresh_task = asyncio.create_task(self.refresh(pool))
+
+    def invalidate(self):
+        self._loaded_at = None
+
+
+produccion_cache = ProduccionCache()
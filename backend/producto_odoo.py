@@ -0,0 +1,137 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional
+
+from odoo_service import m2o_id, m2o_name
+
+logger = logging.getLogger(__name__)
+
+ODOO_DATETIME = '%Y-%m-%d %H:%M:%S'
+
+
+class ProductoOdoo(NamedTuple):
+    template_id: Optional[int]
+    default_code: str
+    marca: str
+    tipo: str
+
+
+def _parse_wd(value) -> Optional[datetime]:
+    return datetime.strptime(value, ODOO_DATETIME) if value else None
+
+
+class ProductoDimension:
+    """
+    Local mirror of the Odoo product catalog in cont_producto_odoo.
+
+    refresh() pulls only products and templates whose write_date moved since
+    the newest one stored, upserts them and merges them into an in-process
+    dict. POS line enrichment (code, marca, tipo) is then a dict lookup
+    instead of product.product/product.template reads on every sync.
+    """
+
+    def __init__(self):
+        self.productos: Dict[int, ProductoOdoo] = {}
+        self._loaded = False
+        self._lock = asyncio.Lock()
+
+    async def _load(self, conn):
+        rows = await conn.fetch("""
+            SELECT product_id, template_id, default_code, marca, tipo FROM finanzas2.cont_producto_odoo
+        """)
+        self.productos = {
+            r['product_id']: ProductoOdoo(r['template_id'], r['default_code'] or '', r['marca'] or '', r['tipo'] or '')
+            for r in rows
+        }
+        self._loaded = True
+
+    async def refresh(self, pool, odoo) -> int:
+        """Pull catalog changes from Odoo; returns how many products changed"""
+        async with self._lock, pool.acquire() as conn:
+            if not self._loaded:
+                await self._load(conn)
+            marks = await conn.fetchrow("""
+                SELECT MAX(product_write_date) AS p, MAX(template_write_date) AS t FROM finanzas2.cont_producto_odoo
+            """)
+            # >= on the watermark re-reads rows stamped in the same second; upserts make that harmless
+            since_p = marks['p'].strftime(ODOO_DATETIME) if marks['p'] else None
+            since_t = marks['t'].strftime(ODOO_DATETIME) if marks['t'] else None
+            products = await odoo.get_products_since(since_p)
+            templates = {t['id']: t for t in await odoo.get_templates_since(since_t)}
+
+            # New products may point at templates that did not change; resolve those locally or via one read
+            conocidos = {p.template_id: p for p in self.productos.values() if p.template_id}
+            faltantes = sorted({m2o_id(p.get('product_tmpl_id')) for p in products}
+                               - set(templates) - set(conocidos) - {None})
+            for t in await odoo.get_templates(faltantes):
+                templates[t['id']] = t
+
+            changed = self._merge(products, templates, conocidos)
+            if changed:
+                await self._store(conn, changed, products, templates)
+            if products or templates:
+                logger.info(f"Product dimension: {len(products)} products, {len(templates)} templates changed")
+            return len(changed)
+
+    def _merge(self, products: List[Dict[str, Any]], templates: Dict[int, Dict[str, Any]],
+               conocidos: Dict[int, ProductoOdoo]) -> Dict[int, ProductoOdoo]:
+        changed: Dict[int, ProductoOdoo] = {}
+        for p in products:
+            tmpl_id = m2o_id(p.get('product_tmpl_id'))
+            if tmpl_id in templates:
+                marca = m2o_name(templates[tmpl_id].get('marca'))
+                tipo = m2o_name(templates[tmpl_id].get('tipo'))
+            elif tmpl_id in conocidos:
+                marca, tipo = conocidos[tmpl_id].marca, conocidos[tmpl_id].tipo
+            else:
+                marca = tipo = ''
+            changed[p['id']] = ProductoOdoo(tmpl_id, p.get('default_code') or '', marca, tipo)
+        # A template edit (marca/tipo) applies to every product already mirrored under it
+        for product_id, prod in self.productos.items():
+            if product_id not in changed and prod.template_id in templates:
+                t = templates[prod.template_id]
+                changed[product_id] = prod._replace(marca=m2o_name(t.get('marca')), tipo=m2o_name(t.get('tipo')))
+        self.productos.update(changed)
+        return changed
+
+    async def _store(self, conn, changed: Dict[int, ProductoOdoo], products: List[Dict[str, Any]],
+                     templates: Dict[int, Dict[str, Any]]):
+        product_wd = {p['id']: _parse_wd(p.get('write_date')) for p in products}
+        template_wd = {t_id: _parse_wd(t.get('write_date')) for t_id, t in templates.items()}
+        ids = list(changed)
+        await conn.execute("""
+            INSERT INTO finanzas2.cont_producto_odoo
+                (product_id, template_id, default_code, marca, tipo, product_write_date, template_write_date)
+            SELECT * FROM unnest($1::int[], $2::int[], $3::text[], $4::text[], $5::text[],
+                                 $6::timestamp[], $7::timestamp[])
+            ON CONFLICT (product_id) DO UPDATE SET
+                template_id = EXCLUDED.template_id,
+                default_code = EXCLUDED.default_code,
+                marca = EXCLUDED.marca,
+                tipo = EXCLUDED.tipo,
+                product_write_date = COALESCE(EXCLUDED.product_write_date, cont_producto_odoo.product_write_date),
+                template_write_date = COALESCE(EXCLUDED.template_write_date, cont_producto_odoo.template_write_date),
+                updated_at = NOW()
+        """, ids,
+            [changed[i].template_id for i in ids],
+            [changed[i].default_code for i in ids],
+            [changed[i].marca for i in ids],
+            [changed[i].tipo for i in ids],
+            [product_wd.get(i) for i in ids],
+            [template_wd.get(changed[i].template_id) for i in ids])
+
+    def missing(self, product_ids: Iterable[Optional[int]]) -> List[int]:
+        return sorted({p for p in product_ids if p} - set(self.productos))
+
+    def enrich(self, lines: Iterable[Dict[str, Any]]):
+        """Fill product_code, marca and tipo on Odoo lines from the local catalog"""
+        for line in lines:
+            prod = self.productos.get(m2o_id(line.get('product_id')))
+            if prod:
+                line['product_code'] = prod.default_code
+                line['marca'] = prod.marca
+                line['tipo'] = prod.tipo
+
+
+producto_dimension = ProductoDimension()
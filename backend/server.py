@@ -1,5 +1,6 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Header, UploadFile, File
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Header, UploadFile, File, Request
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from fastapi.encoders import jsonable_encoder
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 import os
@@ -7,13 +8,18 @@ import logging
 from pathlib import Path
 from typing import List, Optional
 from datetime import datetime, date, timedelta, timezone
+import asyncio
 import asyncpg
+import hashlib
 import io
+import json
+from itertools import islice
 
-from database import init_db, close_db, get_pool
+from database import init_db, close_db, get_pool, DATABASE_URL
 from models import (
     Empresa, EmpresaCreate, EmpresaUpdate,
     Moneda, MonedaCreate,
+    TipoCambio, TipoCambioCreate,
     Categoria, CategoriaCreate, CategoriaUpdate,
     CentroCosto, CentroCostoCreate,
     LineaNegocio, LineaNegocioCreate,
@@ -28,13 +34,30 @@ from models import (
     Gasto, GastoCreate, GastoLinea,
     Planilla, PlanillaCreate, PlanillaDetalle,
     Adelanto, AdelantoCreate,
-    VentaPOS, CXC, CXCCreate,
+    VentaPOS, AceptarPagosOdooRequest, CXC, CXCCreate,
     Presupuesto, PresupuestoCreate,
-    Conciliacion, ConciliacionCreate, BancoMovRaw, BancoMov,
+    Conciliacion, ConciliacionCreate, BancoMovRaw, BancoMov, AceptarPropuestasRequest,
+    PeriodoCerrado, PeriodoCerradoCreate,
     DashboardKPIs,
     CuentaContable, CuentaContableCreate, CuentaContableUpdate, ConfigEmpresaContable
 )
-from odoo_service import OdooService
+from pos_sync import pos_sync_scheduler, empresa_sync_targets, POS_SYNC_TARGETS
+from pos_pagos import aceptar_pagos_odoo
+from sync_events import sync_event_bus
+from odoo_service import ODOO_COMPANIES
+from banco_import import (
+    BANCO_IMPORT_CHUNK_ROWS, BANCO_IMPORT_DIR, banco_import_jobs, es_excel, iter_statement_rows, spool_upload,
+)
+from banco_parsers import iter_movimientos
+from conciliacion_auto import (
+    CONCILIACION_SCORE_MINIMO, CONCILIACION_VENTANA_DIAS, aceptar_pares, cargar_pendientes, propuesta_to_dict,
+    proponer_conciliacion,
+)
+from tipo_cambio_service import (
+    tipo_cambio_service, tipo_cambio_asof_join, monto_principal_sql, tipo_cambio_faltante_sql,
+)
+from produccion_cache import produccion_cache
+from export_cache import export_file_cache, fingerprint as export_fingerprint
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -79,6 +102,14 @@ def safe_date_param(fecha_value):
 
 app = FastAPI(title="Finanzas 4.0 API", version="1.0.0")
 
+
+@app.exception_handler(asyncpg.exceptions.RaiseError)
+async def periodo_cerrado_handler(request, exc: asyncpg.exceptions.RaiseError):
+    """Surface writes rejected by the closed-period trigger as a 400"""
+    if getattr(exc, 'hint', None) == 'periodo_cerrado':
+        return JSONResponse(status_code=400, content={"detail": exc.message})
+    raise exc
+
 api_router = APIRouter(prefix="/api")
 
 
@@ -118,10 +149,18 @@ async def startup():
     await init_db()
     await seed_data()
     await sync_correlativos()
+    await sync_categoria_closure()
+    await produccion_cache.refresh(await get_pool())
+    await sync_event_bus.start(DATABASE_URL)
+    pos_sync_scheduler.start_schedule(await get_pool())
+    await banco_import_jobs.resume_pending(await get_pool())
     logger.info("Finanzas 4.0 API started successfully")
 
 @app.on_event("shutdown")
 async def shutdown():
+    await pos_sync_scheduler.stop()
+    await banco_import_jobs.stop()
+    await sync_event_bus.stop()
     await close_db()
     logger.info("Finanzas 4.0 API shutdown complete")
 
@@ -459,18 +498,147 @@ async def delete_moneda(id: int):
             raise HTTPException(404, "Moneda not found")
         return {"message": "Moneda deleted"}
 
+# =====================
+# TIPOS DE CAMBIO
+# =====================
+@api_router.get("/tipos-cambio", response_model=List[TipoCambio])
+async def list_tipos_cambio(
+    moneda_id: Optional[int] = None,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+):
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        await conn.execute("SET search_path TO finanzas2, public")
+        conditions = ["1 = 1"]
+        params = []
+        if moneda_id:
+            params.append(moneda_id)
+            conditions.append(f"tc.moneda_id = ${len(params)}")
+        if fecha_desde:
+            params.append(fecha_desde)
+            conditions.append(f"tc.fecha >= ${len(params)}")
+        if fecha_hasta:
+            params.append(fecha_hasta)
+            conditions.append(f"tc.fecha <= ${len(params)}")
+        rows = await conn.fetch(f"""
+            SELECT tc.*, m.codigo as moneda_codigo
+            FROM finanzas2.cont_tipo_cambio tc
+            LEFT JOIN finanzas2.cont_moneda m ON tc.moneda_id = m.id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY tc.fecha DESC, m.codigo
+        """, *params)
+        return [dict(r) for r in rows]
+
+@api_router.get("/tipos-cambio/vigente")
+async def get_tipo_cambio_vigente(moneda_id: int = Query(...), fecha: date = Query(...)):
+    """Rate in effect on `fecha`: the latest registered rate dated on or before it."""
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        serie = await tipo_cambio_service.get_serie(conn, moneda_id)
+    tasa_venta = serie.tasa(fecha, "venta")
+    if tasa_venta is None:
+        raise HTTPException(404, "No hay tipo de cambio registrado para esa fecha")
+    return {
+        "moneda_id": moneda_id,
+        "fecha": fecha,
+        "tasa_compra": serie.tasa(fecha, "compra"),
+        "tasa_venta": tasa_venta,
+    }
+
+@api_router.post("/tipos-cambio", response_model=TipoCambio)
+async def upsert_tipo_cambio(data: TipoCambioCreate):
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        await conn.execute("SET search_path TO finanzas2, public")
+        row = await conn.fetchrow("""
+            INSERT INTO finanzas2.cont_tipo_cambio (moneda_id, fecha, tasa_compra, tasa_venta)
+            VALUES ($1, $2, $3, $4)
+            ON CONFLICT (moneda_id, fecha)
+            DO UPDATE SET tasa_compra = EXCLUDED.tasa_compra, tasa_venta = EXCLUDED.tasa_venta
+            RETURNING *
+        """, data.moneda_id, data.fecha, data.tasa_compra, data.tasa_venta)
+        tipo_cambio_service.invalidate(data.moneda_id)
+        return dict(row)
+
+@api_router.delete("/tipos-cambio/{id}")
+async def delete_tipo_cambio(id: int):
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        await conn.execute("SET search_path TO finanzas2, public")
+        moneda_id = await conn.fetchval(
+            "DELETE FROM finanzas2.cont_tipo_cambio WHERE id = $1 RETURNING moneda_id", id
+        )
+        if moneda_id is None:
+            raise HTTPException(404, "Tipo de cambio not found")
+        tipo_cambio_service.invalidate(moneda_id)
+        return {"message": "Tipo de cambio deleted"}
+
 # =====================
 # CATEGORIAS
 # =====================
+CATEGORIA_MAX_DEPTH = 32
+
+async def rebuild_categoria_closure(conn, empresa_id: int):
+    """Rebuild the closure table and materialized path (nombre_completo, nivel)
+    for all categories of an empresa. Must run inside the writer's transaction."""
+    # Serialize rebuilds per empresa: two concurrent writers would both delete the old
+    # rows and the second INSERT would then collide with the first one's committed rows
+    await conn.execute("SELECT pg_advisory_xact_lock(hashtext('categoria_closure'), $1)", empresa_id)
+    await conn.execute("DELETE FROM finanzas2.cont_categoria_closure WHERE empresa_id = $1", empresa_id)
+    await conn.execute("""
+        WITH RECURSIVE arbol AS (
+            SELECT id AS ancestor_id, id AS descendant_id, 0 AS depth
+            FROM finanzas2.cont_categoria
+            WHERE empresa_id = $1
+            UNION ALL
+            SELECT a.ancestor_id, c.id, a.depth + 1
+            FROM arbol a
+            JOIN finanzas2.cont_categoria c ON c.padre_id = a.descendant_id AND c.empresa_id = $1
+            WHERE a.depth < $2
+        )
+        INSERT INTO finanzas2.cont_categoria_closure (empresa_id, ancestor_id, descendant_id, depth)
+        SELECT $1, ancestor_id, descendant_id, MIN(depth)
+        FROM arbol
+        GROUP BY ancestor_id, descendant_id
+    """, empresa_id, CATEGORIA_MAX_DEPTH)
+    await conn.execute("""
+        UPDATE finanzas2.cont_categoria c
+        SET nombre_completo = p.ruta, nivel = p.nivel
+        FROM (
+            SELECT cl.descendant_id,
+                   STRING_AGG(a.nombre, ' > ' ORDER BY cl.depth DESC) AS ruta,
+                   MAX(cl.depth) + 1 AS nivel
+            FROM finanzas2.cont_categoria_closure cl
+            JOIN finanzas2.cont_categoria a ON a.id = cl.ancestor_id
+            WHERE cl.empresa_id = $1
+            GROUP BY cl.descendant_id
+        ) p
+        WHERE c.id = p.descendant_id
+          AND (c.nombre_completo IS DISTINCT FROM p.ruta OR c.nivel IS DISTINCT FROM p.nivel)
+    """, empresa_id)
+
+
+async def sync_categoria_closure():
+    """Backfill the category closure table for every empresa on startup."""
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        await conn.execute("SET search_path TO finanzas2, public")
+        empresa_ids = await conn.fetch("SELECT DISTINCT empresa_id FROM finanzas2.cont_categoria")
+        for row in empresa_ids:
+            async with conn.transaction():
+                await rebuild_categoria_closure(conn, row['empresa_id'])
+        logger.info("Category closure table synced")
+
+
 @api_router.get("/categorias")
 async def list_categorias(empresa_id: int = Depends(get_empresa_id), tipo: Optional[str] = None):
     pool = await get_pool()
     async with pool.acquire() as conn:
         await conn.execute("SET search_path TO finanzas2, public")
         base_query = """
-            SELECT c.*, cp.nombre as padre_nombre
+            SELECT c.*, COALESCE(c.nombre_completo, c.nombre) as nombre_completo
             FROM finanzas2.cont_categoria c
-            LEFT JOIN finanzas2.cont_categoria cp ON c.padre_id = cp.id
             WHERE c.empresa_id = $1
         """
         if tipo:
@@ -479,25 +647,39 @@ async def list_categorias(empresa_id: int = Depends(get_empresa_id), tipo: Optio
             )
         else:
             rows = await conn.fetch(base_query + " ORDER BY c.tipo, c.nombre", empresa_id)
-        result = []
-        for r in rows:
-            item = dict(r)
-            padre_nombre = item.pop("padre_nombre", None)
-            item["nombre_completo"] = f"{padre_nombre} > {item['nombre']}" if padre_nombre else item["nombre"]
-            result.append(item)
-        return result
+        return [dict(r) for r in rows]
+
+@api_router.get("/categorias/{id}/subarbol")
+async def get_categoria_subarbol(id: int, empresa_id: int = Depends(get_empresa_id)):
+    """Return the category and all of its descendants, resolved via the closure table."""
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        await conn.execute("SET search_path TO finanzas2, public")
+        rows = await conn.fetch("""
+            SELECT c.*, cl.depth
+            FROM finanzas2.cont_categoria_closure cl
+            JOIN finanzas2.cont_categoria c ON c.id = cl.descendant_id
+            WHERE cl.ancestor_id = $1 AND cl.empresa_id = $2
+            ORDER BY cl.depth, c.nombre
+        """, id, empresa_id)
+        if not rows:
+            raise HTTPException(404, "Categoria not found")
+        return [dict(r) for r in rows]
 
 @api_router.post("/categorias", response_model=Categoria)
 async def create_categoria(data: CategoriaCreate, empresa_id: int = Depends(get_empresa_id)):
     pool = await get_pool()
     async with pool.acquire() as conn:
         await conn.execute("SET search_path TO finanzas2, public")
-        row = await conn.fetchrow("""
-            INSERT INTO finanzas2.cont_categoria (empresa_id, codigo, nombre, tipo, padre_id, descripcion, cuenta_gasto_id, activo)
-            VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
-            RETURNING *
-        """, empresa_id, data.codigo, data.nombre, data.tipo, data.padre_id, data.descripcion, data.cuenta_gasto_id, data.activo)
-        return dict(row)
+        async with conn.transaction():
+            row = await conn.fetchrow("""
+                INSERT INTO finanzas2.cont_categoria (empresa_id, codigo, nombre, tipo, padre_id, descripcion, cuenta_gasto_id, activo)
+                VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+                RETURNING id
+            """, empresa_id, data.codigo, data.nombre, data.tipo, data.padre_id, data.descripcion, data.cuenta_gasto_id, data.activo)
+            await rebuild_categoria_closure(conn, empresa_id)
+            row = await conn.fetchrow("SELECT * FROM finanzas2.cont_categoria WHERE id = $1", row['id'])
+            return dict(row)
 
 @api_router.put("/categorias/{id}", response_model=Categoria)
 async def update_categoria(id: int, data: CategoriaUpdate, empresa_id: int = Depends(get_empresa_id)):
@@ -507,28 +689,43 @@ async def update_categoria(id: int, data: CategoriaUpdate, empresa_id: int = Dep
         updates = []
         values = []
         idx = 1
-        for field, value in data.model_dump(exclude_unset=True).items():
+        fields = data.model_dump(exclude_unset=True)
+        for field, value in fields.items():
             updates.append(f"{field} = ${idx}")
             values.append(value)
             idx += 1
         if not updates:
             raise HTTPException(400, "No fields to update")
-        values.append(empresa_id)
-        values.append(id)
-        query = f"UPDATE finanzas2.cont_categoria SET {', '.join(updates)}, updated_at = NOW() WHERE empresa_id = ${idx} AND id = ${idx+1} RETURNING *"
-        row = await conn.fetchrow(query, *values)
-        if not row:
-            raise HTTPException(404, "Categoria not found")
-        return dict(row)
+        async with conn.transaction():
+            if fields.get('padre_id') is not None:
+                # Reject moves that would make the category its own ancestor
+                ciclo = await conn.fetchval("""
+                    SELECT 1 FROM finanzas2.cont_categoria_closure
+                    WHERE ancestor_id = $1 AND descendant_id = $2
+                """, id, fields['padre_id'])
+                if ciclo:
+                    raise HTTPException(400, "La categoría padre no puede ser la misma categoría ni una de sus subcategorías")
+            values.append(empresa_id)
+            values.append(id)
+            query = f"UPDATE finanzas2.cont_categoria SET {', '.join(updates)}, updated_at = NOW() WHERE empresa_id = ${idx} AND id = ${idx+1} RETURNING id"
+            row = await conn.fetchrow(query, *values)
+            if not row:
+                raise HTTPException(404, "Categoria not found")
+            if 'padre_id' in fields or 'nombre' in fields:
+                await rebuild_categoria_closure(conn, empresa_id)
+            row = await conn.fetchrow("SELECT * FROM finanzas2.cont_categoria WHERE id = $1", id)
+            return dict(row)
 
 @api_router.delete("/categorias/{id}")
 async def delete_categoria(id: int, empresa_id: int = Depends(get_empresa_id)):
     pool = await get_pool()
     async with pool.acquire() as conn:
         await conn.execute("SET search_path TO finanzas2, public")
-        result = await conn.execute("DELETE FROM finanzas2.cont_categoria WHERE id = $1 AND empresa_id = $2", id, empresa_id)
-        if result == "DELETE 0":
-            raise HTTPException(404, "Categoria not found")
+        async with conn.transaction():
+            result = await conn.execute("DELETE FROM finanzas2.cont_categoria WHERE id = $1 AND empresa_id = $2", id, empresa_id)
+            if result == "DELETE 0":
+                raise HTTPException(404, "Categoria not found")
+            await rebuild_categoria_closure(conn, empresa_id)
         return {"message": "Categoria deleted"}
 
 # =====================
@@ -1062,28 +1259,17 @@ async def get_empleado_detalle(tercero_id: int, empresa_id: int = Depends(get_em
 @api_router.get("/articulos", response_model=List[ArticuloRef])
 async def list_articulos(search: Optional[str] = None, empresa_id: int = Depends(get_empresa_id)):
     pool = await get_pool()
+    
+    # First try the cached produccion.prod_inventario snapshot
+    await produccion_cache.ensure_loaded(pool)
+    if produccion_cache.disponible:
+        inv_rows = produccion_cache.articulos.buscar(search, 100)
+        if inv_rows:
+            return inv_rows
+    
     async with pool.acquire() as conn:
         await conn.execute("SET search_path TO finanzas2, public")
         
-        # First try to get from produccion.prod_inventario if exists
-        try:
-            inv_rows = await conn.fetch("""
-                SELECT id, id as prod_inventario_id, 
-                       COALESCE(codigo, '') as codigo,
-                       COALESCE(nombre, descripcion, 'Sin nombre') as nombre,
-                       descripcion,
-                       COALESCE(precio_ref, 0) as precio_referencia,
-                       TRUE as activo,
-                       NOW() as created_at
-                FROM produccion.prod_inventario
-                WHERE ($1::text IS NULL OR nombre ILIKE $1 OR codigo ILIKE $1)
-                LIMIT 100
-            """, f"%{search}%" if search else None)
-            if inv_rows:
-                return [dict(r) for r in inv_rows]
-        except Exception as e:
-            logger.warning(f"Could not fetch from prod_inventario: {e}")
-        
         # Fallback to local articulo_ref
         query = "SELECT * FROM finanzas2.cont_articulo_ref WHERE activo = TRUE"
         if search:
@@ -1098,71 +1284,41 @@ async def list_articulos(search: Optional[str] = None, empresa_id: int = Depends
 # =====================
 @api_router.get("/inventario")
 async def list_inventario(search: Optional[str] = None, empresa_id: int = Depends(get_empresa_id)):
-    """Get items from produccion.prod_inventario"""
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        try:
-            search_param = f"%{search}%" if search else None
-            rows = await conn.fetch("""
-                SELECT id, codigo, nombre, descripcion, categoria, unidad_medida,
-                       COALESCE(stock_actual, 0) as stock_actual,
-                       COALESCE(stock_minimo, 0) as stock_minimo,
-                       COALESCE(precio_ref, 0) as precio_ref,
-                       COALESCE(costo_compra, 0) as costo_compra,
-                       modelo, marca, activo
-                FROM produccion.prod_inventario
-                WHERE ($1::text IS NULL OR nombre ILIKE $1 OR codigo ILIKE $1 OR descripcion ILIKE $1)
-                ORDER BY nombre
-                LIMIT 200
-            """, search_param)
-            return [dict(r) for r in rows]
-        except Exception as e:
-            logger.error(f"Error fetching inventario: {e}")
-            return []
+    """Get items from produccion.prod_inventario (served from produccion_cache)"""
+    await produccion_cache.ensure_loaded(await get_pool())
+    if not produccion_cache.disponible:
+        return []
+    return produccion_cache.inventario.buscar(search, 200)
 
 # =====================
 # MODELOS/CORTES (produccion.prod_registros + prod_modelos)
 # =====================
 @api_router.get("/modelos-cortes")
 async def list_modelos_cortes(search: Optional[str] = None, empresa_id: int = Depends(get_empresa_id)):
-    """Get modelos/cortes from produccion.prod_registros joining with prod_modelos"""
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        try:
-            search_param = f"%{search}%" if search else None
-            rows = await conn.fetch("""
-                SELECT r.id, r.n_corte, r.modelo_id, r.estado,
-                       m.nombre as modelo_nombre,
-                       CONCAT(m.nombre, ' - Corte ', r.n_corte) as display_name
-                FROM produccion.prod_registros r
-                LEFT JOIN produccion.prod_modelos m ON r.modelo_id = m.id
-                WHERE ($1::text IS NULL OR m.nombre ILIKE $1 OR r.n_corte ILIKE $1)
-                ORDER BY r.fecha_creacion DESC
-                LIMIT 200
-            """, search_param)
-            return [dict(r) for r in rows]
-        except Exception as e:
-            logger.error(f"Error fetching modelos/cortes: {e}")
-            return []
+    """Get modelos/cortes from produccion.prod_registros joining with prod_modelos (served from produccion_cache)"""
+    await produccion_cache.ensure_loaded(await get_pool())
+    if not produccion_cache.disponible:
+        return []
+    return produccion_cache.modelos_cortes.buscar(search, 200)
 
 @api_router.get("/modelos")
 async def list_modelos(search: Optional[str] = None, empresa_id: int = Depends(get_empresa_id)):
-    """Get modelos from produccion.prod_modelos"""
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        try:
-            search_param = f"%{search}%" if search else None
-            rows = await conn.fetch("""
-                SELECT id, nombre
-                FROM produccion.prod_modelos
-                WHERE ($1::text IS NULL OR nombre ILIKE $1)
-                ORDER BY nombre
-                LIMIT 100
-            """, search_param)
-            return [dict(r) for r in rows]
-        except Exception as e:
-            logger.error(f"Error fetching modelos: {e}")
-            return []
+    """Get modelos from produccion.prod_modelos (served from produccion_cache)"""
+    await produccion_cache.ensure_loaded(await get_pool())
+    if not produccion_cache.disponible:
+        return []
+    return produccion_cache.modelos.buscar(search, 100)
+
+@api_router.post("/produccion/cache/refresh")
+async def refresh_produccion_cache():
+    """Force a reload of the produccion lookup snapshot"""
+    await produccion_cache.refresh(await get_pool())
+    return {
+        "disponible": produccion_cache.disponible,
+        "inventario": len(produccion_cache.inventario.rows) if produccion_cache.inventario else 0,
+        "modelos_cortes": len(produccion_cache.modelos_cortes.rows) if produccion_cache.modelos_cortes else 0,
+        "modelos": len(produccion_cache.modelos.rows) if produccion_cache.modelos else 0,
+    }
 
 @api_router.post("/articulos", response_model=ArticuloRef)
 async def create_articulo(data: ArticuloRefCreate, empresa_id: int = Depends(get_empresa_id)):
@@ -1530,7 +1686,7 @@ async def list_facturas_proveedor(
             fp_dict = dict(row)
             lineas = await conn.fetch("""
                 SELECT fpl.*, c.nombre as categoria_nombre, c.padre_id as categoria_padre_id,
-                       cp.nombre as categoria_padre_nombre,
+                       cp.nombre as categoria_padre_nombre, c.nombre_completo as categoria_nombre_completo,
                        ln.nombre as linea_negocio_nombre, cc.nombre as centro_costo_nombre
                 FROM finanzas2.cont_factura_proveedor_linea fpl
                 LEFT JOIN finanzas2.cont_categoria c ON fpl.categoria_id = c.id
@@ -1563,7 +1719,7 @@ async def get_factura_proveedor(id: int, empresa_id: int) -> dict:
         fp_dict = dict(row)
         lineas = await conn.fetch("""
             SELECT fpl.*, c.nombre as categoria_nombre, c.padre_id as categoria_padre_id,
-                   cp.nombre as categoria_padre_nombre,
+                   cp.nombre as categoria_padre_nombre, c.nombre_completo as categoria_nombre_completo,
                    ln.nombre as linea_negocio_nombre, cc.nombre as centro_costo_nombre
             FROM finanzas2.cont_factura_proveedor_linea fpl
             LEFT JOIN finanzas2.cont_categoria c ON fpl.categoria_id = c.id
@@ -1626,6 +1782,7 @@ async def create_factura_proveedor(data: FacturaProveedorCreate, empresa_id: int
             
             # Default fecha_contable = fecha_factura
             fecha_contable = data.fecha_contable or data.fecha_factura
+            tipo_cambio = data.tipo_cambio or await tipo_cambio_service.tasa_vigente(conn, data.moneda_id, data.fecha_factura)
             
             row = await conn.fetchrow("""
                 INSERT INTO finanzas2.cont_factura_proveedor 
@@ -1636,7 +1793,7 @@ async def create_factura_proveedor(data: FacturaProveedorCreate, empresa_id: int
                 RETURNING id
             """, empresa_id, numero, data.proveedor_id, data.beneficiario_nombre, data.moneda_id,
                 safe_date_param(data.fecha_factura), safe_date_param(fecha_contable), safe_date_param(fecha_vencimiento), data.terminos_dias, data.tipo_documento,
-                subtotal, igv, total, data.impuestos_incluidos, data.tipo_comprobante_sunat, base_gravada, igv_sunat, base_no_gravada, isc_val, data.tipo_cambio, data.notas)
+                subtotal, igv, total, data.impuestos_incluidos, data.tipo_comprobante_sunat, base_gravada, igv_sunat, base_no_gravada, isc_val, tipo_cambio, data.notas)
             
             factura_id = row['id']
             
@@ -1672,7 +1829,7 @@ async def create_factura_proveedor(data: FacturaProveedorCreate, empresa_id: int
             fp_dict = dict(row)
             lineas = await conn.fetch("""
                 SELECT fpl.*, c.nombre as categoria_nombre, c.padre_id as categoria_padre_id,
-                       cp.nombre as categoria_padre_nombre,
+                       cp.nombre as categoria_padre_nombre, c.nombre_completo as categoria_nombre_completo,
                        ln.nombre as linea_negocio_nombre, cc.nombre as centro_costo_nombre
                 FROM finanzas2.cont_factura_proveedor_linea fpl
                 LEFT JOIN finanzas2.cont_categoria c ON fpl.categoria_id = c.id
@@ -2424,7 +2581,7 @@ async def list_gastos(
             gasto_dict = dict(row)
             lineas = await conn.fetch("""
                 SELECT gl.*, c.nombre as categoria_nombre, c.padre_id as categoria_padre_id,
-                       cp.nombre as categoria_padre_nombre
+                       cp.nombre as categoria_padre_nombre, c.nombre_completo as categoria_nombre_completo
                 FROM finanzas2.cont_gasto_linea gl
                 LEFT JOIN finanzas2.cont_categoria c ON gl.categoria_id = c.id
                 LEFT JOIN finanzas2.cont_categoria cp ON c.padre_id = cp.id
@@ -2476,6 +2633,7 @@ async def create_gasto(data: GastoCreate, empresa_id: int = Depends(get_empresa_
             
             # Create gasto first
             fecha_contable = data.fecha_contable or data.fecha
+            tipo_cambio = data.tipo_cambio or await tipo_cambio_service.tasa_vigente(conn, data.moneda_id, data.fecha)
             gasto = await conn.fetchrow("""
                 INSERT INTO finanzas2.cont_gasto 
                 (empresa_id, numero, fecha, fecha_contable, proveedor_id, beneficiario_nombre, moneda_id, subtotal, igv, total,
@@ -2483,7 +2641,7 @@ async def create_gasto(data: GastoCreate, empresa_id: int = Depends(get_empresa_
                 VALUES ($1, $2, TO_DATE($3, 'YYYY-MM-DD'), TO_DATE($4, 'YYYY-MM-DD'), $5, $6, $7, $8, $9, $10, $11, $12, $13, $14, $15, $16, $17, $18, $19)
                 RETURNING id
             """, empresa_id, numero, safe_date_param(data.fecha), safe_date_param(fecha_contable), data.proveedor_id, data.beneficiario_nombre, data.moneda_id,
-                subtotal, igv, total, data.tipo_documento, data.numero_documento, data.tipo_comprobante_sunat, base_gravada, igv_sunat, base_no_gravada, isc_val, data.tipo_cambio, data.notas)
+                subtotal, igv, total, data.tipo_documento, data.numero_documento, data.tipo_comprobante_sunat, base_gravada, igv_sunat, base_no_gravada, isc_val, tipo_cambio, data.notas)
             
             gasto_id = gasto['id']
             
@@ -2547,7 +2705,7 @@ async def create_gasto(data: GastoCreate, empresa_id: int = Depends(get_empresa_
             gasto_dict = dict(row)
             lineas_rows = await conn.fetch("""
                 SELECT gl.*, c.nombre as categoria_nombre, c.padre_id as categoria_padre_id,
-                       cp.nombre as categoria_padre_nombre
+                       cp.nombre as categoria_padre_nombre, c.nombre_completo as categoria_nombre_completo
                 FROM finanzas2.cont_gasto_linea gl
                 LEFT JOIN finanzas2.cont_categoria c ON gl.categoria_id = c.id
                 LEFT JOIN finanzas2.cont_categoria cp ON c.padre_id = cp.id
@@ -2576,7 +2734,7 @@ async def get_gasto(id: int) -> dict:
         gasto_dict = dict(row)
         lineas = await conn.fetch("""
             SELECT gl.*, c.nombre as categoria_nombre, c.padre_id as categoria_padre_id,
-                   cp.nombre as categoria_padre_nombre
+                   cp.nombre as categoria_padre_nombre, c.nombre_completo as categoria_nombre_completo
             FROM finanzas2.cont_gasto_linea gl
             LEFT JOIN finanzas2.cont_categoria c ON gl.categoria_id = c.id
             LEFT JOIN finanzas2.cont_categoria cp ON c.padre_id = cp.id
@@ -2602,11 +2760,12 @@ async def delete_gasto(id: int, empresa_id: int = Depends(get_empresa_id)):
         if not gasto:
             raise HTTPException(status_code=404, detail="Gasto no encontrado")
         
-        # Delete associated lines
-        await conn.execute("DELETE FROM finanzas2.cont_gasto_linea WHERE gasto_id = $1", id)
-        
-        # Delete the gasto (pagos should cascade or be handled separately)
-        await conn.execute("DELETE FROM finanzas2.cont_gasto WHERE id = $1 AND empresa_id = $2", id, empresa_id)
+        async with conn.transaction():
+            # Delete associated lines
+            await conn.execute("DELETE FROM finanzas2.cont_gasto_linea WHERE gasto_id = $1", id)
+            
+            # Delete the gasto (pagos should cascade or be handled separately)
+            await conn.execute("DELETE FROM finanzas2.cont_gasto WHERE id = $1 AND empresa_id = $2", id, empresa_id)
         
         return {"message": "Gasto eliminado exitosamente"}
 
@@ -3116,206 +3275,126 @@ async def list_ventas_pos(
         return [dict(r) for r in rows]
 
 @api_router.post("/ventas-pos/sync")
-async def sync_ventas_pos(company: str = "ambission", days_back: int = 30, empresa_id: int = Depends(get_empresa_id)):
-    """Sync POS orders from Odoo"""
-    try:
-        odoo = OdooService(company=company)
-        if not odoo.authenticate():
-            raise HTTPException(401, f"Could not authenticate with Odoo ({company})")
-        
-        orders = odoo.get_pos_orders(days_back=days_back)
-        
-        if not orders:
-            return {"message": "No orders found", "synced": 0}
-        
-        pool = await get_pool()
-        async with pool.acquire() as conn:
-            await conn.execute("SET search_path TO finanzas2, public")
-            
-            synced = 0
-            for order in orders:
+async def sync_ventas_pos(company: str = "ambission", days_back: int = 30, full_resync: bool = False,
+                          empresa_id: int = Depends(get_empresa_id)):
+    """
+    Start a background sync of POS orders from Odoo and return its job immediately.
+    Only orders created or modified since the last sync are fetched; the first sync
+    and `full_resync` fall back to the last `days_back` days, paging through all of them.
+    If a sync for the same company/empresa is already running, that job is returned.
+    """
+    if company not in ODOO_COMPANIES:
+        raise HTTPException(400, f"Unknown company: {company}")
+    pool = await get_pool()
+    job = await pos_sync_scheduler.start_job(pool, company, empresa_id, days_back=days_back,
+                                             full_resync=full_resync)
+    return {"message": f"Sync {job['estado']} for {company}", "job_id": job['id'], "estado": job['estado']}
+
+@api_router.post("/ventas-pos/sync/all")
+async def sync_ventas_pos_all(days_back: int = 30, full_resync: bool = False,
+                              empresa_id: int = Depends(get_empresa_id)):
+    """
+    Sync every Odoo company of the current empresa concurrently (its POS_SYNC_TARGETS
+    entries, or every Odoo company when no targets are configured). Returns the run id
+    immediately; the aggregated report is at GET /ventas-pos/sync/runs/{run_id}.
+    """
+    targets = empresa_sync_targets(POS_SYNC_TARGETS, empresa_id, ODOO_COMPANIES)
+    if not targets:
+        raise HTTPException(400, "No hay compañías Odoo configuradas para esta empresa")
+    pool = await get_pool()
+    return await pos_sync_scheduler.start_run(pool, targets, days_back=days_back, full_resync=full_resync)
+
+@api_router.get("/ventas-pos/sync/runs/{run_id}")
+async def get_sync_ventas_pos_run(run_id: str, empresa_id: int = Depends(get_empresa_id)):
+    """Aggregated per-company results and errors of a multi-company sync run"""
+    pool = await get_pool()
+    report = await pos_sync_scheduler.run_report(pool, run_id, empresa_id)
+    if report is None:
+        raise HTTPException(404, "Sync run not found")
+    return report
+
+SYNC_EVENTOS_FINALES = ('completado', 'error', 'omitido')
+
+@api_router.get("/ventas-pos/sync/events")
+async def stream_sync_ventas_pos(request: Request, company: Optional[str] = None, job_id: Optional[int] = None,
+                                 empresa_id: int = Depends(get_empresa_id)):
+    """
+    Server-Sent Events stream of POS sync progress for the empresa.
+    Starts with an `estado` snapshot, then relays `inicio`, `progreso` (stats + eta_seconds),
+    `completado`, `error` and `omitido` events. With job_id the stream ends when that job does.
+    """
+    queue = sync_event_bus.subscribe()
+    pool = await get_pool()
+
+    def sse(tipo: str, data) -> str:
+        return f"event: {tipo}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+    async def eventos():
+        try:
+            snapshot = await pos_sync_scheduler.status(pool, company or "ambission", empresa_id, job_id=job_id)
+            yield sse("estado", snapshot)
+            job = snapshot["job"]
+            if job_id is not None and (job is None or job["estado"] in SYNC_EVENTOS_FINALES):
+                return
+            while True:
                 try:
-                    # Extract values with proper handling of Odoo's tuple format
-                    odoo_id = order.get('id')
-                    
-                    # Parse date_order (comes as string from Odoo)
-                    date_order_str = order.get('date_order')
-                    if date_order_str and isinstance(date_order_str, str):
-                        date_order = datetime.strptime(date_order_str, '%Y-%m-%d %H:%M:%S')
-                    else:
-                        date_order = date_order_str
-                    
-                    name = order.get('name')
-                    tipo_comp = order.get('tipo_comp')
-                    num_comp = order.get('num_comp')
-                    
-                    # partner_id comes as [id, name] tuple from Odoo
-                    partner_id = order['partner_id'][0] if isinstance(order.get('partner_id'), list) else order.get('partner_id')
-                    partner_name = order['partner_id'][1] if isinstance(order.get('partner_id'), list) else None
-                    
-                    # x_tienda comes as [id, name] tuple
-                    tienda_id = order['x_tienda'][0] if isinstance(order.get('x_tienda'), list) else None
-                    tienda_name = order['x_tienda'][1] if isinstance(order.get('x_tienda'), list) else order.get('x_tienda')
-                    
-                    # vendedor_id comes as [id, name] tuple
-                    vendedor_id = order['vendedor_id'][0] if isinstance(order.get('vendedor_id'), list) else order.get('vendedor_id')
-                    vendedor_name = order['vendedor_id'][1] if isinstance(order.get('vendedor_id'), list) else None
-                    
-                    # company_id comes as [id, name] tuple
-                    company_id = order['company_id'][0] if isinstance(order.get('company_id'), list) else order.get('company_id')
-                    company_name = order['company_id'][1] if isinstance(order.get('company_id'), list) else None
-                    
-                    # x_pagos: convert False to None or empty string
-                    x_pagos = order.get('x_pagos')
-                    if x_pagos == False or x_pagos == 'False':
-                        x_pagos = None
-                    
-                    quantity_total = order.get('quantity_pos_order')
-                    amount_total = order.get('amount_total')
-                    state = order.get('state')
-                    
-                    reserva_pendiente = order.get('x_reserva_pendiente', 0)
-                    reserva_facturada = order.get('x_reserva_facturada', 0)
-                    is_cancel = order.get('is_cancel', False)
-                    
-                    # order_cancel: can be False, string, or [id, name] list
-                    order_cancel_raw = order.get('order_cancel')
-                    if order_cancel_raw == False or order_cancel_raw == 'False':
-                        order_cancel = None
-                    elif isinstance(order_cancel_raw, list) and len(order_cancel_raw) > 1:
-                        order_cancel = order_cancel_raw[1]  # Use the name part
-                    else:
-                        order_cancel = order_cancel_raw
-                    
-                    reserva = order.get('reserva', False)
-                    is_credit = order.get('is_credit', False)
-                    
-                    # reserva_use_id: can be False, int, or [id, name] list
-                    reserva_use_id_raw = order.get('reserva_use_id')
-                    if reserva_use_id_raw == False or reserva_use_id_raw == 'False':
-                        reserva_use_id = None
-                    elif isinstance(reserva_use_id_raw, list) and len(reserva_use_id_raw) > 0:
-                        reserva_use_id = reserva_use_id_raw[0]  # Use the ID part
-                    else:
-                        reserva_use_id = reserva_use_id_raw
-                    
-                    # Check if already exists
-                    existing = await conn.fetchrow("""
-                        SELECT id, estado_local FROM finanzas2.cont_venta_pos 
-                        WHERE odoo_id = $1
-                    """, odoo_id)
-                    
-                    # If exists and already processed (confirmada/credito/descartada), skip update
-                    if existing:
-                        existing_estado = existing['estado_local']
-                        if existing_estado in ['confirmada', 'credito', 'descartada']:
-                            # Skip this order - already processed, don't re-import
-                            continue
-                    
-                    if existing:
-                        # Update existing record
-                        await conn.execute("""
-                            UPDATE finanzas2.cont_venta_pos SET
-                                date_order = $2,
-                                name = $3,
-                                tipo_comp = $4,
-                                num_comp = $5,
-                                partner_id = $6,
-                                partner_name = $7,
-                                tienda_id = $8,
-                                tienda_name = $9,
-                                vendedor_id = $10,
-                                vendedor_name = $11,
-                                company_id = $12,
-                                company_name = $13,
-                                x_pagos = $14,
-                                quantity_total = $15,
-                                amount_total = $16,
-                                state = $17,
-                                reserva_pendiente = $18,
-                                reserva_facturada = $19,
-                                is_cancel = $20,
-                                order_cancel = $21,
-                                reserva = $22,
-                                is_credit = $23,
-                                reserva_use_id = $24,
-                                synced_at = NOW()
-                            WHERE odoo_id = $1
-                        """, odoo_id, date_order, name, tipo_comp, num_comp,
-                            partner_id, partner_name, tienda_id, tienda_name,
-                            vendedor_id, vendedor_name, company_id, company_name,
-                            x_pagos, quantity_total, amount_total, state,
-                            reserva_pendiente, reserva_facturada, is_cancel,
-                            order_cancel, reserva, is_credit, reserva_use_id)
-                    else:
-                        # Insert new record
-                        await conn.execute("""
-                            INSERT INTO finanzas2.cont_venta_pos 
-                            (odoo_id, date_order, name, tipo_comp, num_comp,
-                             partner_id, partner_name, tienda_id, tienda_name,
-                             vendedor_id, vendedor_name, company_id, company_name,
-                             x_pagos, quantity_total, amount_total, state,
-                             reserva_pendiente, reserva_facturada, is_cancel,
-                             order_cancel, reserva, is_credit, reserva_use_id,
-                             synced_at, empresa_id)
-                            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10,
-                                    $11, $12, $13, $14, $15, $16, $17, $18, $19,
-                                    $20, $21, $22, $23, $24, NOW(), $25)
-                        """, odoo_id, date_order, name, tipo_comp, num_comp,
-                            partner_id, partner_name, tienda_id, tienda_name,
-                            vendedor_id, vendedor_name, company_id, company_name,
-                            x_pagos, quantity_total, amount_total, state,
-                            reserva_pendiente, reserva_facturada, is_cancel,
-                            order_cancel, reserva, is_credit, reserva_use_id, empresa_id)
-                    
-                    # Sync product lines for this order
-                    try:
-                        # Get the local venta_pos id
-                        local_venta = await conn.fetchrow("""
-                            SELECT id FROM finanzas2.cont_venta_pos WHERE odoo_id = $1
-                        """, odoo_id)
-                        
-                        if local_venta:
-                            venta_pos_id = local_venta['id']
-                            
-                            # Delete existing lines (to avoid duplicates on re-sync)
-                            await conn.execute("""
-                                DELETE FROM finanzas2.cont_venta_pos_linea WHERE venta_pos_id = $1
-                            """, venta_pos_id)
-                            
-                            # Get lines from Odoo with marca and tipo
-                            lines = odoo.get_order_lines(odoo_id)
-                            
-                            for line in lines:
-                                product_name = line['product_id'][1] if isinstance(line.get('product_id'), list) else 'Producto'
-                                product_id_val = line['product_id'][0] if isinstance(line.get('product_id'), list) else line.get('product_id')
-                                
-                                await conn.execute("""
-                                    INSERT INTO finanzas2.cont_venta_pos_linea
-                                    (venta_pos_id, odoo_line_id, product_id, product_name, product_code,
-                                     qty, price_unit, price_subtotal, price_subtotal_incl, discount,
-                                     marca, tipo, empresa_id)
-                                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10, $11, $12, $13)
-                                """, venta_pos_id, line.get('id'), product_id_val, product_name,
-                                    line.get('product_code', ''), line.get('qty', 0),
-                                    line.get('price_unit', 0), line.get('price_subtotal', 0),
-                                    line.get('price_subtotal_incl', 0), line.get('discount', 0),
-                                    line.get('marca', ''), line.get('tipo', ''), empresa_id)
-                    except Exception as line_error:
-                        logger.error(f"Error syncing lines for order {odoo_id}: {line_error}")
-                        # Continue even if lines fail - main order is synced
-                    
-                    synced += 1
-                    
-                except Exception as row_error:
-                    logger.error(f"Error processing order {order.get('id')}: {row_error}")
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": ping\n\n"
                     continue
-        
-        return {"message": f"Synced {synced} orders from {company}", "synced": synced}
-        
-    except Exception as e:
-        logger.error(f"Error syncing from Odoo: {e}")
-        raise HTTPException(500, f"Error syncing: {str(e)}")
+                if event["empresa_id"] != empresa_id or (company and event["company"] != company):
+                    continue
+                if job_id is not None and event["job_id"] != job_id:
+                    continue
+                yield sse(event["tipo"], event)
+                if job_id is not None and event["tipo"] in SYNC_EVENTOS_FINALES:
+                    return
+        finally:
+            sync_event_bus.unsubscribe(queue)
+
+    return StreamingResponse(eventos(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@api_router.get("/ventas-pos/sync/status")
+async def get_sync_ventas_pos_status(company: str = "ambission", job_id: Optional[int] = None,
+                                     empresa_id: int = Depends(get_empresa_id)):
+    """Progress, counts, duration and last error of the POS sync for a company"""
+    pool = await get_pool()
+    status = await pos_sync_scheduler.status(pool, company, empresa_id, job_id=job_id)
+    if job_id is not None and status["job"] is None:
+        raise HTTPException(404, "Sync job not found")
+    return status
+
+@api_router.post("/ventas-pos/pagos-odoo/aceptar")
+async def aceptar_pagos_odoo_ventas_pos(data: AceptarPagosOdooRequest, empresa_id: int = Depends(get_empresa_id)):
+    """
+    Accept the payments parsed from Odoo x_pagos for pending POS sales and confirm them
+    in one transaction. Only sales whose parsed payments all map to a cuenta in `cuentas`
+    and add up to amount_total are confirmed; the rest stay pending.
+    """
+    if not data.cuentas:
+        raise HTTPException(400, "cuentas es requerido")
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            result = await aceptar_pagos_odoo(conn, empresa_id, data.cuentas, venta_ids=data.venta_ids,
+                                              fecha_desde=data.fecha_desde, fecha_hasta=data.fecha_hasta)
+    return {"message": f"{result['confirmadas']} ventas confirmadas con pagos de Odoo", **result}
+
+@api_router.get("/ventas-pos/{id}/pagos-odoo")
+async def get_pagos_odoo_venta_pos(id: int, empresa_id: int = Depends(get_empresa_id)):
+    """Payments parsed from the Odoo x_pagos of a POS sale"""
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        pagos = await conn.fetch("""
+            SELECT secuencia, forma_pago, monto, referencia
+            FROM finanzas2.cont_venta_pos_pago_odoo
+            WHERE venta_pos_id = $1 AND empresa_id = $2
+            ORDER BY secuencia
+        """, id, empresa_id)
+        return [dict(p) for p in pagos]
 
 @api_router.post("/ventas-pos/{id}/confirmar")
 async def confirmar_venta_pos(id: int, empresa_id: int = Depends(get_empresa_id)):
@@ -3804,336 +3883,90 @@ async def get_presupuesto_endpoint(id: int, empresa_id: int = Depends(get_empres
 # =====================
 # CONCILIACION BANCARIA
 # =====================
+BANCO_PREVIEW_ROWS = 50
+
 @api_router.post("/conciliacion/previsualizar-excel")
 async def previsualizar_excel_banco(
     file: UploadFile = File(...),
     banco: str = Query(...),
     empresa_id: int = Depends(get_empresa_id),
 ):
-    """Preview bank movements from Excel before importing"""
-    import io
-    from datetime import datetime as dt
-    
+    """Preview bank movements from an Excel, CSV or TXT statement before importing"""
+    path = await spool_upload(file)
     try:
-        content = await file.read()
-        
-        import openpyxl
-        wb = openpyxl.load_workbook(io.BytesIO(content))
-        ws = wb.active
-        
-        # Find header row
-        header_row = 1
-        for idx, row in enumerate(ws.iter_rows(min_row=1, max_row=10, values_only=True), 1):
-            if row and any(row):
-                row_str = ' '.join([str(c or '') for c in row]).lower()
-                if 'fecha' in row_str or 'f. valor' in row_str or 'f. operación' in row_str:
-                    header_row = idx
-                    break
-        
-        preview_data = []
-        
-        for row in ws.iter_rows(min_row=header_row + 1, max_row=header_row + 51, values_only=True):
-            if not row or not any(row):
-                continue
-            
-            fecha = None
-            descripcion = None
-            referencia = None
-            monto = None
-            
-            try:
-                if banco == 'BCP':
-                    # BCP: Nº, Fecha, Fecha valuta, Descripción operación, Monto, Saldo, Sucursal, Operación-Número
-                    fecha = row[1] if len(row) > 1 else None
-                    descripcion = row[3] if len(row) > 3 else None
-                    monto_val = row[4] if len(row) > 4 else None
-                    referencia = row[7] if len(row) > 7 else None
-                    
-                    if monto_val:
-                        monto = float(monto_val) if not isinstance(monto_val, str) else float(str(monto_val).replace(',', ''))
-                            
-                elif banco == 'BBVA':
-                    # BBVA: N°, F. Operación, F. Valor, Código, Nº. Doc., Concepto, Importe, Oficina
-                    # Skip "Saldo Final" rows
-                    concepto = row[5] if len(row) > 5 else None
-                    if concepto and 'saldo final' in str(concepto).lower():
-                        continue
-                    
-                    fecha = row[1] if len(row) > 1 else None
-                    referencia = row[4] if len(row) > 4 else None
-                    descripcion = row[5] if len(row) > 5 else None
-                    importe = row[6] if len(row) > 6 else None
-                    
-                    if importe:
-                        monto = float(importe) if not isinstance(importe, str) else float(str(importe).replace(',', ''))
-                            
-                elif banco == 'IBK':
-                    # IBK format: Nº, Fecha de operación, Fecha de proceso, Nro. de operación, 
-                    #             Movimiento, Descripción, Canal, Cargo, Abono, Saldo contable
-                    # Skip metadata rows (first 13 rows usually) and rows without valid number
-                    if len(row) < 10:
-                        continue
-                    
-                    # Check if it's a data row (should have a number in first column)
-                    try:
-                        nro = int(row[0]) if row[0] and str(row[0]).strip() else None
-                        if not nro:
-                            continue
-                    except (ValueError, TypeError):
-                        continue
-                    
-                    fecha = row[1] if len(row) > 1 else None  # Fecha de operación
-                    referencia = row[3] if len(row) > 3 else None  # Nro. de operación
-                    descripcion = row[5] if len(row) > 5 else None  # Descripción
-                    cargo = row[7] if len(row) > 7 else None  # Cargo
-                    abono = row[8] if len(row) > 8 else None  # Abono
-                    
-                    # Calculate monto (negative for cargo, positive for abono)
-                    if cargo and cargo != '' and str(cargo).strip() != 'nan':
-                        try:
-                            cargo_val = float(cargo) if not isinstance(cargo, str) else float(str(cargo).replace(',', ''))
-                            monto = -abs(cargo_val)  # Ensure it's negative
-                        except (ValueError, TypeError):
-                            monto = None
-                    elif abono and abono != '' and str(abono).strip() != 'nan':
-                        try:
-                            abono_val = float(abono) if not isinstance(abono, str) else float(str(abono).replace(',', ''))
-                            monto = abs(abono_val)  # Ensure it's positive
-                        except (ValueError, TypeError):
-                            monto = None
-                    else:
-                        monto = None
-                        
-                else:
-                    # PERSONALIZADO
-                    fecha = row[0] if len(row) > 0 else None
-                    descripcion = row[1] if len(row) > 1 else None
-                    referencia = row[2] if len(row) > 2 else None
-                    monto = row[3] if len(row) > 3 else None
-                
-                # Parse date
-                if fecha:
-                    if isinstance(fecha, dt):
-                        fecha = fecha.date().isoformat()
-                    elif hasattr(fecha, 'date'):
-                        fecha = fecha.date().isoformat()
-                    elif isinstance(fecha, str):
-                        for fmt in ['%d/%m/%Y', '%d-%m-%Y', '%Y-%m-%d', '%d.%m.%Y']:
-                            try:
-                                fecha = dt.strptime(fecha.strip(), fmt).date().isoformat()
-                                break
-                            except:
-                                continue
-                
-                if not fecha or monto is None:
-                    continue
-                
-                preview_data.append({
-                    "fecha": fecha,
-                    "banco": banco,  # Use selected bank name
-                    "referencia": str(referencia)[:200] if referencia else "",
-                    "descripcion": str(descripcion)[:500] if descripcion else "",
-                    "monto": float(monto) if monto else 0.0
-                })
-                
-                if len(preview_data) >= 50:
-                    break
-                    
-            except Exception as row_error:
-                logger.warning(f"Error parsing row: {row_error}")
-                continue
-        
-        return {
-            "preview": preview_data,
-            "total_rows": len(preview_data)
-        }
-        
+        # Streaming stops once BANCO_PREVIEW_ROWS movements are parsed
+        movimientos = await asyncio.to_thread(
+            lambda: list(islice(iter_movimientos(iter_statement_rows(path, banco), banco), BANCO_PREVIEW_ROWS)))
     except Exception as e:
         logger.error(f"Error previewing Excel: {e}")
         raise HTTPException(500, f"Error al previsualizar: {str(e)}")
+    finally:
+        os.unlink(path)
+
+    preview_data = [{
+        "fecha": fecha.isoformat(),
+        "banco": banco,  # Use selected bank name
+        "referencia": referencia,
+        "descripcion": descripcion,
+        "monto": monto,
+    } for fecha, descripcion, referencia, monto in movimientos]
+    return {
+        "preview": preview_data,
+        "total_rows": len(preview_data)
+    }
 
 @api_router.post("/conciliacion/importar-excel")
 async def importar_excel_banco(
     file: UploadFile = File(...),
     cuenta_financiera_id: int = Query(...),
     banco: str = Query(...),
+    chunk_filas: int = Query(BANCO_IMPORT_CHUNK_ROWS, ge=100, le=50000),
     empresa_id: int = Depends(get_empresa_id),
 ):
-    """Import bank movements from Excel - UPSERT based on banco + referencia"""
-    import io
-    from datetime import datetime as dt
-    
+    """
+    Queue the import of an Excel, CSV or TXT statement and return its job immediately.
+    Movements are UPSERTed on banco + referencia + fecha, committing every `chunk_filas`
+    rows; progress and row errors are at GET /conciliacion/importaciones/{job_id}.
+    Re-uploading a file already imported into the account returns its job (`duplicado`);
+    rows seen in earlier uploads are skipped.
+    """
     pool = await get_pool()
-    
+    digest = hashlib.sha256()
+    path = await spool_upload(file, BANCO_IMPORT_DIR, digest)
     try:
-        content = await file.read()
-        
-        import openpyxl
-        wb = openpyxl.load_workbook(io.BytesIO(content))
-        ws = wb.active
-        
-        async with pool.acquire() as conn:
-            await conn.execute("SET search_path TO finanzas2, public")
-            
-            imported = 0
-            updated = 0
-            skipped = 0
-            
-            # Find header row
-            header_row = 1
-            for idx, row in enumerate(ws.iter_rows(min_row=1, max_row=10, values_only=True), 1):
-                if row and any(row):
-                    row_str = ' '.join([str(c or '') for c in row]).lower()
-                    if 'fecha' in row_str or 'f. valor' in row_str or 'f. operación' in row_str:
-                        header_row = idx
-                        break
-            
-            for row in ws.iter_rows(min_row=header_row + 1, values_only=True):
-                if not row or not any(row):
-                    continue
-                
-                fecha = None
-                descripcion = None
-                referencia = None
-                monto = None
-                
-                try:
-                    if banco == 'BCP':
-                        # BCP: Nº, Fecha, Fecha valuta, Descripción operación, Monto, Saldo, Sucursal, Operación-Número
-                        fecha = row[1] if len(row) > 1 else None
-                        descripcion = row[3] if len(row) > 3 else None
-                        monto_val = row[4] if len(row) > 4 else None
-                        referencia = row[7] if len(row) > 7 else None
-                        
-                        if monto_val:
-                            monto = float(monto_val) if not isinstance(monto_val, str) else float(str(monto_val).replace(',', ''))
-                                
-                    elif banco == 'BBVA':
-                        # BBVA: N°, F. Operación, F. Valor, Código, Nº. Doc., Concepto, Importe, Oficina
-                        # Skip "Saldo Final" rows
-                        concepto = row[5] if len(row) > 5 else None
-                        if concepto and 'saldo final' in str(concepto).lower():
-                            continue
-                        
-                        fecha = row[1] if len(row) > 1 else None
-                        referencia = row[4] if len(row) > 4 else None
-                        descripcion = row[5] if len(row) > 5 else None
-                        importe = row[6] if len(row) > 6 else None
-                        
-                        if importe:
-                            monto = float(importe) if not isinstance(importe, str) else float(str(importe).replace(',', ''))
-                                
-                    elif banco == 'IBK':
-                        # IBK format: Nº, Fecha de operación, Fecha de proceso, Nro. de operación, 
-                        #             Movimiento, Descripción, Canal, Cargo, Abono, Saldo contable
-                        # Skip metadata rows (first 13 rows usually) and rows without valid number
-                        if len(row) < 10:
-                            continue
-                        
-                        # Check if it's a data row (should have a number in first column)
-                        try:
-                            nro = int(row[0]) if row[0] and str(row[0]).strip() else None
-                            if not nro:
-                                continue
-                        except (ValueError, TypeError):
-                            continue
-                        
-                        fecha = row[1] if len(row) > 1 else None  # Fecha de operación
-                        referencia = row[3] if len(row) > 3 else None  # Nro. de operación
-                        descripcion = row[5] if len(row) > 5 else None  # Descripción
-                        cargo = row[7] if len(row) > 7 else None  # Cargo
-                        abono = row[8] if len(row) > 8 else None  # Abono
-                        
-                        # Calculate monto (negative for cargo, positive for abono)
-                        if cargo and cargo != '' and str(cargo).strip() != 'nan':
-                            try:
-                                cargo_val = float(cargo) if not isinstance(cargo, str) else float(str(cargo).replace(',', ''))
-                                monto = -abs(cargo_val)  # Ensure it's negative
-                            except (ValueError, TypeError):
-                                monto = None
-                        elif abono and abono != '' and str(abono).strip() != 'nan':
-                            try:
-                                abono_val = float(abono) if not isinstance(abono, str) else float(str(abono).replace(',', ''))
-                                monto = abs(abono_val)  # Ensure it's positive
-                            except (ValueError, TypeError):
-                                monto = None
-                        else:
-                            monto = None
-                            
-                    else:
-                        # PERSONALIZADO
-                        fecha = row[0] if len(row) > 0 else None
-                        descripcion = row[1] if len(row) > 1 else None
-                        referencia = row[2] if len(row) > 2 else None
-                        monto = row[3] if len(row) > 3 else None
-                    
-                    # Parse date
-                    if fecha:
-                        if isinstance(fecha, dt):
-                            fecha = fecha.date()
-                        elif hasattr(fecha, 'date'):
-                            fecha = fecha.date()
-                        elif isinstance(fecha, str):
-                            for fmt in ['%d/%m/%Y', '%d-%m-%Y', '%Y-%m-%d', '%d.%m.%Y']:
-                                try:
-                                    fecha = dt.strptime(fecha.strip(), fmt).date()
-                                    break
-                                except:
-                                    continue
-                    
-                    # Skip rows without valid date or monto
-                    if not fecha or monto is None:
-                        continue
-                    
-                    # Clean fields
-                    ref_clean = str(referencia).strip()[:200] if referencia else ''
-                    desc_clean = str(descripcion).strip()[:500] if descripcion else ''
-                    
-                    # Check if exists and if it's already reconciled
-                    existing = await conn.fetchrow("""
-                        SELECT id, procesado FROM finanzas2.cont_banco_mov_raw 
-                        WHERE cuenta_financiera_id = $1 
-                          AND banco = $2
-                          AND COALESCE(referencia, '') = $3
-                          AND fecha = $4
-                    """, cuenta_financiera_id, banco, ref_clean, fecha)
-                    
-                    if existing:
-                        if existing['procesado']:
-                            skipped += 1
-                            continue
-                        else:
-                            # Update existing record
-                            await conn.execute("""
-                                UPDATE finanzas2.cont_banco_mov_raw 
-                                SET descripcion = $1, monto = $2, banco_excel = $3
-                                WHERE id = $4
-                            """, desc_clean, monto, banco, existing['id'])
-                            updated += 1
-                    else:
-                        # Insert new record
-                        await conn.execute("""
-                            INSERT INTO finanzas2.cont_banco_mov_raw 
-                            (cuenta_financiera_id, banco, fecha, descripcion, referencia, monto, banco_excel, procesado, empresa_id)
-                            VALUES ($1, $2, $3, $4, $5, $6, $7, FALSE, $8)
-                        """, cuenta_financiera_id, banco, fecha, desc_clean, 
-                            ref_clean if ref_clean else None, monto, banco, empresa_id)
-                        imported += 1
-                    
-                except Exception as row_error:
-                    logger.warning(f"Error parsing row: {row_error}")
-                    continue
-        
-        return {
-            "message": f"Importados: {imported}, Actualizados: {updated}, Omitidos (ya conciliados): {skipped}",
-            "imported": imported,
-            "updated": updated,
-            "skipped": skipped
-        }
-        
+        es_excel(path)
+        job = await banco_import_jobs.start_job(pool, path, file.filename, digest.hexdigest(), cuenta_financiera_id,
+                                                banco, empresa_id, chunk_filas)
+    except ValueError as e:
+        os.unlink(path)
+        raise HTTPException(400, str(e))
     except Exception as e:
-        logger.error(f"Error importing Excel: {e}")
+        os.unlink(path)
+        logger.error(f"Error queueing bank import: {e}")
         raise HTTPException(500, f"Error al importar: {str(e)}")
+    if job['duplicado']:
+        return {"message": f"Archivo ya importado (importación #{job['id']})", "job_id": job['id'],
+                "estado": job['estado'], "duplicado": True}
+    return {"message": f"Importación en cola: {file.filename}", "job_id": job['id'], "estado": job['estado'],
+            "duplicado": False}
+
+@api_router.get("/conciliacion/importaciones/{job_id}")
+async def get_importacion_banco(job_id: int, empresa_id: int = Depends(get_empresa_id)):
+    """Status of a bank import job: estado, progreso (%), checkpoint, counts and row errors"""
+    pool = await get_pool()
+    job = await banco_import_jobs.status(pool, job_id, empresa_id)
+    if job is None:
+        raise HTTPException(404, "Importación no encontrada")
+    return job
+
+@api_router.post("/conciliacion/importaciones/{job_id}/reanudar")
+async def reanudar_importacion_banco(job_id: int, empresa_id: int = Depends(get_empresa_id)):
+    """Resume a failed bank import job after its last committed chunk"""
+    pool = await get_pool()
+    job = await banco_import_jobs.resume_job(pool, job_id, empresa_id)
+    if job is None:
+        raise HTTPException(404, "Importación no encontrada")
+    return {"message": f"Importación {job['estado']}", "job_id": job['id'], "estado": job['estado']}
 
 
 @api_router.get("/conciliacion/historial")
@@ -4426,6 +4259,51 @@ async def conciliar_movimientos(
             "sistema_conciliados": len(pago_ids)
         }
 
+@api_router.get("/conciliacion/propuestas")
+async def get_propuestas_conciliacion(
+    cuenta_financiera_id: int = Query(...),
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+    ventana_dias: int = Query(CONCILIACION_VENTANA_DIAS, ge=0, le=60),
+    empresa_id: int = Depends(get_empresa_id),
+):
+    """
+    Ranked bank movement / system payment pairs for automatic reconciliation.
+    Pairs have the same signed amount and dates within `ventana_dias`; the score
+    weighs reference similarity and date distance.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        movs, pagos = await cargar_pendientes(conn, empresa_id, cuenta_financiera_id, fecha_desde, fecha_hasta,
+                                              ventana_dias)
+    propuestas = proponer_conciliacion(movs, pagos, ventana_dias)
+    return {
+        "propuestas": [propuesta_to_dict(p) for p in propuestas],
+        "banco_pendientes": len(movs),
+        "sistema_pendientes": len(pagos),
+    }
+
+@api_router.post("/conciliacion/propuestas/aceptar")
+async def aceptar_propuestas_conciliacion(data: AceptarPropuestasRequest, empresa_id: int = Depends(get_empresa_id)):
+    """
+    Reconcile many proposed pairs at once. Without `pares`, every current proposal
+    scoring at least `score_minimo` is accepted.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            if data.pares is not None:
+                pares = [(p.banco_id, p.pago_id) for p in data.pares]
+            else:
+                ventana = data.ventana_dias if data.ventana_dias is not None else CONCILIACION_VENTANA_DIAS
+                minimo = data.score_minimo if data.score_minimo is not None else CONCILIACION_SCORE_MINIMO
+                movs, pagos = await cargar_pendientes(conn, empresa_id, data.cuenta_financiera_id,
+                                                      data.fecha_desde, data.fecha_hasta, ventana)
+                pares = [(p.banco.id, p.pago.id) for p in proponer_conciliacion(movs, pagos, ventana)
+                         if p.score >= minimo]
+            result = await aceptar_pares(conn, empresa_id, data.cuenta_financiera_id, pares)
+    return {"message": f"Conciliados {result['conciliados']} pares banco/sistema", **result}
+
 @api_router.post("/conciliacion/crear-gasto-bancario")
 async def crear_gasto_desde_movimientos_bancarios(
     banco_ids: List[int] = Query(...),
@@ -4588,6 +4466,94 @@ async def create_conciliacion(data: ConciliacionCreate, empresa_id: int = Depend
         result['lineas'] = []
         return result
 
+# =====================
+# PERIODOS CERRADOS
+# =====================
+CACHE_CONTROL_INMUTABLE = "private, max-age=31536000, immutable"
+
+@api_router.get("/periodos-cerrados", response_model=List[PeriodoCerrado])
+async def list_periodos_cerrados(empresa_id: int = Depends(get_empresa_id)):
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        await conn.execute("SET search_path TO finanzas2, public")
+        rows = await conn.fetch("""
+            SELECT * FROM finanzas2.cont_periodo_cerrado
+            WHERE empresa_id = $1 ORDER BY anio DESC, mes DESC
+        """, empresa_id)
+        return [dict(r) for r in rows]
+
+@api_router.post("/periodos-cerrados", response_model=PeriodoCerrado)
+async def cerrar_periodo(data: PeriodoCerradoCreate, empresa_id: int = Depends(get_empresa_id)):
+    """Close a month: writes dated inside it are rejected until it is reopened."""
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        await conn.execute("SET search_path TO finanzas2, public")
+        row = await conn.fetchrow("""
+            INSERT INTO finanzas2.cont_periodo_cerrado (empresa_id, anio, mes, notas)
+            VALUES ($1, $2, $3, $4)
+            ON CONFLICT (empresa_id, anio, mes) DO UPDATE SET notas = COALESCE(EXCLUDED.notas, finanzas2.cont_periodo_cerrado.notas)
+            RETURNING *
+        """, empresa_id, data.anio, data.mes, data.notas)
+        return dict(row)
+
+@api_router.delete("/periodos-cerrados/{anio}/{mes}")
+async def reabrir_periodo(anio: int, mes: int, empresa_id: int = Depends(get_empresa_id)):
+    """Reopen a month (explicit unlock) and drop cached reports that cover it."""
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        await conn.execute("SET search_path TO finanzas2, public")
+        async with conn.transaction():
+            result = await conn.execute("""
+                DELETE FROM finanzas2.cont_periodo_cerrado WHERE empresa_id = $1 AND anio = $2 AND mes = $3
+            """, empresa_id, anio, mes)
+            if result == "DELETE 0":
+                raise HTTPException(404, "Periodo no está cerrado")
+            inicio = date(anio, mes, 1)
+            fin = date(anio + (mes // 12), mes % 12 + 1, 1) - timedelta(days=1)
+            await conn.execute("""
+                DELETE FROM finanzas2.cont_reporte_cache
+                WHERE empresa_id = $1 AND fecha_desde <= $3 AND fecha_hasta >= $2
+            """, empresa_id, inicio, fin)
+        return {"message": f"Periodo {anio}-{mes:02d} reabierto"}
+
+async def rango_en_periodo_cerrado(conn, empresa_id: int, desde: Optional[date], hasta: Optional[date]) -> bool:
+    """True when every month touched by [desde, hasta] is closed for the empresa."""
+    if not desde or not hasta or desde > hasta:
+        return False
+    mes_desde = desde.year * 12 + desde.month - 1
+    mes_hasta = hasta.year * 12 + hasta.month - 1
+    cerrados = await conn.fetchval("""
+        SELECT COUNT(*) FROM finanzas2.cont_periodo_cerrado
+        WHERE empresa_id = $1 AND anio * 12 + mes - 1 BETWEEN $2 AND $3
+    """, empresa_id, mes_desde, mes_hasta)
+    return cerrados == mes_hasta - mes_desde + 1
+
+async def get_reporte_cache(conn, empresa_id: int, clave: str):
+    return await conn.fetchrow("""
+        SELECT etag, media_type, payload FROM finanzas2.cont_reporte_cache
+        WHERE empresa_id = $1 AND clave = $2
+    """, empresa_id, clave)
+
+async def store_reporte_cache(conn, empresa_id: int, clave: str, desde: date, hasta: date,
+                              payload: bytes, media_type: str) -> str:
+    """Persist a closed-period payload and return its content-hash ETag."""
+    etag = f'"{hashlib.sha256(payload).hexdigest()}"'
+    await conn.execute("""
+        INSERT INTO finanzas2.cont_reporte_cache (empresa_id, clave, fecha_desde, fecha_hasta, etag, media_type, payload)
+        VALUES ($1, $2, $3, $4, $5, $6, $7)
+        ON CONFLICT (empresa_id, clave) DO UPDATE SET
+            etag = EXCLUDED.etag, media_type = EXCLUDED.media_type, payload = EXCLUDED.payload, created_at = NOW()
+    """, empresa_id, clave, desde, hasta, etag, media_type, payload)
+    return etag
+
+def respuesta_inmutable(payload: bytes, media_type: str, etag: str, if_none_match: Optional[str],
+                        headers: Optional[dict] = None) -> Response:
+    """Response for a closed-period payload: long-lived Cache-Control, ETag and 304 support."""
+    cache_headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL_INMUTABLE}
+    if if_none_match and (if_none_match.strip() == "*" or etag in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=304, headers=cache_headers)
+    return Response(content=payload, media_type=media_type, headers={**cache_headers, **(headers or {})})
+
 # =====================
 # REPORTES
 # =====================
@@ -4596,11 +4562,20 @@ async def reporte_flujo_caja(
     fecha_desde: date = Query(...),
     fecha_hasta: date = Query(...),
     empresa_id: int = Depends(get_empresa_id),
+    if_none_match: Optional[str] = Header(None),
 ):
     pool = await get_pool()
     async with pool.acquire() as conn:
         await conn.execute("SET search_path TO finanzas2, public")
         
+        # Ranges entirely inside closed periods are served from the immutable cache
+        clave = f"flujo-caja:{fecha_desde}:{fecha_hasta}"
+        cerrado = await rango_en_periodo_cerrado(conn, empresa_id, fecha_desde, fecha_hasta)
+        if cerrado:
+            cached = await get_reporte_cache(conn, empresa_id, clave)
+            if cached:
+                return respuesta_inmutable(cached['payload'], cached['media_type'], cached['etag'], if_none_match)
+        
         rows = await conn.fetch("""
             SELECT p.fecha, p.tipo, p.monto_total, p.notas,
                    cf.nombre as cuenta
@@ -4627,39 +4602,89 @@ async def reporte_flujo_caja(
                 "saldo_acumulado": saldo_acumulado
             })
         
+        if cerrado:
+            payload = json.dumps(jsonable_encoder(resultado)).encode()
+            etag = await store_reporte_cache(conn, empresa_id, clave, fecha_desde, fecha_hasta, payload, "application/json")
+            return respuesta_inmutable(payload, "application/json", etag, if_none_match)
         return resultado
 
 @api_router.get("/reportes/estado-resultados")
 async def reporte_estado_resultados(
     fecha_desde: date = Query(...),
     fecha_hasta: date = Query(...),
+    categoria_id: Optional[int] = None,
+    nivel: Optional[int] = Query(None, ge=1),
     empresa_id: int = Depends(get_empresa_id),
+    if_none_match: Optional[str] = Header(None),
 ):
+    """Income statement. `categoria_id` restricts egresos to that category's subtree;
+    `nivel` rolls egresos up to their ancestor at that hierarchy level (1 = root)."""
     pool = await get_pool()
     async with pool.acquire() as conn:
         await conn.execute("SET search_path TO finanzas2, public")
         
-        # Ingresos from ventas POS
-        ingresos = await conn.fetchval("""
-            SELECT COALESCE(SUM(amount_total), 0) 
-            FROM finanzas2.cont_venta_pos 
-            WHERE date_order BETWEEN $1 AND $2 AND estado_local = 'confirmada' AND empresa_id = $3
+        clave = f"estado-resultados:{fecha_desde}:{fecha_hasta}:{categoria_id or ''}:{nivel or ''}"
+        cerrado = await rango_en_periodo_cerrado(conn, empresa_id, fecha_desde, fecha_hasta)
+        if cerrado:
+            cached = await get_reporte_cache(conn, empresa_id, clave)
+            if cached:
+                return respuesta_inmutable(cached['payload'], cached['media_type'], cached['etag'], if_none_match)
+        
+        # Ingresos from ventas POS, converted like egresos: an order without moneda is in the
+        # principal currency, a foreign one uses the as-of rate of its order date
+        venta = await conn.fetchrow(f"""
+            SELECT COALESCE(SUM({monto_principal_sql("v.amount_total")}), 0) as monto,
+                   {tipo_cambio_faltante_sql("v.date_order::date")} as faltantes
+            FROM finanzas2.cont_venta_pos v
+            LEFT JOIN finanzas2.cont_moneda mon ON mon.codigo = v.moneda
+            {tipo_cambio_asof_join("mon.id", "v.date_order::date")}
+            WHERE v.date_order BETWEEN $1 AND $2 AND v.estado_local = 'confirmada' AND v.empresa_id = $3
         """, datetime.combine(fecha_desde, datetime.min.time()), 
-            datetime.combine(fecha_hasta, datetime.max.time()), empresa_id) or 0
-        
-        # Egresos from pagos
-        egresos_data = await conn.fetch("""
-            SELECT c.nombre as categoria, COALESCE(SUM(gl.importe), 0) as monto
+            datetime.combine(fecha_hasta, datetime.max.time()), empresa_id)
+        ingresos = venta['monto'] or 0
+        
+        # Egresos from pagos (subtree filter and rollup resolved via cont_categoria_closure).
+        # Foreign-currency lines are converted with the document rate, else the as-of rate.
+        params = [fecha_desde, fecha_hasta, empresa_id]
+        joins = [
+            "LEFT JOIN finanzas2.cont_categoria c ON gl.categoria_id = c.id",
+            "LEFT JOIN finanzas2.cont_moneda mon ON g.moneda_id = mon.id",
+            tipo_cambio_asof_join("g.moneda_id", "g.fecha"),
+        ]
+        categoria_col = "c.nombre"
+        if categoria_id:
+            params.append(categoria_id)
+            joins.append(f"""JOIN finanzas2.cont_categoria_closure sub
+                ON sub.descendant_id = gl.categoria_id AND sub.ancestor_id = ${len(params)}""")
+        if nivel:
+            params.append(nivel)
+            joins.append(f"""LEFT JOIN finanzas2.cont_categoria_closure up
+                ON up.descendant_id = c.id AND up.depth = GREATEST(c.nivel - ${len(params)}, 0)""")
+            joins.append("LEFT JOIN finanzas2.cont_categoria ca ON ca.id = up.ancestor_id")
+            categoria_col = "COALESCE(ca.nombre_completo, ca.nombre)"
+        egresos_data = await conn.fetch(f"""
+            SELECT {categoria_col} as categoria,
+                   COALESCE(SUM({monto_principal_sql("gl.importe", "g.tipo_cambio")}), 0) as monto,
+                   {tipo_cambio_faltante_sql("g.fecha", "g.tipo_cambio")} as faltantes
             FROM finanzas2.cont_gasto g
             JOIN finanzas2.cont_gasto_linea gl ON g.id = gl.gasto_id
-            LEFT JOIN finanzas2.cont_categoria c ON gl.categoria_id = c.id
+            {' '.join(joins)}
             WHERE g.fecha BETWEEN $1 AND $2 AND g.empresa_id = $3
-            GROUP BY c.nombre
-        """, fecha_desde, fecha_hasta, empresa_id)
+            GROUP BY {categoria_col}
+        """, *params)
+        
+        # A missing rate would otherwise drop (or 1:1) the amount; name the gaps instead
+        faltantes = {(f['moneda'], f['fecha'])
+                     for r in [venta, *egresos_data] for f in json.loads(r['faltantes'])}
+        if faltantes:
+            raise HTTPException(422, detail={
+                "message": "Faltan tipos de cambio para convertir el estado de resultados",
+                "faltantes": [{"moneda": m, "fecha": f} for m, f in sorted(faltantes)],
+            })
         
         total_egresos = sum(float(e['monto']) for e in egresos_data)
         
-        return {
+        resultado = {
             "ingresos": [
                 {"categoria": "Ventas", "tipo": "ingreso", "monto": float(ingresos)}
             ],
@@ -4668,6 +4693,11 @@ async def reporte_estado_resultados(
             "total_egresos": total_egresos,
             "resultado_neto": float(ingresos) - total_egresos
         }
+        if cerrado:
+            payload = json.dumps(jsonable_encoder(resultado)).encode()
+            etag = await store_reporte_cache(conn, empresa_id, clave, fecha_desde, fecha_hasta, payload, "application/json")
+            return respuesta_inmutable(payload, "application/json", etag, if_none_match)
+        return resultado
 
 @api_router.get("/reportes/balance-general")
 async def reporte_balance_general(empresa_id: int = Depends(get_empresa_id)):
@@ -4797,16 +4827,34 @@ async def export_compraapp(
     empresa_id: int = Depends(get_empresa_id),
     desde: Optional[date] = None,
     hasta: Optional[date] = None,
+    if_none_match: Optional[str] = Header(None),
 ):
     """Export purchases (facturas proveedor + gastos) in compraAPP Excel format with voucher columns"""
     import openpyxl
     from openpyxl.styles import Font, Alignment, Border, Side
     from re import sub as re_sub
 
+    XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    filename = f"CompraAPP_{empresa_id}"
+    if desde:
+        filename += f"_{desde}"
+    if hasta:
+        filename += f"_{hasta}"
+    filename += ".xlsx"
+    disposition = {"Content-Disposition": f'attachment; filename="{filename}"'}
+
     pool = await get_pool()
     async with pool.acquire() as conn:
         await conn.execute("SET search_path TO finanzas2, public")
 
+        # Closed-period exports never change: serve the stored workbook
+        clave = f"compraapp:{desde}:{hasta}"
+        cerrado = await rango_en_periodo_cerrado(conn, empresa_id, desde, hasta)
+        if cerrado:
+            cached = await get_reporte_cache(conn, empresa_id, clave)
+            if cached:
+                return respuesta_inmutable(cached['payload'], cached['media_type'], cached['etag'], if_none_match, disposition)
+
         # Build date filters
         fp_conditions = ["fp.empresa_id = $1"]
         g_conditions = ["g.empresa_id = $1"]
@@ -4830,17 +4878,19 @@ async def export_compraapp(
             params_g.append(hasta)
             idx_g += 1
 
-        # Fetch facturas proveedor (include id, fecha_contable, vou_numero, category accounts)
+        # Fetch facturas proveedor (include id, fecha_contable, vou_numero, category accounts).
+        # Missing tipo_cambio falls back to the registered rate in effect on the document date.
         facturas = await conn.fetch(f"""
             SELECT fp.id, fp.numero, fp.fecha_factura, fp.fecha_contable, fp.fecha_vencimiento,
                    fp.tipo_comprobante_sunat, fp.base_gravada, fp.igv_sunat,
-                   fp.base_no_gravada, fp.isc, fp.total, fp.vou_numero, fp.saldo_pendiente,
-                   fp.tipo_cambio,
+                   fp.base_no_gravada, fp.isc, fp.total, fp.vou_numero, fp.saldo_pendiente, fp.updated_at,
+                   COALESCE(fp.tipo_cambio, tc.tasa_venta) as tipo_cambio,
                    t.numero_documento as proveedor_doc, t.nombre as proveedor_nombre,
                    m.codigo as moneda_codigo
             FROM finanzas2.cont_factura_proveedor fp
             LEFT JOIN finanzas2.cont_tercero t ON fp.proveedor_id = t.id
             LEFT JOIN finanzas2.cont_moneda m ON fp.moneda_id = m.id
+            {tipo_cambio_asof_join("fp.moneda_id", "fp.fecha_factura")}
             WHERE {' AND '.join(fp_conditions)}
             ORDER BY COALESCE(fp.fecha_contable, fp.fecha_factura), fp.id
         """, *params_fp)
@@ -4849,13 +4899,14 @@ async def export_compraapp(
         gastos = await conn.fetch(f"""
             SELECT g.id, g.numero_documento, g.fecha, g.fecha_contable,
                    g.tipo_comprobante_sunat, g.base_gravada, g.igv_sunat,
-                   g.base_no_gravada, g.isc, g.total, g.vou_numero,
-                   g.tipo_cambio,
+                   g.base_no_gravada, g.isc, g.total, g.vou_numero, g.updated_at,
+                   COALESCE(g.tipo_cambio, tc.tasa_venta) as tipo_cambio,
                    t.numero_documento as proveedor_doc, t.nombre as proveedor_nombre,
                    m.codigo as moneda_codigo
             FROM finanzas2.cont_gasto g
             LEFT JOIN finanzas2.cont_tercero t ON g.proveedor_id = t.id
             LEFT JOIN finanzas2.cont_moneda m ON g.moneda_id = m.id
+            {tipo_cambio_asof_join("g.moneda_id", "g.fecha")}
             WHERE {' AND '.join(g_conditions)}
             ORDER BY COALESCE(g.fecha_contable, g.fecha), g.id
         """, *params_g)
@@ -4977,166 +5028,170 @@ async def export_compraapp(
                         g['vou_numero'], g['id']
                     )
 
-        # Helper to clean doc number (digits only)
-        def clean_doc(doc_str):
-            if not doc_str:
-                return ""
-            return re_sub(r'[^0-9]', '', str(doc_str))
-
-        # Build Excel
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "CompraAPP"
-
-        # Fixed 61-column order (NEVER change order)
-        COLUMNS_61 = [
-            "Vou.Origen", "Vou.Numero", "Vou.Fecha", "Doc", "Numero",
-            "Fec.Doc", "Fec.Venc.", "Codigo", "B.I.O.G y E. (A)",
-            "B.I.O.G.y E. y NO GRA. (B)", "B.I.O.G.sin D.C.FIS(C)",
-            "AD. NO GRAV.", "I.S.C.", "IGV (A)", "IGV (B)", "IGV (C)",
-            "OTROS TRIB.", "IMP. BOLSA", "Moneda", "TC", "Glosa",
-            "Cta Gastos", "Cta IGV", "Cta O. Trib.", "Cta x Pagar",
-            "C.Costo", "Presupuesto", "R.Doc", "R.numero", "R.Fecha",
-            "D.Numero", "D.Fecha", "RUC", "R.Social", "Tipo",
-            "Tip.Doc.Iden", "Medio de Pago", "Apellido 1", "Apellido 2",
-            "Nombre", "T.Bien", "P.origen", "P.vou", "P.fecha",
-            "P.fecha D.", "P.fecha V.", "P.cta cob", "P.m.pago", "P.doc",
-            "P.num doc", "P.moneda", "P.tc", "P.monto", "P.glosa",
-            "P.fe", "Retencion 0/1", "PDB ndes", "CodTasa", "Ind.Ret",
-            "B.Imp", "IGV",
-        ]
-
-        header_font = Font(bold=True, size=10)
-        thin_border = Border(
-            left=Side(style='thin'), right=Side(style='thin'),
-            top=Side(style='thin'), bottom=Side(style='thin')
+        # Identical inputs produce an identical workbook: reuse the cached file
+        export_key = export_fingerprint(
+            empresa_id, desde, hasta, facturas, gastos, cat_account_map, gasto_cat_account_map,
+            default_cta_gastos, default_cta_igv, default_cta_xpagar,
         )
+        payload = export_file_cache.get(export_key)
+        if payload is None:
+            # Helper to clean doc number (digits only)
+            def clean_doc(doc_str):
+                if not doc_str:
+                    return ""
+                return re_sub(r'[^0-9]', '', str(doc_str))
+
+            # Build Excel
+            wb = openpyxl.Workbook()
+            ws = wb.active
+            ws.title = "CompraAPP"
+
+            # Fixed 61-column order (NEVER change order)
+            COLUMNS_61 = [
+                "Vou.Origen", "Vou.Numero", "Vou.Fecha", "Doc", "Numero",
+                "Fec.Doc", "Fec.Venc.", "Codigo", "B.I.O.G y E. (A)",
+                "B.I.O.G.y E. y NO GRA. (B)", "B.I.O.G.sin D.C.FIS(C)",
+                "AD. NO GRAV.", "I.S.C.", "IGV (A)", "IGV (B)", "IGV (C)",
+                "OTROS TRIB.", "IMP. BOLSA", "Moneda", "TC", "Glosa",
+                "Cta Gastos", "Cta IGV", "Cta O. Trib.", "Cta x Pagar",
+                "C.Costo", "Presupuesto", "R.Doc", "R.numero", "R.Fecha",
+                "D.Numero", "D.Fecha", "RUC", "R.Social", "Tipo",
+                "Tip.Doc.Iden", "Medio de Pago", "Apellido 1", "Apellido 2",
+                "Nombre", "T.Bien", "P.origen", "P.vou", "P.fecha",
+                "P.fecha D.", "P.fecha V.", "P.cta cob", "P.m.pago", "P.doc",
+                "P.num doc", "P.moneda", "P.tc", "P.monto", "P.glosa",
+                "P.fe", "Retencion 0/1", "PDB ndes", "CodTasa", "Ind.Ret",
+                "B.Imp", "IGV",
+            ]
+
+            header_font = Font(bold=True, size=10)
+            thin_border = Border(
+                left=Side(style='thin'), right=Side(style='thin'),
+                top=Side(style='thin'), bottom=Side(style='thin')
+            )
 
-        for col_idx, header in enumerate(COLUMNS_61, 1):
-            cell = ws.cell(row=1, column=col_idx, value=header)
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal='center')
-            cell.border = thin_border
-
-        row_num = 2
-        VOU_ORIGEN = "01"
-
-        def fmt_date(d):
-            if d is None:
-                return None
-            if isinstance(d, str):
-                try:
-                    from datetime import datetime as dt
-                    parsed = dt.strptime(d[:10], "%Y-%m-%d")
-                    return parsed.strftime("%d/%m/%Y")
-                except Exception:
-                    return d[:10]
-            return d.strftime("%d/%m/%Y")
-
-        def fmt_num(val):
-            """Return rounded float or None (truly empty cell)."""
-            if val is None:
-                return None
-            v = round(float(val), 2)
-            return v if v != 0 else None
-
-        def moneda_tc(moneda_codigo, tipo_cambio):
-            """Return (letra, tc) for Moneda/TC columns."""
-            if moneda_codigo == 'USD':
-                return 'D', round(float(tipo_cambio), 2)
-            return 'S', 1.00
-
-        def write_row(ws, row, data_dict):
-            """Write a dict keyed by column name into the correct 61-col positions."""
-            for col_idx, col_name in enumerate(COLUMNS_61, 1):
-                val = data_dict.get(col_name)
-                cell = ws.cell(row=row, column=col_idx, value=val)
+            for col_idx, header in enumerate(COLUMNS_61, 1):
+                cell = ws.cell(row=1, column=col_idx, value=header)
+                cell.font = header_font
+                cell.alignment = Alignment(horizontal='center')
                 cell.border = thin_border
 
-        # Write facturas proveedor
-        for f in facturas:
-            f = dict(f) if not isinstance(f, dict) else f
-            vou_fecha = f.get('fecha_contable') or f.get('fecha_factura')
-            cta_gasto = cat_account_map.get(f['id'], default_cta_gastos) or None
-            igv_val = fmt_num(f['igv_sunat'])
-            cta_igv = default_cta_igv if igv_val else None
-            saldo = float(f.get('saldo_pendiente') or 0)
-            cta_xpagar = default_cta_xpagar if saldo > 0 else None
-            m_letra, m_tc = moneda_tc(f.get('moneda_codigo'), f.get('tipo_cambio'))
-
-            row_data = {
-                "Vou.Origen": VOU_ORIGEN,
-                "Vou.Numero": f.get('vou_numero') or None,
-                "Vou.Fecha": fmt_date(vou_fecha),
-                "Doc": f['tipo_comprobante_sunat'] or None,
-                "Numero": f['numero'] or None,
-                "Fec.Doc": fmt_date(f['fecha_factura']),
-                "Fec.Venc.": fmt_date(f['fecha_vencimiento']),
-                "Codigo": clean_doc(f['proveedor_doc']) or None,
-                "B.I.O.G y E. (A)": fmt_num(f['base_gravada']),
-                "AD. NO GRAV.": fmt_num(f['base_no_gravada']),
-                "I.S.C.": fmt_num(f['isc']),
-                "IGV (A)": igv_val,
-                "Moneda": m_letra,
-                "TC": m_tc,
-                "Cta Gastos": cta_gasto,
-                "Cta IGV": cta_igv,
-                "Cta x Pagar": cta_xpagar,
-            }
-            write_row(ws, row_num, row_data)
-            row_num += 1
-
-        # Write gastos
-        for g in gastos:
-            g = dict(g) if not isinstance(g, dict) else g
-            vou_fecha = g.get('fecha_contable') or g.get('fecha')
-            cta_gasto = gasto_cat_account_map.get(g['id'], default_cta_gastos) or None
-            igv_val = fmt_num(g['igv_sunat'])
-            cta_igv = default_cta_igv if igv_val else None
-            cta_xpagar = default_cta_xpagar if float(g.get('total') or 0) > 0 else None
-            m_letra, m_tc = moneda_tc(g.get('moneda_codigo'), g.get('tipo_cambio'))
-
-            row_data = {
-                "Vou.Origen": VOU_ORIGEN,
-                "Vou.Numero": g.get('vou_numero') or None,
-                "Vou.Fecha": fmt_date(vou_fecha),
-                "Doc": g['tipo_comprobante_sunat'] or None,
-                "Numero": g['numero_documento'] or None,
-                "Fec.Doc": fmt_date(g['fecha']),
-                "Codigo": clean_doc(g['proveedor_doc']) or None,
-                "B.I.O.G y E. (A)": fmt_num(g['base_gravada']),
-                "AD. NO GRAV.": fmt_num(g['base_no_gravada']),
-                "I.S.C.": fmt_num(g['isc']),
-                "IGV (A)": igv_val,
-                "Moneda": m_letra,
-                "TC": m_tc,
-                "Cta Gastos": cta_gasto,
-                "Cta IGV": cta_igv,
-                "Cta x Pagar": cta_xpagar,
-            }
-            write_row(ws, row_num, row_data)
-            row_num += 1
-
-        # Auto-adjust column widths for 61 columns
-        for i in range(1, 62):
-            ws.column_dimensions[openpyxl.utils.get_column_letter(i)].width = 14
-
-        # Save to buffer
-        buffer = io.BytesIO()
-        wb.save(buffer)
-        buffer.seek(0)
+            row_num = 2
+            VOU_ORIGEN = "01"
 
-        filename = f"CompraAPP_{empresa_id}"
-        if desde:
-            filename += f"_{desde}"
-        if hasta:
-            filename += f"_{hasta}"
-        filename += ".xlsx"
+            def fmt_date(d):
+                if d is None:
+                    return None
+                if isinstance(d, str):
+                    try:
+                        from datetime import datetime as dt
+                        parsed = dt.strptime(d[:10], "%Y-%m-%d")
+                        return parsed.strftime("%d/%m/%Y")
+                    except Exception:
+                        return d[:10]
+                return d.strftime("%d/%m/%Y")
+
+            def fmt_num(val):
+                """Return rounded float or None (truly empty cell)."""
+                if val is None:
+                    return None
+                v = round(float(val), 2)
+                return v if v != 0 else None
+
+            def moneda_tc(moneda_codigo, tipo_cambio):
+                """Return (letra, tc) for Moneda/TC columns."""
+                if moneda_codigo == 'USD':
+                    return 'D', round(float(tipo_cambio), 2)
+                return 'S', 1.00
+
+            def write_row(ws, row, data_dict):
+                """Write a dict keyed by column name into the correct 61-col positions."""
+                for col_idx, col_name in enumerate(COLUMNS_61, 1):
+                    val = data_dict.get(col_name)
+                    cell = ws.cell(row=row, column=col_idx, value=val)
+                    cell.border = thin_border
+
+            # Write facturas proveedor
+            for f in facturas:
+                f = dict(f) if not isinstance(f, dict) else f
+                vou_fecha = f.get('fecha_contable') or f.get('fecha_factura')
+                cta_gasto = cat_account_map.get(f['id'], default_cta_gastos) or None
+                igv_val = fmt_num(f['igv_sunat'])
+                cta_igv = default_cta_igv if igv_val else None
+                saldo = float(f.get('saldo_pendiente') or 0)
+                cta_xpagar = default_cta_xpagar if saldo > 0 else None
+                m_letra, m_tc = moneda_tc(f.get('moneda_codigo'), f.get('tipo_cambio'))
+
+                row_data = {
+                    "Vou.Origen": VOU_ORIGEN,
+                    "Vou.Numero": f.get('vou_numero') or None,
+                    "Vou.Fecha": fmt_date(vou_fecha),
+                    "Doc": f['tipo_comprobante_sunat'] or None,
+                    "Numero": f['numero'] or None,
+                    "Fec.Doc": fmt_date(f['fecha_factura']),
+                    "Fec.Venc.": fmt_date(f['fecha_vencimiento']),
+                    "Codigo": clean_doc(f['proveedor_doc']) or None,
+                    "B.I.O.G y E. (A)": fmt_num(f['base_gravada']),
+                    "AD. NO GRAV.": fmt_num(f['base_no_gravada']),
+                    "I.S.C.": fmt_num(f['isc']),
+                    "IGV (A)": igv_val,
+                    "Moneda": m_letra,
+                    "TC": m_tc,
+                    "Cta Gastos": cta_gasto,
+                    "Cta IGV": cta_igv,
+                    "Cta x Pagar": cta_xpagar,
+                }
+                write_row(ws, row_num, row_data)
+                row_num += 1
 
-        return StreamingResponse(
-            buffer,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+            # Write gastos
+            for g in gastos:
+                g = dict(g) if not isinstance(g, dict) else g
+                vou_fecha = g.get('fecha_contable') or g.get('fecha')
+                cta_gasto = gasto_cat_account_map.get(g['id'], default_cta_gastos) or None
+                igv_val = fmt_num(g['igv_sunat'])
+                cta_igv = default_cta_igv if igv_val else None
+                cta_xpagar = default_cta_xpagar if float(g.get('total') or 0) > 0 else None
+                m_letra, m_tc = moneda_tc(g.get('moneda_codigo'), g.get('tipo_cambio'))
+
+                row_data = {
+                    "Vou.Origen": VOU_ORIGEN,
+                    "Vou.Numero": g.get('vou_numero') or None,
+                    "Vou.Fecha": fmt_date(vou_fecha),
+                    "Doc": g['tipo_comprobante_sunat'] or None,
+                    "Numero": g['numero_documento'] or None,
+                    "Fec.Doc": fmt_date(g['fecha']),
+                    "Codigo": clean_doc(g['proveedor_doc']) or None,
+                    "B.I.O.G y E. (A)": fmt_num(g['base_gravada']),
+                    "AD. NO GRAV.": fmt_num(g['base_no_gravada']),
+                    "I.S.C.": fmt_num(g['isc']),
+                    "IGV (A)": igv_val,
+                    "Moneda": m_letra,
+                    "TC": m_tc,
+                    "Cta Gastos": cta_gasto,
+                    "Cta IGV": cta_igv,
+                    "Cta x Pagar": cta_xpagar,
+                }
+                write_row(ws, row_num, row_data)
+                row_num += 1
+
+            # Auto-adjust column widths for 61 columns
+            for i in range(1, 62):
+                ws.column_dimensions[openpyxl.utils.get_column_letter(i)].width = 14
+
+            # Save to buffer
+            buffer = io.BytesIO()
+            wb.save(buffer)
+            payload = export_file_cache.put(export_key, buffer.getvalue())
+
+        if cerrado:
+            etag = await store_reporte_cache(conn, empresa_id, clave, desde, hasta, payload, XLSX_MEDIA_TYPE)
+            return respuesta_inmutable(payload, XLSX_MEDIA_TYPE, etag, if_none_match, disposition)
+
+        return Response(
+            content=payload,
+            media_type=XLSX_MEDIA_TYPE,
+            headers=disposition
         )
 
 # Include router
@@ -0,0 +1,70 @@
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Optional, Set
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+SYNC_EVENTS_CHANNEL = 'pos_sync_eventos'
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class SyncEventBus:
+    """
+    Pub/sub for POS sync progress events.
+
+    Events are published with pg_notify, and one dedicated LISTEN connection
+    per process fans them out to local subscriber queues. Every worker's
+    subscribers see every job's events. Without a listener (DB unreachable
+    at startup) events are dispatched in-process only.
+    """
+
+    def __init__(self):
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._listener: Optional[asyncpg.Connection] = None
+
+    async def start(self, dsn: str):
+        try:
+            self._listener = await asyncpg.connect(dsn)
+            await self._listener.add_listener(SYNC_EVENTS_CHANNEL, self._on_notify)
+        except Exception as e:
+            self._listener = None
+            logger.warning(f"Sync events limited to this process (LISTEN failed: {e})")
+
+    async def stop(self):
+        if self._listener is not None:
+            await self._listener.close()
+            self._listener = None
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    async def publish(self, pool, event: Dict[str, Any]):
+        if self._listener is None or self._listener.is_closed():
+            self._dispatch(event)
+            return
+        try:
+            await pool.execute("SELECT pg_notify($1, $2)", SYNC_EVENTS_CHANNEL, json.dumps(event, default=str))
+        except Exception as e:
+            logger.warning(f"Could not publish sync event: {e}")
+            self._dispatch(event)
+
+    def _on_notify(self, conn, pid, channel, payload):
+        self._dispatch(json.loads(payload))
+
+    def _dispatch(self, event: Dict[str, Any]):
+        for queue in self._subscribers:
+            if queue.full():
+                # A slow client only loses its oldest progress events
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+
+sync_event_bus = SyncEventBus()
@@ -0,0 +1,85 @@
+"""
+Throughput of the bank statement parsers (banco_parsers.py), per bank.
+
+Generates synthetic statement rows in each registered layout and reports
+rows/s for parsing alone, for streaming the same rows from a CSV file and,
+with --xlsx, from a read-only workbook.
+
+    cd backend && python tests/benchmark_banco_parsers.py --rows 50000 --xlsx
+"""
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from banco_import import iter_excel_rows, iter_statement_rows  # noqa: E402
+from banco_parsers import BANCOS, iter_movimientos  # noqa: E402
+
+BASE = datetime(2026, 1, 1)
+
+
+def sample_row(banco: str, i: int) -> tuple:
+    fecha = BASE + timedelta(days=i % 365)
+    monto = round((i % 997) * 1.37 - 400, 2)
+    if banco == 'BCP':
+        return (i, fecha, fecha, f"TRANSF {i}", monto, 10000.0, "Lima", f"{i:08d}")
+    if banco == 'BBVA':
+        return (i, fecha.strftime('%d/%m/%Y'), None, "C01", f"D{i}", f"CONCEPTO {i}", f"{monto:,.2f}", "0100")
+    if banco == 'IBK':
+        cargo, abono = (abs(monto), None) if monto < 0 else (None, monto)
+        return (i + 1, fecha.strftime('%d/%m/%Y'), None, f"{i:06d}", "MOV", f"DESC {i}", "WEB", cargo, abono, 0)
+    return (fecha, f"Movimiento {i}", f"R{i}", monto)
+
+
+def header(banco: str) -> tuple:
+    return ("Nº", "Fecha", "Descripción", "Referencia", "Monto") if banco != 'PERSONALIZADO' else \
+        ("Fecha", "Descripción", "Referencia", "Monto")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--xlsx", action="store_true", help="also stream the rows from an .xlsx file")
+    opts = parser.parse_args()
+
+    print(f"Bank parser benchmark: {opts.rows} rows per bank")
+    print(f"{'banco':<15}{'parsed':>10}{'parse rows/s':>15}{'csv rows/s':>15}{'xlsx rows/s':>15}")
+    for banco in BANCOS:
+        rows = [header(banco)] + [sample_row(banco, i) for i in range(opts.rows)]
+        start = time.perf_counter()
+        parsed = sum(1 for _ in iter_movimientos(rows, banco))
+        parse_rate = opts.rows / (time.perf_counter() - start)
+
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w', newline='', encoding='cp1252') as f:
+            csv.writer(f, delimiter=';').writerows(
+                [c.strftime('%d/%m/%Y') if isinstance(c, datetime) else c for c in row] for row in rows)
+        start = time.perf_counter()
+        assert sum(1 for _ in iter_movimientos(iter_statement_rows(path, banco), banco)) == parsed
+        csv_rate = opts.rows / (time.perf_counter() - start)
+        os.unlink(path)
+
+        xlsx_rate = ''
+        if opts.xlsx:
+            import openpyxl
+            wb = openpyxl.Workbook(write_only=True)
+            ws = wb.create_sheet()
+            for row in rows:
+                ws.append(row)
+            fd, path = tempfile.mkstemp(suffix='.xlsx')
+            os.close(fd)
+            wb.save(path)
+            start = time.perf_counter()
+            sum(1 for _ in iter_movimientos(iter_excel_rows(path), banco))
+            xlsx_rate = f"{opts.rows / (time.perf_counter() - start):,.0f}"
+            os.unlink(path)
+        print(f"{banco:<15}{parsed:>10}{parse_rate:>15,.0f}{csv_rate:>15,.0f}{xlsx_rate:>15}")
+
+
+if __name__ == "__main__":
+    main()
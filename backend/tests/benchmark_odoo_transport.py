@@ -0,0 +1,90 @@
+"""
+Compare the XML-RPC and JSON-RPC transports of OdooService on the local stub.
+
+For each protocol, reports:
+- payload size and client-side decode time of one pos.order search_read page
+- fetch-only sync throughput (orders/s) paging through every order with lines
+
+    cd backend && python tests/benchmark_odoo_transport.py --orders 3000 --page-size 200
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import statistics
+import sys
+import time
+import xmlrpc.client
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark_pos_sync import fetch_only  # noqa: E402
+from odoo_stub import start_stub  # noqa: E402
+
+ORDER_FIELDS = [
+    'id', 'date_order', 'name', 'tipo_comp', 'num_comp', 'partner_id', 'x_tienda', 'vendedor_id',
+    'company_id', 'x_pagos', 'quantity_pos_order', 'amount_total', 'state', 'x_reserva_pendiente',
+    'x_reserva_facturada', 'is_cancel', 'order_cancel', 'reserva', 'is_credit', 'reserva_use_id', 'write_date',
+]
+
+
+def raw_page(url: str, protocol: str, page_size: int):
+    """One search_read page as raw bytes, plus the function that decodes it"""
+    args = ('db', 2, 'pwd', 'pos.order', 'search_read', [[]],
+            {'fields': ORDER_FIELDS, 'limit': page_size, 'order': 'write_date asc, id asc'})
+    conn = http.client.HTTPConnection(urlsplit(url).netloc)
+    if protocol == 'xmlrpc':
+        conn.request("POST", "/xmlrpc/2/object", xmlrpc.client.dumps(args, 'execute_kw', allow_none=True).encode(),
+                     {"Content-Type": "text/xml"})
+        decode = lambda body: xmlrpc.client.loads(body, use_builtin_types=True)[0][0]  # noqa: E731
+    else:
+        body = {"jsonrpc": "2.0", "method": "call", "id": 1,
+                "params": {"service": "object", "method": "execute_kw", "args": args}}
+        conn.request("POST", "/jsonrpc", json.dumps(body).encode(), {"Content-Type": "application/json"})
+        decode = lambda body: json.loads(body)["result"]  # noqa: E731
+    payload = conn.getresponse().read()
+    conn.close()
+    return payload, decode
+
+
+def measure_decode(payload: bytes, decode, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        rows = decode(payload)
+        timings.append(time.perf_counter() - start)
+    assert rows
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=3000)
+    parser.add_argument("--lines", type=int, default=3, help="lines per order")
+    parser.add_argument("--page-size", type=int, default=200)
+    parser.add_argument("--repeats", type=int, default=20, help="decode repetitions per protocol")
+    opts = parser.parse_args()
+
+    stub = start_stub(opts.orders, opts.lines)
+    os.environ['ODOO_URL'] = stub.url
+    from odoo_service import AsyncOdooService
+
+    print(f"Transport benchmark: {opts.orders} orders x {opts.lines} lines, page size {opts.page_size}")
+    print(f"{'protocol':<10}{'page bytes':>12}{'decode ms':>12}{'orders/s':>12}")
+    for protocol in ("xmlrpc", "jsonrpc"):
+        payload, decode = raw_page(stub.url, protocol, opts.page_size)
+        decode_s = measure_decode(payload, decode, opts.repeats)
+
+        os.environ['ODOO_PROTOCOL'] = protocol
+        start = time.perf_counter()
+        fetched = asyncio.run(fetch_only(AsyncOdooService("ambission"), opts.page_size))
+        elapsed = time.perf_counter() - start
+        print(f"{protocol:<10}{len(payload):>12,}{decode_s * 1000:>12.2f}{fetched / elapsed:>12.0f}")
+    stub.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Benchmark POS sync throughput against the local Odoo stub.
+
+Starts tests/odoo_stub.py in-process, points OdooService at it and runs a
+full sync. With DATABASE_URL set, the whole sync_pos_orders pipeline runs
+end to end into Postgres. Without it, only the Odoo side runs: paging
+orders and fetching their lines. Reports orders/s, RPC count by call and
+HTTP connections opened.
+
+    cd backend && python tests/benchmark_pos_sync.py --orders 5000 --latency 0.02
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from odoo_stub import start_stub  # noqa: E402
+
+
+async def fetch_only(client, page_size: int) -> int:
+    """Odoo side of the sync: page through every order and fetch its lines"""
+    from odoo_service import page_cursor
+
+    await client.authenticate()
+    fetched, after = 0, None
+    while True:
+        orders = await client.get_pos_orders(days_back=3650, after=after, limit=page_size)
+        if not orders:
+            break
+        await client.get_order_lines_batch([o['id'] for o in orders])
+        fetched += len(orders)
+        after = page_cursor(orders, after)
+        if len(orders) < page_size:
+            break
+    return fetched
+
+
+async def end_to_end(company: str, empresa_id: int, page_size: int) -> int:
+    from database import get_pool, close_db
+    from pos_sync import sync_pos_orders
+
+    pool = await get_pool()
+    try:
+        stats = await sync_pos_orders(pool, company, empresa_id, days_back=3650, full_resync=True,
+                                      page_size=page_size)
+    finally:
+        await close_db()
+    print(f"  sync stats: {stats}")
+    return stats["fetched"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--lines", type=int, default=3, help="lines per order")
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds added to every RPC")
+    parser.add_argument("--page-size", type=int, default=200)
+    parser.add_argument("--empresa-id", type=int, default=1)
+    opts = parser.parse_args()
+
+    stub = start_stub(opts.orders, opts.lines, latency=opts.latency)
+    os.environ['ODOO_URL'] = stub.url
+    from odoo_service import AsyncOdooService
+
+    mode = "end-to-end" if os.environ.get('DATABASE_URL') else "fetch-only"
+    print(f"Benchmark ({mode}): {opts.orders} orders x {opts.lines} lines, "
+          f"{opts.latency * 1000:.0f} ms/RPC, page size {opts.page_size}")
+
+    start = time.perf_counter()
+    if mode == "end-to-end":
+        fetched = asyncio.run(end_to_end("ambission", opts.empresa_id, opts.page_size))
+    else:
+        fetched = asyncio.run(fetch_only(AsyncOdooService("ambission"), opts.page_size))
+    elapsed = time.perf_counter() - start
+    stub.shutdown()
+
+    print(f"  orders:      {fetched}")
+    print(f"  elapsed:     {elapsed:.2f} s")
+    print(f"  throughput:  {fetched / elapsed:.0f} orders/s")
+    print(f"  RPC calls:   {stub.rpc_count()}")
+    for (model, method), n in sorted(stub.calls.items()):
+        print(f"    {model}.{method}: {n}")
+    print(f"  connections: {stub.connections}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Local stand-in for the Odoo XML-RPC API used by odoo_service.py.
+
+Implements common.authenticate and object.execute_kw, over both
+/xmlrpc/2/{common,object} and /jsonrpc, for:
+- pos.order / pos.order.line / product.product / product.template  search_read
+  (domain, fields, limit, order); pos.order search_count
+- product.product / product.template  read
+
+Data is synthetic and deterministic. Every call can be delayed by a fixed
+latency to mimic a remote server. Point OdooService at it with ODOO_URL.
+
+    python tests/odoo_stub.py --orders 5000 --lines 3 --latency 0.02 --port 8069
+"""
+import argparse
+import json
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from socketserver import ThreadingMixIn
+from xmlrpc.server import MultiPathXMLRPCServer, SimpleXMLRPCDispatcher, SimpleXMLRPCRequestHandler
+
+BASE_DATE = datetime(2026, 1, 1, 8, 0, 0)
+FMT = '%Y-%m-%d %H:%M:%S'
+
+MARCAS = ["Ambission", "Proyecto Moda", "Basic"]
+TIPOS = ["Polo", "Jean", "Casaca", "Short"]
+
+
+class OdooStubData:
+    """Synthetic pos.order / pos.order.line / product catalog"""
+
+    def __init__(self, orders: int = 1000, lines_per_order: int = 3, products: int = 200, templates: int = 50):
+        self.templates = {
+            t: {"id": t, "marca": [1 + t % len(MARCAS), MARCAS[t % len(MARCAS)]],
+                "tipo": [1 + t % len(TIPOS), TIPOS[t % len(TIPOS)]],
+                "write_date": BASE_DATE.strftime(FMT)}
+            for t in range(1, templates + 1)
+        }
+        self.products = {
+            p: {"id": p, "product_tmpl_id": [1 + p % templates, f"Plantilla {1 + p % templates}"],
+                "default_code": f"P-{p:05d}", "write_date": BASE_DATE.strftime(FMT)}
+            for p in range(1, products + 1)
+        }
+        self.orders = []
+        self.lines = []
+        line_id = 1
+        for i in range(1, orders + 1):
+            date_order = BASE_DATE + timedelta(minutes=i)
+            total = 0.0
+            for j in range(lines_per_order):
+                product_id = 1 + (i * 7 + j) % products
+                price = 20.0 + (i + j) % 80
+                self.lines.append({
+                    "id": line_id, "order_id": [i, f"POS/{i:06d}"],
+                    "product_id": [product_id, f"Producto {product_id}"],
+                    "qty": 1.0, "price_unit": price, "price_subtotal": round(price / 1.18, 2),
+                    "price_subtotal_incl": price, "discount": 0.0,
+                })
+                line_id += 1
+                total += price
+            self.orders.append({
+                "id": i, "date_order": date_order.strftime(FMT), "name": f"POS/{i:06d}",
+                "tipo_comp": "boleta", "num_comp": f"B001-{i:08d}",
+                "partner_id": [1 + i % 30, f"Cliente {1 + i % 30}"],
+                "x_tienda": [1 + i % 4, f"Tienda {1 + i % 4}"],
+                "vendedor_id": [1 + i % 5, f"Vendedor {1 + i % 5}"],
+                "company_id": [1, "Ambission"], "x_pagos": f"Efectivo: {total:.2f}",
+                "quantity_pos_order": float(lines_per_order), "amount_total": total, "state": "done",
+                "x_reserva_pendiente": 0.0, "x_reserva_facturada": 0.0, "is_cancel": False,
+                "order_cancel": False, "reserva": False, "is_credit": False, "reserva_use_id": False,
+                "write_date": date_order.strftime(FMT),
+            })
+        self.lines_by_order = {}
+        for line in self.lines:
+            self.lines_by_order.setdefault(line["order_id"][0], []).append(line)
+
+    def touch(self, order_ids, when: datetime):
+        """Mark orders as modified at `when` (to exercise incremental sync); microseconds are kept"""
+        for order in self.orders:
+            if order["id"] in order_ids:
+                order["write_date"] = when.isoformat(sep=' ')
+
+
+def _value(record, field):
+    value = record.get(field)
+    return value[0] if isinstance(value, list) else value
+
+
+def _match_term(record, term):
+    field, op, arg = term
+    value = _value(record, field)
+    if op == '=':
+        return value == arg
+    if op == '>':
+        return value > arg
+    if op == '>=':
+        return value >= arg
+    if op == '<':
+        return value < arg
+    if op == '<=':
+        return value <= arg
+    if op == 'in':
+        return value in arg
+    if op == 'not in':
+        return value not in arg
+    raise ValueError(f"Unsupported operator {op}")
+
+
+def match_domain(record, domain) -> bool:
+    """Evaluate an Odoo prefix-notation domain ('|', '&', terms; implicit AND)"""
+    def parse(pos):
+        token = domain[pos]
+        if token in ('|', '&'):
+            left, pos = parse(pos + 1)
+            right, pos = parse(pos)
+            return (left or right) if token == '|' else (left and right), pos
+        return _match_term(record, token), pos + 1
+
+    pos = 0
+    result = True
+    while pos < len(domain):
+        ok, pos = parse(pos)
+        result = result and ok
+    return result
+
+
+def _sort_key(order_spec: str):
+    fields = [part.split()[0] for part in order_spec.split(',')]
+    return lambda r: tuple(_value(r, f) for f in fields)
+
+
+class OdooStubServer(ThreadingMixIn, MultiPathXMLRPCServer):
+    daemon_threads = True
+
+    def __init__(self, data: OdooStubData, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0):
+        stub = self
+
+        class Handler(SimpleXMLRPCRequestHandler):
+            # HTTP/1.1 so clients can keep the connection alive between calls
+            protocol_version = "HTTP/1.1"
+            rpc_paths = ('/xmlrpc/2/common', '/xmlrpc/2/object')
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def do_POST(self):
+                if self.path != '/jsonrpc':
+                    return super().do_POST()
+                request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                params = request['params']
+                try:
+                    handler = stub.authenticate if params['method'] == 'authenticate' else stub.execute_kw
+                    reply = {"jsonrpc": "2.0", "id": request.get('id'), "result": handler(*params['args'])}
+                except Exception as e:
+                    reply = {"jsonrpc": "2.0", "id": request.get('id'),
+                             "error": {"code": 200, "message": "Odoo Server Error",
+                                       "data": {"name": type(e).__name__, "message": str(e)}}}
+                body = json.dumps(reply).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        super().__init__((host, port), requestHandler=Handler, allow_none=True, logRequests=False)
+        self.data = data
+        self.latency = latency
+        self.calls = Counter()
+        # (model, method) -> call number that fails, to exercise error handling
+        self.fail_at = {}
+        self.connections = 0
+        self._lock = threading.Lock()
+
+        common = SimpleXMLRPCDispatcher(allow_none=True)
+        common.register_function(self.authenticate, 'authenticate')
+        obj = SimpleXMLRPCDispatcher(allow_none=True)
+        obj.register_function(self.execute_kw, 'execute_kw')
+        self.add_dispatcher('/xmlrpc/2/common', common)
+        self.add_dispatcher('/xmlrpc/2/object', obj)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address
+        return f"http://{host}:{port}"
+
+    def _count(self, key):
+        with self._lock:
+            self.calls[key] += 1
+            n = self.calls[key]
+        if self.latency:
+            time.sleep(self.latency)
+        if n == self.fail_at.get(key):
+            raise RuntimeError(f"Injected failure on call {n} to {key[0]}.{key[1]}")
+
+    def authenticate(self, db, username, password, context):
+        self._count(('common', 'authenticate'))
+        return 2
+
+    def execute_kw(self, db, uid, password, model, method, args, kwargs=None):
+        self._count((model, method))
+        kwargs = kwargs or {}
+        if method == 'search_read':
+            records = {'pos.order': self.data.orders, 'pos.order.line': self.data.lines,
+                       'product.product': list(self.data.products.values()),
+                       'product.template': list(self.data.templates.values())}[model]
+            domain = args[0] if args else []
+            if model == 'pos.order.line' and len(domain) == 1 and tuple(domain[0][:2]) == ('order_id', 'in'):
+                found = [l for oid in domain[0][2] for l in self.data.lines_by_order.get(oid, [])]
+            else:
+                found = [r for r in records if match_domain(r, [tuple(t) if isinstance(t, list) else t for t in domain])]
+            if kwargs.get('order'):
+                found.sort(key=_sort_key(kwargs['order']))
+            if kwargs.get('limit'):
+                found = found[:kwargs['limit']]
+            return [self._fields(r, kwargs.get('fields')) for r in found]
+        if method == 'search_count':
+            domain = [tuple(t) if isinstance(t, list) else t for t in (args[0] if args else [])]
+            return sum(1 for r in self.data.orders if match_domain(r, domain))
+        if method == 'read':
+            table = {'product.product': self.data.products, 'product.template': self.data.templates,
+                     'pos.order': {o['id']: o for o in self.data.orders}}[model]
+            fields = kwargs.get('fields') or (args[1] if len(args) > 1 else None)
+            return [self._fields(table[i], fields) for i in args[0] if i in table]
+        raise ValueError(f"Unsupported method {model}.{method}")
+
+    @staticmethod
+    def _fields(record, fields):
+        record = dict(record)
+        if isinstance(record.get('write_date'), str):
+            # Like Odoo: domains and ordering see the stored microseconds, reads return whole seconds
+            record['write_date'] = record['write_date'][:19]
+        if not fields:
+            return record
+        return {f: record.get(f, False) for f in set(fields) | {'id'}}
+
+    def rpc_count(self) -> int:
+        return sum(self.calls.values())
+
+
+def start_stub(orders: int = 1000, lines_per_order: int = 3, latency: float = 0.0, port: int = 0) -> OdooStubServer:
+    """Start a stub server in a background thread; call .shutdown() when done"""
+    server = OdooStubServer(OdooStubData(orders, lines_per_order), port=port, latency=latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Odoo XML-RPC stub")
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--lines", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every call")
+    parser.add_argument("--port", type=int, default=8069)
+    opts = parser.parse_args()
+    server = OdooStubServer(OdooStubData(opts.orders, opts.lines), port=opts.port, latency=opts.latency)
+    print(f"Odoo stub serving {opts.orders} orders at {server.url} (set ODOO_URL to use it)")
+    server.serve_forever()
@@ -0,0 +1,76 @@
+"""
+Throwaway Postgres databases for tests that need real SQL semantics.
+
+Set TEST_DATABASE_URL to a server where the user may CREATE DATABASE
+(e.g. postgres://postgres@localhost:5432/postgres). Each `testdb` fixture
+creates a fresh database, builds the finanzas2 schema with database.py and
+seeds one empresa; the database is dropped afterwards. Without
+TEST_DATABASE_URL the tests using it are skipped.
+
+    TEST_DATABASE_URL=postgres://postgres@localhost:5432/postgres pytest tests/test_pos_sync.py
+"""
+import asyncio
+import os
+import uuid
+from urllib.parse import urlsplit, urlunsplit
+
+import asyncpg
+import pytest
+
+TEST_DATABASE_URL = os.environ.get('TEST_DATABASE_URL')
+
+
+def _with_database(url: str, name: str) -> str:
+    parts = urlsplit(url)
+    return urlunsplit(parts._replace(path=f"/{name}"))
+
+
+class ScratchDB:
+    """A fresh database with the finanzas2 schema and one empresa (empresa_id)"""
+
+    def __init__(self):
+        self.name = f"finanzas_test_{uuid.uuid4().hex[:12]}"
+        self.url = _with_database(TEST_DATABASE_URL, self.name)
+        self.empresa_id = None
+
+    async def _admin(self, sql: str):
+        admin = await asyncpg.connect(TEST_DATABASE_URL)
+        try:
+            await admin.execute(sql)
+        finally:
+            await admin.close()
+
+    async def _create(self, pool):
+        import database
+
+        previous, database.pool = database.pool, pool
+        try:
+            await database.create_schema()
+        finally:
+            database.pool = previous
+        self.empresa_id = await pool.fetchval(
+            "INSERT INTO finanzas2.cont_empresa (nombre) VALUES ('Empresa test') RETURNING id")
+
+    def run(self, fn, max_size: int = 10):
+        """Run `await fn(pool)` in a new event loop with a pool on this database"""
+        async def main():
+            pool = await asyncpg.create_pool(self.url, min_size=1, max_size=max_size)
+            try:
+                return await fn(pool)
+            finally:
+                await pool.close()
+        return asyncio.run(main())
+
+
+@pytest.fixture
+def testdb():
+    """Fresh database per test; test bodies run through testdb.run(async_fn)"""
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL not set")
+    db = ScratchDB()
+    asyncio.run(db._admin(f'CREATE DATABASE "{db.name}"'))
+    try:
+        db.run(db._create)
+        yield db
+    finally:
+        asyncio.run(db._admin(f'DROP DATABASE IF EXISTS "{db.name}" WITH (FORCE)'))
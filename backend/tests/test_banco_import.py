@@ -0,0 +1,340 @@
+"""
+Test the streaming bank statement import:
+1. Rows before the header are skipped
+2. Workbooks are read in streaming mode from a spooled file
+3. Movements are staged in chunks and merged with one ON CONFLICT statement
+4. CSV/TXT statements: encoding, delimiter and fixed-width columns are detected
+5. Import jobs commit chunk by chunk with a checkpoint, resume after it and keep row errors
+6. Rows fingerprinted by an earlier upload are not merged again; only rows actually
+   written are fingerprinted; identical files short-circuit, also when uploaded at once
+"""
+import asyncio
+import os
+import threading
+from datetime import date, datetime
+
+import openpyxl
+import pytest
+
+import json
+from contextlib import asynccontextmanager
+
+import banco_import
+from banco_import import (
+    _MERGE_STAGING_SQL, BancoImportScheduler, contar_filas, detect_delimiter, detect_encoding, import_job_to_dict,
+    huella_movimiento, iter_chunks, iter_excel_rows, iter_statement_rows, merge_chunk,
+)
+from banco_parsers import (
+    BancoSpec, get_parser, iter_data_rows, iter_movimientos, register_banco, unregister_banco,
+)
+from pg_testdb import testdb  # noqa: F401
+
+
+class TestStreaming:
+
+    def test_header_detection(self):
+        rows = [("Estado de cuenta",), (None,), ("Nº", "Fecha", "Descripción"), (1, "x"), (2, "y")]
+        assert list(iter_data_rows(rows)) == [(1, "x"), (2, "y")]
+        assert list(iter_data_rows([("a",), ("b",)])) == [("b",)]
+
+    def test_read_only_workbook(self, tmp_path):
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.append(["Fecha", "Descripción", "Referencia", "Monto"])
+        for i in range(1, 31):
+            ws.append([datetime(2026, 3, i), f"Mov {i}", f"R{i}", i * 10])
+        path = tmp_path / "extracto.xlsx"
+        wb.save(path)
+        movs = list(iter_movimientos(iter_excel_rows(str(path)), "PERSONALIZADO"))
+        assert len(movs) == 30
+        assert movs[-1] == (date(2026, 3, 30), "Mov 30", "R30", 300.0)
+
+
+class FakeConn:
+    def __init__(self, existing=(), huellas=(), previo=None, procesados=()):
+        self.copies = []
+        self.updates = []
+        self.existing = set(existing)
+        self.huellas = set(huellas)
+        self.previo = previo
+        self.procesados = set(procesados)
+        self.transactions = 0
+
+    async def execute(self, sql, *args):
+        if "cont_banco_import_job" in sql:
+            self.updates.append(args)
+
+    async def copy_records_to_table(self, table, records, columns):
+        self.copies.append(records)
+
+    async def fetchval(self, sql, *args):
+        # The movement key index exists
+        return "idx_cont_banco_mov_raw_clave"
+
+    async def fetchrow(self, sql, *args):
+        # With a previous job the INSERT hits the partial unique index and the SELECT finds it
+        return None if "INSERT" in sql else self.previo
+
+    async def fetch(self, sql, *args):
+        if "tmp_banco_mov" not in sql:
+            return [{"huella": h} for h in args[2] if h in self.huellas]
+        # Last occurrence per key wins; keys already stored count as updates, reconciled ones
+        # are skipped, and only the rows written get their fingerprint recorded
+        ultimas = {(r[3] or '', r[1]): r for r in self.copies[-1]}
+        rows = []
+        for key, r in ultimas.items():
+            if key in self.procesados:
+                continue
+            rows.append({"inserted": key not in self.existing})
+            self.existing.add(key)
+            self.huellas.add(r[5])
+        return rows
+
+    @asynccontextmanager
+    async def transaction(self):
+        self.transactions += 1
+        yield
+
+
+class FakePool:
+    def __init__(self, conn):
+        self.conn = conn
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.conn
+
+
+def write_csv(tmp_path, filas):
+    lines = ["Fecha;Descripción;Referencia;Monto"] + filas
+    path = tmp_path / "extracto.csv"
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+class TestStaging:
+
+    def test_chunks_and_row_errors(self, tmp_path):
+        filas = [f"0{i % 9 + 1}/03/2026;Mov {i};R{i};{i}.50" for i in range(25)]
+        filas[7] = "01/03/2026;Mov malo;R7;abc"
+        chunks = list(iter_chunks(write_csv(tmp_path, filas), "PERSONALIZADO", chunk_rows=10))
+        assert [c["filas"] for c in chunks] == [10, 10, 5]
+        assert [c["ultima_fila"] for c in chunks] == [11, 21, 26]
+        assert chunks[0]["errores"] == [{"fila": 9, "error": "could not convert string to float: 'abc'"}]
+        assert len(chunks[0]["movimientos"]) == 9
+        assert chunks[0]["movimientos"][0] == (2, date(2026, 3, 1), "Mov 0", "R0", 0.5)
+
+    def test_resume_after_checkpoint(self, tmp_path):
+        path = write_csv(tmp_path, [f"01/03/2026;Mov {i};R{i};{i}" for i in range(25)])
+        chunks = list(iter_chunks(path, "PERSONALIZADO", desde_fila=21, chunk_rows=10))
+        assert [m[0] for m in chunks[0]["movimientos"]] == [22, 23, 24, 25, 26]
+        assert contar_filas(path) == 26
+
+    def test_merge_chunk_counts(self):
+        conn = FakeConn(existing={("R1", date(2026, 3, 1))})
+        movs = [(2, date(2026, 3, 1), "a", "R1", 1.0), (3, date(2026, 3, 1), "b", "R2", 2.0),
+                (4, date(2026, 3, 1), "b'", "R2", 2.0)]
+        huellas = [huella_movimiento(m[1:]) for m in movs]
+        assert asyncio.run(merge_chunk(conn, movs, huellas, 1, "BCP", 1, 9)) == {
+            "imported": 1, "updated": 2, "skipped": 0, "repetidos": 0}
+
+    def test_job_commits_each_chunk_with_checkpoint(self, tmp_path):
+        path = write_csv(tmp_path, [f"01/03/2026;Mov {i};R{i};{i}" for i in range(25)] + ["01/03/2026;x;R99;?"])
+        conn = FakeConn()
+        job = {"id": 7, "ruta": path, "banco": "PERSONALIZADO", "cuenta_financiera_id": 1, "empresa_id": 1,
+               "fila_checkpoint": 0, "chunk_filas": 10, "stats": json.dumps({"imported": 3})}
+        asyncio.run(BancoImportScheduler()._importar(FakePool(conn), job))
+        assert conn.transactions == 3
+        assert [u[1] for u in conn.updates[:3]] == [11, 21, 27]
+        final = json.loads(conn.updates[-1][1])
+        assert final == {"imported": 28, "updated": 0, "skipped": 0, "repetidos": 0, "errores": 1}
+        assert json.loads(conn.updates[2][4])[0]["fila"] == 27
+
+    def test_overlapping_upload_only_merges_new_rows(self, tmp_path):
+        primero = write_csv(tmp_path, [f"01/03/2026;Mov {i};R{i};{i}" for i in range(10)])
+        chunk = next(iter_chunks(primero, "PERSONALIZADO"))
+        conn = FakeConn(huellas=chunk["huellas"][:6])
+        counts = asyncio.run(merge_chunk(conn, chunk["movimientos"], chunk["huellas"], 1, "BCP", 1, 9))
+        assert counts == {"imported": 4, "updated": 0, "skipped": 0, "repetidos": 6}
+        assert [r[0] for r in conn.copies[0]] == [8, 9, 10, 11]
+
+    def test_skipped_rows_are_not_fingerprinted(self):
+        conn = FakeConn(existing={("R1", date(2026, 3, 1))}, procesados={("R1", date(2026, 3, 1))})
+        movs = [(2, date(2026, 3, 1), "a", "R1", 1.0), (3, date(2026, 3, 1), "b", "R2", 2.0)]
+        huellas = [huella_movimiento(m[1:]) for m in movs]
+        counts = asyncio.run(merge_chunk(conn, movs, huellas, 1, "BCP", 1, 9))
+        assert counts == {"imported": 1, "updated": 0, "skipped": 1, "repetidos": 0}
+        assert conn.huellas == {huellas[1]}
+
+    def test_fingerprint_is_content_based(self):
+        mov = (date(2026, 3, 1), "Mov", "R1", 10.0)
+        assert huella_movimiento(mov) == huella_movimiento((date(2026, 3, 1), "Mov", "R1", 10))
+        assert huella_movimiento(mov) != huella_movimiento((date(2026, 3, 1), "Mov", "R1", 10.01))
+        assert -2 ** 63 <= huella_movimiento(mov) < 2 ** 63
+
+    def test_identical_file_short_circuits(self, tmp_path):
+        path = write_csv(tmp_path, ["01/03/2026;Mov;R1;1"])
+        previo = {"id": 3, "ruta": "/tmp/old", "estado": "completado", "fila_checkpoint": 2, "total_filas": 2,
+                  "stats": '{"imported": 1}', "errores": None}
+        job = asyncio.run(BancoImportScheduler().start_job(
+            FakePool(FakeConn(previo=previo)), path, "extracto.csv", "abc", 1, "BCP", 1))
+        assert job["duplicado"] and job["id"] == 3 and job["stats"] == {"imported": 1}
+        assert not os.path.exists(path)
+
+    def test_job_dict(self):
+        row = {"id": 1, "ruta": "/tmp/x", "estado": "ejecutando", "fila_checkpoint": 50, "total_filas": 200,
+               "stats": None, "errores": '[{"fila": 3, "error": "x"}]'}
+        job = import_job_to_dict(row)
+        assert "ruta" not in job
+        assert job["progreso"] == 25.0
+        assert job["errores"] == [{"fila": 3, "error": "x"}]
+
+    def test_merge_is_one_upsert(self):
+        assert "ON CONFLICT (cuenta_financiera_id, banco, (COALESCE(referencia, '')), fecha)" in _MERGE_STAGING_SQL
+        assert "WHERE cont_banco_mov_raw.procesado IS NOT TRUE" in _MERGE_STAGING_SQL
+        assert "DISTINCT ON" in _MERGE_STAGING_SQL
+
+
+class TestAgainstPostgres:
+    """merge_chunk and start_job on a scratch database (needs TEST_DATABASE_URL)"""
+
+    async def cuenta(self, conn, empresa_id):
+        return await conn.fetchval("""
+            INSERT INTO finanzas2.cont_cuenta_financiera (empresa_id, nombre, tipo) VALUES ($1, 'BCP', 'banco')
+            RETURNING id
+        """, empresa_id)
+
+    def test_fingerprints_only_for_written_rows(self, testdb):
+        empresa_id = testdb.empresa_id
+        movs = [(2, date(2026, 3, 1), "cambiado", "R1", 1.0), (3, date(2026, 3, 1), "b", "R2", 2.0),
+                (4, date(2026, 3, 1), "b'", "R2", 2.5)]
+        huellas = [huella_movimiento(m[1:]) for m in movs]
+
+        async def main(pool):
+            async with pool.acquire() as conn:
+                cuenta_id = await self.cuenta(conn, empresa_id)
+                await conn.execute("""
+                    INSERT INTO finanzas2.cont_banco_mov_raw
+                        (cuenta_financiera_id, banco, fecha, descripcion, referencia, monto, procesado, empresa_id)
+                    VALUES ($1, 'BCP', '2026-03-01', 'conciliado', 'R1', 1.0, TRUE, $2)
+                """, cuenta_id, empresa_id)
+                async with conn.transaction():
+                    counts = await merge_chunk(conn, movs, huellas, cuenta_id, "BCP", empresa_id, None)
+                guardadas = {r['huella'] for r in await conn.fetch(
+                    "SELECT huella FROM finanzas2.cont_banco_import_huella WHERE cuenta_financiera_id = $1", cuenta_id)}
+                raw = await conn.fetch("""
+                    SELECT referencia, descripcion FROM finanzas2.cont_banco_mov_raw
+                    WHERE cuenta_financiera_id = $1 ORDER BY referencia
+                """, cuenta_id)
+                return counts, guardadas, [tuple(r) for r in raw]
+
+        counts, guardadas, raw = testdb.run(main)
+        assert counts == {"imported": 1, "updated": 1, "skipped": 1, "repetidos": 0}
+        # The reconciled R1 and the superseded first R2 were not written, so they stay unseen
+        assert guardadas == {huellas[2]}
+        assert raw == [("R1", "conciliado"), ("R2", "b'")]
+
+    def test_concurrent_uploads_of_one_file(self, testdb, tmp_path, monkeypatch):
+        empresa_id = testdb.empresa_id
+        scheduler = BancoImportScheduler()
+        scheduler._spawn = lambda pool, job_id: None
+        # Both uploads finish counting rows before either registers its job
+        barrera = threading.Barrier(2, timeout=10)
+
+        def contar(path):
+            barrera.wait()
+            return contar_filas(path)
+        monkeypatch.setattr(banco_import, "contar_filas", contar)
+        paths = []
+        for i in range(2):
+            path = tmp_path / f"subida{i}.csv"
+            path.write_text("Fecha;Descripción;Referencia;Monto\n01/03/2026;Mov;R1;1\n")
+            paths.append(str(path))
+
+        async def main(pool):
+            async with pool.acquire() as conn:
+                cuenta_id = await self.cuenta(conn, empresa_id)
+            return await asyncio.gather(*(
+                scheduler.start_job(pool, path, "extracto.csv", "hash-1", cuenta_id, "BCP", empresa_id)
+                for path in paths))
+
+        jobs = testdb.run(main)
+        assert sorted(j["duplicado"] for j in jobs) == [False, True]
+        assert jobs[0]["id"] == jobs[1]["id"]
+        assert sum(os.path.exists(p) for p in paths) == 1
+
+    def test_missing_key_index_names_duplicates(self, testdb, tmp_path):
+        """Reconciled duplicates kept the key index from being created: imports refuse to start"""
+        empresa_id = testdb.empresa_id
+        path = tmp_path / "extracto.csv"
+        path.write_text("Fecha;Descripción;Referencia;Monto\n01/03/2026;Mov;R1;1\n")
+
+        async def main(pool):
+            async with pool.acquire() as conn:
+                cuenta_id = await self.cuenta(conn, empresa_id)
+                await conn.execute("DROP INDEX finanzas2.idx_cont_banco_mov_raw_clave")
+                await conn.execute("""
+                    INSERT INTO finanzas2.cont_banco_mov_raw
+                        (cuenta_financiera_id, banco, fecha, descripcion, referencia, monto, procesado, empresa_id)
+                    VALUES ($1, 'BCP', '2026-03-01', 'a', 'R1', 1.0, TRUE, $2), ($1, 'BCP', '2026-03-01', 'b', 'R1', 1.0, TRUE, $2)
+                """, cuenta_id, empresa_id)
+            return await BancoImportScheduler().start_job(pool, str(path), "extracto.csv", "hash-1", cuenta_id, "BCP",
+                                                          empresa_id)
+
+        with pytest.raises(ValueError, match="BCP BCP R1 2026-03-01 x2"):
+            testdb.run(main)
+        assert path.exists()
+
+
+class TestTextStatements:
+
+    def write(self, tmp_path, text, encoding="utf-8", name="extracto.csv"):
+        path = tmp_path / name
+        path.write_bytes(text.encode(encoding))
+        return str(path)
+
+    def test_semicolon_csv_in_cp1252(self, tmp_path):
+        text = "Movimientos BCP\r\nNº;Fecha;Valuta;Descripción;Monto;Saldo;Sucursal;Operación\r\n" \
+               "1;02/03/2026;;DEPÓSITO;1,500.00;0;Lima;000123\r\n" \
+               "2;03/03/2026;;\"COMISIÓN; MANT.\";-12.50;0;Lima;000124\r\n"
+        path = self.write(tmp_path, text, encoding="cp1252")
+        assert detect_encoding(open(path, "rb").read()) == "cp1252"
+        assert list(iter_movimientos(iter_statement_rows(path, "BCP"), "BCP")) == [
+            (date(2026, 3, 2), "DEPÓSITO", "000123", 1500.0),
+            (date(2026, 3, 3), "COMISIÓN; MANT.", "000124", -12.5),
+        ]
+
+    def test_tab_separated_with_bom(self, tmp_path):
+        text = "Fecha\tDescripción\tReferencia\tMonto\n2026-03-01\tVarios\tR1\t10\n"
+        path = self.write(tmp_path, text, encoding="utf-8-sig", name="extracto.txt")
+        assert list(iter_statement_rows(path, "PERSONALIZADO")) == [
+            ("Fecha", "Descripción", "Referencia", "Monto"), ("2026-03-01", "Varios", "R1", "10")]
+
+    def test_fixed_width_inferred(self, tmp_path):
+        lines = ["Fecha       Descripcion         Referencia  Monto",
+                 "01/03/2026  PAGO LUZ            A0001        -85.20",
+                 "02/03/2026  ABONO CLIENTE X     A0002       1500.00",
+                 "03/03/2026  ITF                 A0003         -0.10"]
+        assert detect_delimiter(lines) is None
+        path = self.write(tmp_path, "\n".join(lines) + "\n", name="extracto.txt")
+        movs = list(iter_movimientos(iter_statement_rows(path, "PERSONALIZADO"), "PERSONALIZADO"))
+        assert movs[1] == (date(2026, 3, 2), "ABONO CLIENTE X", "A0002", 1500.0)
+        assert len(movs) == 3
+
+    def test_fixed_width_from_spec(self, tmp_path):
+        register_banco("CAJA_TXT", BancoSpec(fecha=0, descripcion=1, referencia=2, monto=3, anchos=(8, 12, 6, 10)))
+        try:
+            path = self.write(tmp_path, "FECHA\n20260301COMPRA 1234 X99      -10.00\n", name="caja.txt")
+            rows = list(iter_statement_rows(path, "CAJA_TXT"))
+            assert rows[1] == ("20260301", "COMPRA 1234", "X99", "-10.00")
+            assert list(iter_movimientos(iter_statement_rows(path, "CAJA_TXT"), "CAJA_TXT")) == [
+                (date(2026, 3, 1), "COMPRA 1234", "X99", -10.0)]
+        finally:
+            unregister_banco("CAJA_TXT")
+        # the compiled parser went with the layout
+        assert get_parser("CAJA_TXT") is get_parser("PERSONALIZADO")
+
+    def test_delimiter_detection(self):
+        assert detect_delimiter(["a,b,c", "1,2,3", "4,5,6"]) == ","
+        assert detect_delimiter(["a;b", "1,5;2", "3;4"]) == ";"
+        assert detect_delimiter(["a|b|c", "1|2|3"]) == "|"
@@ -0,0 +1,64 @@
+"""
+Test the bank statement parser registry:
+1. Each bank layout maps statement rows to (fecha, descripcion, referencia, monto)
+2. Summary and metadata rows are skipped
+3. New layouts are registered declaratively; unknown banks use PERSONALIZADO
+"""
+from datetime import date, datetime
+
+from banco_parsers import (
+    BANCOS, BancoSpec, get_parser, iter_movimientos, parse_fecha, parse_monto, parse_movimiento, register_banco,
+)
+
+
+class TestBancos:
+
+    def test_bcp(self):
+        row = (1, datetime(2026, 3, 2), None, "PAGO PROVEEDOR", "-1,250.50", 900, "Lima", "00123")
+        assert parse_movimiento("BCP", row) == (date(2026, 3, 2), "PAGO PROVEEDOR", "00123", -1250.5)
+
+    def test_bbva_skips_saldo_final(self):
+        row = (1, "05/03/2026", None, "C1", "DOC9", "ABONO CLIENTE", 300, "0100")
+        assert parse_movimiento("BBVA", row) == (date(2026, 3, 5), "ABONO CLIENTE", "DOC9", 300.0)
+        assert parse_movimiento("BBVA", (None, None, None, None, None, "Saldo Final", 5000, None)) is None
+
+    def test_ibk_cargo_and_abono(self):
+        cargo = (3, "2026-03-01", None, "778", "MOV", "COMISION", "WEB", "12.00", None, 100)
+        abono = (4, "2026-03-01", None, "779", "MOV", "DEPOSITO", "AGE", None, 80, 180)
+        assert parse_movimiento("IBK", cargo) == (date(2026, 3, 1), "COMISION", "778", -12.0)
+        assert parse_movimiento("IBK", abono) == (date(2026, 3, 1), "DEPOSITO", "779", 80.0)
+        assert parse_movimiento("IBK", ("Cuenta:", "123") + (None,) * 8) is None
+        assert parse_movimiento("IBK", (5, "2026-03-01", None, "780")) is None
+
+    def test_personalizado(self):
+        assert parse_movimiento("PERSONALIZADO", ("01.03.2026", "Varios", None, 15)) == \
+            (date(2026, 3, 1), "Varios", "", 15.0)
+        assert parse_movimiento("PERSONALIZADO", ("sin fecha", "Varios", None, 15)) is None
+        # Short rows are padded instead of failing
+        assert parse_movimiento("PERSONALIZADO", ("01/03/2026", "Varios")) is None
+
+
+class TestRegistry:
+
+    def test_unknown_bank_uses_default_layout(self):
+        assert get_parser("SCOTIABANK") is get_parser("PERSONALIZADO")
+
+    def test_register_banco(self):
+        register_banco("CAJA", BancoSpec(fecha=0, descripcion=2, referencia=1, cargo=3, abono=4))
+        try:
+            rows = [("Fecha", "Op", "Detalle", "Cargo", "Abono"),
+                    ("02/03/2026", "A1", "Retiro", 50, None),
+                    ("02/03/2026", "A2", "Depósito", None, "1,000")]
+            assert list(iter_movimientos(rows, "CAJA")) == [
+                (date(2026, 3, 2), "Retiro", "A1", -50.0),
+                (date(2026, 3, 2), "Depósito", "A2", 1000.0),
+            ]
+        finally:
+            BANCOS.pop("CAJA")
+
+    def test_cell_parsing(self):
+        assert parse_monto(" 1,234.5 ") == 1234.5
+        assert parse_monto("nan") is None and parse_monto(None) is None
+        assert parse_fecha("31-12-2025") == date(2025, 12, 31)
+        assert parse_fecha(date(2026, 1, 1)) == date(2026, 1, 1)
+        assert parse_fecha(45000) is None
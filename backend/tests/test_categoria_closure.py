@@ -0,0 +1,40 @@
+"""
+Test the category closure rebuild against Postgres (needs TEST_DATABASE_URL):
+1. Concurrent category writes in one empresa rebuild the closure one after the other
+"""
+import asyncio
+
+from pg_testdb import testdb  # noqa: F401
+from server import rebuild_categoria_closure
+
+
+class TestConcurrentRebuild:
+
+    def test_two_writers_same_empresa(self, testdb):
+        empresa_id = testdb.empresa_id
+
+        async def writer(pool, nombre, start, hold):
+            await asyncio.sleep(start)
+            async with pool.acquire() as conn, conn.transaction():
+                await conn.execute("""
+                    INSERT INTO finanzas2.cont_categoria (empresa_id, nombre, tipo) VALUES ($1, $2, 'egreso')
+                """, empresa_id, nombre)
+                await rebuild_categoria_closure(conn, empresa_id)
+                # Keep the rebuilt rows uncommitted while the other writer starts its rebuild
+                await asyncio.sleep(hold)
+
+        async def main(pool):
+            async with pool.acquire() as conn, conn.transaction():
+                await conn.execute("""
+                    INSERT INTO finanzas2.cont_categoria (empresa_id, nombre, tipo) VALUES ($1, 'Gastos', 'egreso')
+                """, empresa_id)
+                await rebuild_categoria_closure(conn, empresa_id)
+            await asyncio.gather(writer(pool, "Alquiler", 0, 0.3), writer(pool, "Luz", 0.1, 0))
+            return await pool.fetch("""
+                SELECT c.nombre, cl.depth FROM finanzas2.cont_categoria_closure cl
+                JOIN finanzas2.cont_categoria c ON c.id = cl.descendant_id
+                WHERE cl.empresa_id = $1 ORDER BY c.nombre
+            """, empresa_id)
+
+        rows = testdb.run(main)
+        assert [(r['nombre'], r['depth']) for r in rows] == [("Alquiler", 0), ("Gastos", 0), ("Luz", 0)]
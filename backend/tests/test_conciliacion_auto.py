@@ -0,0 +1,98 @@
+"""
+Test the automatic bank reconciliation matcher:
+1. Candidates need the same signed amount and dates within the window
+2. Reference similarity ranks candidates; each side is matched at most once
+3. References are normalised before comparing
+4. The date window accepted from clients is bounded
+"""
+import time
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+from conciliacion_auto import (
+    MovBanco, PagoSistema, confianza, normalizar_referencia, proponer_conciliacion, propuesta_to_dict,
+)
+from models import AceptarPropuestasRequest
+from server import app
+
+D = date(2026, 3, 10)
+
+
+def mov(id, monto, dias=0, ref='', desc=''):
+    return MovBanco(id, D + timedelta(days=dias), monto, ref, desc)
+
+
+def pago(id, monto, dias=0, ref='', numero=''):
+    return PagoSistema(id, D + timedelta(days=dias), monto, ref, numero)
+
+
+class TestProponer:
+
+    def test_same_amount_and_sign(self):
+        props = proponer_conciliacion([mov(1, 150.0), mov(2, -80.0)], [pago(10, -150.0), pago(11, -80.0)])
+        assert [(p.banco.id, p.pago.id) for p in props] == [(2, 11)]
+
+    def test_date_window(self):
+        assert proponer_conciliacion([mov(1, 50.0)], [pago(10, 50.0, dias=6)], ventana_dias=5) == []
+        props = proponer_conciliacion([mov(1, 50.0)], [pago(10, 50.0, dias=-5)], ventana_dias=5)
+        assert props[0].dias == 5
+
+    def test_reference_beats_closer_date(self):
+        movs = [mov(1, 200.0, ref='Op. 000778123')]
+        pagos = [pago(10, 200.0, dias=0), pago(11, 200.0, dias=3, ref='778123')]
+        props = proponer_conciliacion(movs, pagos)
+        assert props[0].pago.id == 11
+        assert props[0].similitud_referencia == 0.8   # contained once prefixes are stripped
+
+    def test_reference_in_description(self):
+        props = proponer_conciliacion([mov(1, 90.0, desc='TRANSF PAG-I-2026-00042 CLIENTE')],
+                                      [pago(10, 90.0, numero='PAG-I-2026-00042')])
+        assert props[0].similitud_referencia == 0.7
+
+    def test_one_to_one(self):
+        movs = [mov(1, 100.0, dias=0), mov(2, 100.0, dias=2)]
+        pagos = [pago(10, 100.0, dias=0), pago(11, 100.0, dias=2), pago(12, 100.0, dias=1)]
+        props = proponer_conciliacion(movs, pagos)
+        assert sorted((p.banco.id, p.pago.id) for p in props) == [(1, 10), (2, 11)]
+
+    def test_exact_match_is_high_confidence(self):
+        prop = proponer_conciliacion([mov(1, 75.5, ref='ABC123')], [pago(10, 75.5, ref='abc-123')])[0]
+        assert prop.score == 1.0
+        d = propuesta_to_dict(prop)
+        assert d["confianza"] == confianza(prop.score) == "alta"
+        assert (d["banco_id"], d["pago_id"], d["monto"]) == (1, 10, 75.5)
+
+    def test_many_rows(self):
+        n = 5000
+        movs = [mov(i, float(i % 700) + 0.5, dias=i % 30, ref=f"OP{i}") for i in range(n)]
+        pagos = [pago(i, float(i % 700) + 0.5, dias=i % 30 + i % 3, ref=f"{i:08d}") for i in range(n)]
+        start = time.perf_counter()
+        props = proponer_conciliacion(movs, pagos)
+        assert time.perf_counter() - start < 5
+        assert len(props) == n
+
+
+class TestNormalizar:
+
+    def test_normalizar_referencia(self):
+        assert normalizar_referencia("Op. 000123") == "OP000123"
+        assert normalizar_referencia(" 000123 ") == "123"
+        assert normalizar_referencia(None) == ""
+
+
+class TestVentanaDias:
+
+    def test_request_model_bounds(self):
+        assert AceptarPropuestasRequest(cuenta_financiera_id=1, ventana_dias=60).ventana_dias == 60
+        for ventana in (-1, 61, 10 ** 9):
+            with pytest.raises(ValidationError):
+                AceptarPropuestasRequest(cuenta_financiera_id=1, ventana_dias=ventana)
+
+    def test_query_bounds(self):
+        # Rejected before the handler runs, instead of overflowing the date arithmetic
+        response = TestClient(app).get("/api/conciliacion/propuestas",
+                                       params={"cuenta_financiera_id": 1, "empresa_id": 1, "ventana_dias": 10 ** 9})
+        assert response.status_code == 422
@@ -0,0 +1,69 @@
+"""
+Test currency conversion in the income statement against Postgres (needs TEST_DATABASE_URL):
+1. Foreign-currency ventas and gastos are converted with the as-of rate (or the document rate)
+2. A foreign amount without any rate fails with 422 naming the moneda and fecha
+"""
+from datetime import date, datetime
+
+import pytest
+from fastapi import HTTPException
+
+import database
+from pg_testdb import testdb  # noqa: F401
+from server import reporte_estado_resultados
+
+
+async def seed(pool, empresa_id, con_tasa=True):
+    async with pool.acquire() as conn:
+        await conn.execute("""
+            INSERT INTO finanzas2.cont_moneda (codigo, nombre, simbolo, es_principal)
+            VALUES ('PEN', 'Sol', 'S/', TRUE), ('USD', 'Dólar', '$', FALSE)
+        """)
+        usd = await conn.fetchval("SELECT id FROM finanzas2.cont_moneda WHERE codigo = 'USD'")
+        if con_tasa:
+            await conn.execute("""
+                INSERT INTO finanzas2.cont_tipo_cambio (moneda_id, fecha, tasa_compra, tasa_venta)
+                VALUES ($1, '2026-03-01', 3.70, 3.75)
+            """, usd)
+        await conn.execute("""
+            INSERT INTO finanzas2.cont_venta_pos (empresa_id, odoo_id, date_order, amount_total, estado_local, moneda)
+            VALUES ($1, 1, $2, 100, 'confirmada', NULL), ($1, 2, $2, 10, 'confirmada', 'USD')
+        """, empresa_id, datetime(2026, 3, 10, 12))
+        for numero, moneda_id, tipo_cambio, importe in [("G-1", None, None, 50), ("G-2", usd, None, 20),
+                                                        ("G-3", usd, 4, 5)]:
+            gasto_id = await conn.fetchval("""
+                INSERT INTO finanzas2.cont_gasto (empresa_id, numero, fecha, moneda_id, tipo_cambio)
+                VALUES ($1, $2, '2026-03-10', $3, $4) RETURNING id
+            """, empresa_id, numero, moneda_id, tipo_cambio)
+            await conn.execute("""
+                INSERT INTO finanzas2.cont_gasto_linea (empresa_id, gasto_id, importe) VALUES ($1, $2, $3)
+            """, empresa_id, gasto_id, importe)
+
+
+def run_report(testdb, con_tasa):
+    async def main(pool):
+        await seed(pool, testdb.empresa_id, con_tasa)
+        previous, database.pool = database.pool, pool
+        try:
+            return await reporte_estado_resultados(
+                fecha_desde=date(2026, 3, 1), fecha_hasta=date(2026, 3, 31), categoria_id=None, nivel=None,
+                empresa_id=testdb.empresa_id, if_none_match=None)
+        finally:
+            database.pool = previous
+    return testdb.run(main)
+
+
+class TestEstadoResultadosMoneda:
+
+    def test_converts_ingresos_and_egresos(self, testdb):
+        resultado = run_report(testdb, con_tasa=True)
+        assert resultado["total_ingresos"] == pytest.approx(100 + 10 * 3.75)
+        # G-3 carries its own rate (4), G-2 falls back to the as-of rate
+        assert resultado["total_egresos"] == pytest.approx(50 + 20 * 3.75 + 5 * 4)
+
+    def test_missing_rate_is_reported(self, testdb):
+        with pytest.raises(HTTPException) as exc:
+            run_report(testdb, con_tasa=False)
+        assert exc.value.status_code == 422
+        # G-3 has a document rate, so only the dates needing the daily rate are listed
+        assert exc.value.detail["faltantes"] == [{"moneda": "USD", "fecha": "2026-03-10"}]
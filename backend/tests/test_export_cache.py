@@ -0,0 +1,62 @@
+"""
+Test the content-addressed export cache:
+1. Fingerprints are stable for equal inputs and change when any input changes
+2. Contents round-trip through put/get
+3. Size-bounded eviction drops the least recently used files first
+4. Contents already returned survive a concurrent eviction
+"""
+import os
+import time
+from datetime import date, datetime
+from decimal import Decimal
+
+from export_cache import ExportFileCache, fingerprint
+
+
+class TestFingerprint:
+
+    def test_stable_and_sensitive(self):
+        rows = [{"id": 1, "vou_numero": "000001", "total": Decimal("118.00"), "updated_at": datetime(2026, 1, 5, 10, 0)}]
+        a = fingerprint(3, date(2026, 1, 1), None, rows)
+        b = fingerprint(3, date(2026, 1, 1), None, [dict(rows[0])])
+        assert a == b
+        changed = [{**rows[0], "vou_numero": "000002"}]
+        assert fingerprint(3, date(2026, 1, 1), None, changed) != a
+        assert fingerprint(3, date(2026, 1, 2), None, rows) != a
+
+    def test_decimal_scale_does_not_matter(self):
+        assert fingerprint(Decimal("1.10")) == fingerprint(Decimal("1.1"))
+
+
+class TestExportFileCache:
+
+    def test_put_get(self, tmp_path):
+        cache = ExportFileCache(str(tmp_path), max_bytes=1024)
+        assert cache.get("abc") is None
+        assert cache.put("abc", b"xlsx-bytes") == b"xlsx-bytes"
+        assert cache.get("abc") == b"xlsx-bytes"
+        assert (tmp_path / "abc.xlsx").read_bytes() == b"xlsx-bytes"
+
+    def test_lru_eviction(self, tmp_path):
+        cache = ExportFileCache(str(tmp_path), max_bytes=250)
+        cache.put("a", b"x" * 100)
+        cache.put("b", b"x" * 100)
+        # Make "a" the most recently used, "b" the oldest
+        past = time.time() - 60
+        os.utime(tmp_path / "b.xlsx", (past, past))
+        cache.get("a")
+        cache.put("c", b"x" * 100)
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.get("c") is not None
+
+    def test_hit_survives_eviction_by_another_put(self, tmp_path):
+        cache = ExportFileCache(str(tmp_path), max_bytes=150)
+        cache.put("a", b"a" * 100)
+        hit = cache.get("a")
+        # another request's write evicts "a" before this one has sent it
+        past = time.time() - 60
+        os.utime(tmp_path / "a.xlsx", (past, past))
+        cache.put("b", b"b" * 100)
+        assert not (tmp_path / "a.xlsx").exists()
+        assert hit == b"a" * 100
@@ -186,5 +186,60 @@ class TestCategoryHierarchy:
         print(f"✓ Cleaned up test factura")
 
 
+class TestCategoryClosure:
+    """Test closure-table backed hierarchy (multi-level paths, subtree, cycles)"""
+
+    EMPRESA_ID = 3
+
+    def _create(self, nombre, padre_id=None):
+        response = requests.post(f"{BASE_URL}/api/categorias", params={"empresa_id": self.EMPRESA_ID},
+                                 json={"nombre": nombre, "tipo": "egreso", "padre_id": padre_id})
+        assert response.status_code == 200, f"Failed to create categoria: {response.text}"
+        return response.json()
+
+    def _delete(self, cat_id):
+        requests.delete(f"{BASE_URL}/api/categorias/{cat_id}", params={"empresa_id": self.EMPRESA_ID})
+
+    def test_three_level_hierarchy(self):
+        """nombre_completo covers every ancestor and subarbol returns all descendants"""
+        raiz = self._create("TEST Raiz")
+        hijo = self._create("TEST Hijo", raiz["id"])
+        nieto = self._create("TEST Nieto", hijo["id"])
+        try:
+            assert nieto["nombre_completo"] == "TEST Raiz > TEST Hijo > TEST Nieto"
+            assert nieto["nivel"] == 3
+
+            response = requests.get(f"{BASE_URL}/api/categorias/{raiz['id']}/subarbol",
+                                    params={"empresa_id": self.EMPRESA_ID})
+            assert response.status_code == 200
+            ids = {c["id"]: c["depth"] for c in response.json()}
+            assert ids == {raiz["id"]: 0, hijo["id"]: 1, nieto["id"]: 2}
+
+            # Renaming an ancestor refreshes the cached path of its descendants
+            response = requests.put(f"{BASE_URL}/api/categorias/{hijo['id']}",
+                                    params={"empresa_id": self.EMPRESA_ID}, json={"nombre": "TEST Hijo2"})
+            assert response.status_code == 200
+            cats = requests.get(f"{BASE_URL}/api/categorias", params={"empresa_id": self.EMPRESA_ID}).json()
+            nieto_actual = next(c for c in cats if c["id"] == nieto["id"])
+            assert nieto_actual["nombre_completo"] == "TEST Raiz > TEST Hijo2 > TEST Nieto"
+            print(f"✓ Multi-level path: {nieto_actual['nombre_completo']}")
+        finally:
+            for cat in (nieto, hijo, raiz):
+                self._delete(cat["id"])
+
+    def test_cycle_rejected(self):
+        """A category cannot be moved under one of its own descendants"""
+        raiz = self._create("TEST Ciclo Raiz")
+        hijo = self._create("TEST Ciclo Hijo", raiz["id"])
+        try:
+            response = requests.put(f"{BASE_URL}/api/categorias/{raiz['id']}",
+                                    params={"empresa_id": self.EMPRESA_ID}, json={"padre_id": hijo["id"]})
+            assert response.status_code == 400
+            print("✓ Cycle rejected")
+        finally:
+            self._delete(hijo["id"])
+            self._delete(raiz["id"])
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
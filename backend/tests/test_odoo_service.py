@@ -0,0 +1,244 @@
+"""
+Test OdooService batching against an in-memory fake of the object endpoint:
+1. Lines for many orders are fetched with a fixed number of RPC calls
+2. Lines are grouped by order and enriched with product_code, marca and tipo
+3. Incremental order fetches filter and sort by the (write_date, id) watermark
+4. AsyncOdooService runs blocking calls off the event loop
+5. The uid is cached and shared across pooled sessions; revoked uids re-authenticate once
+6. Against the local XML-RPC stub: paging, incremental fetch and connection reuse
+7. The JSON-RPC transport returns the same data and maps server errors to Fault
+"""
+import asyncio
+import time
+import xmlrpc.client
+from datetime import datetime
+
+import pytest
+
+from odoo_service import AsyncOdooService, OdooClientRegistry, OdooService, page_cursor
+from odoo_stub import start_stub
+
+LINES = [
+    {"id": 11, "order_id": [1, "POS/001"], "product_id": [100, "Polo"], "qty": 1},
+    {"id": 12, "order_id": [1, "POS/001"], "product_id": [101, "Jean"], "qty": 2},
+    {"id": 21, "order_id": [2, "POS/002"], "product_id": [100, "Polo"], "qty": 1},
+]
+PRODUCTS = {
+    100: {"id": 100, "product_tmpl_id": [500, "Polo"], "default_code": "PL-1"},
+    101: {"id": 101, "product_tmpl_id": [501, "Jean"], "default_code": "JN-1"},
+}
+TEMPLATES = {
+    500: {"id": 500, "marca": [7, "Ambission"], "tipo": [3, "Polo"]},
+    501: {"id": 501, "marca": False, "tipo": [4, "Pantalón"]},
+}
+
+
+class FakeModels:
+    def __init__(self):
+        self.calls = []
+
+    def execute_kw(self, db, uid, password, model, method, args, kwargs=None):
+        self.calls.append((model, method))
+        self.last = (args, kwargs)
+        if model == "pos.order":
+            return []
+        if model == "pos.order.line":
+            ids = args[0][0][2]
+            return [dict(l) for l in LINES if l["order_id"][0] in ids]
+        table = PRODUCTS if model == "product.product" else TEMPLATES
+        return [dict(table[i]) for i in args[0]]
+
+
+def make_service():
+    odoo = OdooService("ambission")
+    odoo.uid = 2
+    odoo.models = FakeModels()
+    return odoo
+
+
+class TestOrderLinesBatch:
+
+    def test_constant_round_trips(self):
+        odoo = make_service()
+        result = odoo.get_order_lines_batch([1, 2, 3])
+        assert odoo.models.calls == [
+            ("pos.order.line", "search_read"),
+            ("product.product", "read"),
+            ("product.template", "read"),
+        ]
+        assert [l["id"] for l in result[1]] == [11, 12]
+        assert [l["id"] for l in result[2]] == [21]
+        assert result[3] == []
+
+    def test_enrichment(self):
+        lines = make_service().get_order_lines_batch([1])[1]
+        assert lines[0]["product_code"] == "PL-1"
+        assert lines[0]["marca"] == "Ambission" and lines[0]["tipo"] == "Polo"
+        assert lines[1]["marca"] == "" and lines[1]["tipo"] == "Pantalón"
+
+    def test_single_order_delegates(self):
+        assert [l["id"] for l in make_service().get_order_lines(2)] == [21]
+
+
+class TestIncrementalOrders:
+
+    def test_watermark_domain(self):
+        odoo = make_service()
+        odoo.get_pos_orders(since=("2026-03-01 10:00:00", 42))
+        (domain,), kwargs = odoo.models.last
+        assert domain == [('write_date', '>=', "2026-03-01 10:00:00")]
+        assert kwargs['order'] == 'write_date asc, id asc'
+        assert 'write_date' in kwargs['fields']
+
+    def test_days_back_domain(self):
+        odoo = make_service()
+        odoo.get_pos_orders(days_back=7)
+        (domain,), _ = odoo.models.last
+        assert domain[0][0] == 'date_order'
+
+
+class TestAsyncOdooService:
+
+    def test_blocking_call_does_not_stall_loop(self):
+        client = AsyncOdooService("ambission", pool_size=1)
+        client.sessions[0].authenticate = lambda: time.sleep(0.2) or True
+
+        async def scenario():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.01)
+                    ticks += 1
+
+            task = asyncio.create_task(ticker())
+            ok = await client.authenticate()
+            task.cancel()
+            return ok, ticks
+
+        ok, ticks = asyncio.run(scenario())
+        assert ok is True
+        assert ticks >= 5
+
+
+class TestClientPool:
+
+    def test_uid_cached_and_shared(self):
+        client = AsyncOdooService("ambission", pool_size=2)
+        calls = []
+
+        def fake_auth():
+            calls.append(1)
+            client.sessions[0].uid = 7
+            return True
+
+        client.sessions[0].authenticate = fake_auth
+
+        async def scenario():
+            assert await client.authenticate()
+            assert await client.authenticate()
+
+        asyncio.run(scenario())
+        assert calls == [1]
+        assert [s.uid for s in client.sessions] == [7, 7]
+
+    def test_registry_reuses_client(self):
+        registry = OdooClientRegistry()
+        assert registry.get("ambission") is registry.get("ambission")
+        assert registry.get("ambission") is not registry.get("proyectomoda")
+
+    def test_reauthenticates_on_access_denied(self):
+        odoo = make_service()
+        attempts = []
+
+        class Revoked(FakeModels):
+            def execute_kw(self, *args):
+                attempts.append(args[1])
+                if len(attempts) == 1:
+                    raise xmlrpc.client.Fault(3, "AccessDenied")
+                return []
+
+        def reauth():
+            odoo.uid = 9
+            return True
+
+        odoo.models = Revoked()
+        odoo.authenticate = reauth
+        assert odoo.execute_kw("pos.order", "search_read", [[]]) == []
+        assert attempts == [2, 9]
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    server = start_stub(orders=250, lines_per_order=2)
+    monkeypatch.setenv("ODOO_URL", server.url)
+    yield server
+    server.shutdown()
+
+
+class TestAgainstStub:
+
+    def test_pages_and_lines(self, stub):
+        odoo = OdooService("ambission")
+        assert odoo.authenticate()
+        seen, after = [], None
+        while True:
+            page = odoo.get_pos_orders(days_back=3650, after=after, limit=100)
+            if not page:
+                break
+            seen += [o["id"] for o in page]
+            after = page_cursor(page, after)
+        assert seen == list(range(1, 251))
+        lines = odoo.get_order_lines_batch(seen[:10])
+        assert all(len(lines[i]) == 2 for i in seen[:10])
+        assert lines[1][0]["marca"] and lines[1][0]["product_code"].startswith("P-")
+        # One keep-alive connection carries every call of the session
+        assert stub.connections == 1
+
+    def test_incremental_since_watermark(self, stub):
+        odoo = OdooService("ambission")
+        odoo.authenticate()
+        last = odoo.get_pos_orders(days_back=3650, limit=1000)[-1]
+        stub.data.touch({5, 9}, datetime(2026, 6, 1))
+        changed = odoo.get_pos_orders(since=(last["write_date"], last["id"]))
+        # the watermark's own second is read again
+        assert [o["id"] for o in changed] == [last["id"], 5, 9]
+
+    def test_catalog_changes_and_plain_lines(self, stub):
+        odoo = OdooService("ambission")
+        odoo.authenticate()
+        assert len(odoo.get_products_since(None)) == len(stub.data.products)
+        assert odoo.get_products_since("2030-01-01 00:00:00") == []
+        assert len(odoo.get_templates_since(None)) == len(stub.data.templates)
+        plain = odoo.get_order_lines_batch([1], enrich=False)[1]
+        assert plain and "marca" not in plain[0]
+        assert stub.calls[("product.product", "read")] == 0
+
+
+class TestJsonRpc:
+
+    def test_protocol_selection(self, monkeypatch):
+        monkeypatch.setenv("ODOO_PROTOCOL", "jsonrpc")
+        assert OdooService("ambission").protocol == "jsonrpc"
+        monkeypatch.setenv("ODOO_PROTOCOL_PROYECTOMODA", "xmlrpc")
+        assert OdooService("proyectomoda").protocol == "xmlrpc"
+        with pytest.raises(ValueError):
+            OdooService("ambission", protocol="grpc")
+
+    def test_same_results_as_xmlrpc(self, stub):
+        xml = OdooService("ambission", protocol="xmlrpc")
+        js = OdooService("ambission", protocol="jsonrpc")
+        assert xml.authenticate() and js.authenticate()
+        assert js.get_pos_orders(days_back=3650, limit=50) == xml.get_pos_orders(days_back=3650, limit=50)
+        assert js.count_pos_orders(days_back=3650) == 250
+        assert js.get_order_lines_batch([1, 2]) == xml.get_order_lines_batch([1, 2])
+
+    def test_server_errors_raise_fault(self, stub):
+        odoo = OdooService("ambission", protocol="jsonrpc")
+        odoo.authenticate()
+        with pytest.raises(xmlrpc.client.Fault) as exc:
+            odoo.execute_kw("pos.order", "unlink", [[1]])
+        assert "Unsupported method" in exc.value.faultString
+        # A single /jsonrpc endpoint serves both services over one keep-alive connection
+        assert stub.connections == 1
@@ -0,0 +1,166 @@
+"""
+Test the closed-period triggers against Postgres (needs TEST_DATABASE_URL):
+1. Lines of a gasto / factura dated in a closed month cannot be inserted, changed or deleted
+2. Lines of documents in open months are unaffected
+3. Changing an exchange rate or a category purges the cached reports it may affect
+4. So does changing unlocked lookup data the reports read (saldo, supplier, accounts, monedas)
+"""
+from datetime import date
+
+import asyncpg
+import pytest
+
+from pg_testdb import testdb  # noqa: F401
+
+
+async def seed(conn, empresa_id):
+    """A January and a February gasto plus a January factura; then January is closed"""
+    ids = {}
+    for numero, fecha in [("G-ENE", date(2026, 1, 15)), ("G-FEB", date(2026, 2, 15))]:
+        ids[numero] = await conn.fetchval("""
+            INSERT INTO finanzas2.cont_gasto (empresa_id, numero, fecha) VALUES ($1, $2, $3) RETURNING id
+        """, empresa_id, numero, fecha)
+    linea_ene = await conn.fetchval("""
+        INSERT INTO finanzas2.cont_gasto_linea (empresa_id, gasto_id, importe) VALUES ($1, $2, 10) RETURNING id
+    """, empresa_id, ids["G-ENE"])
+    factura_id = await conn.fetchval("""
+        INSERT INTO finanzas2.cont_factura_proveedor (empresa_id, numero, fecha_factura)
+        VALUES ($1, 'F-ENE', '2026-01-20') RETURNING id
+    """, empresa_id)
+    await conn.execute("INSERT INTO finanzas2.cont_periodo_cerrado (empresa_id, anio, mes) VALUES ($1, 2026, 1)",
+                       empresa_id)
+    return ids, linea_ene, factura_id
+
+
+class TestLineasPeriodoCerrado:
+
+    def test_line_writes_rejected(self, testdb):
+        empresa_id = testdb.empresa_id
+
+        async def main(pool):
+            async with pool.acquire() as conn:
+                ids, linea_ene, factura_id = await seed(conn, empresa_id)
+                statements = [
+                    ("INSERT INTO finanzas2.cont_gasto_linea (empresa_id, gasto_id, importe) VALUES ($1, $2, 5)",
+                     empresa_id, ids["G-ENE"]),
+                    ("UPDATE finanzas2.cont_gasto_linea SET importe = 99 WHERE id = $1", linea_ene),
+                    ("DELETE FROM finanzas2.cont_gasto_linea WHERE id = $1", linea_ene),
+                    # moving the line to an open document still removes it from the closed one
+                    ("UPDATE finanzas2.cont_gasto_linea SET gasto_id = $2 WHERE id = $1", linea_ene, ids["G-FEB"]),
+                    ("""INSERT INTO finanzas2.cont_factura_proveedor_linea (empresa_id, factura_id, importe)
+                        VALUES ($1, $2, 5)""", empresa_id, factura_id),
+                ]
+                for sql, *args in statements:
+                    with pytest.raises(asyncpg.RaiseError, match="cerrado"):
+                        await conn.execute(sql, *args)
+                # February is open
+                await conn.execute("""
+                    INSERT INTO finanzas2.cont_gasto_linea (empresa_id, gasto_id, importe) VALUES ($1, $2, 5)
+                """, empresa_id, ids["G-FEB"])
+                return await conn.fetchval("SELECT importe FROM finanzas2.cont_gasto_linea WHERE id = $1",
+                                           linea_ene)
+
+        assert testdb.run(main) == 10
+
+
+class TestReporteCachePurge:
+
+    def test_rate_and_category_changes_purge(self, testdb):
+        empresa_id = testdb.empresa_id
+
+        async def claves(conn):
+            rows = await conn.fetch("SELECT clave FROM finanzas2.cont_reporte_cache ORDER BY clave")
+            return [r['clave'] for r in rows]
+
+        async def main(pool):
+            async with pool.acquire() as conn:
+                moneda_id = await conn.fetchval("""
+                    INSERT INTO finanzas2.cont_moneda (codigo, nombre, simbolo) VALUES ('USD', 'Dólar', '$') RETURNING id
+                """)
+                await conn.execute("""
+                    INSERT INTO finanzas2.cont_tipo_cambio (moneda_id, fecha, tasa_compra, tasa_venta)
+                    VALUES ($1, '2026-02-01', 3.7, 3.75)
+                """, moneda_id)
+                categoria_id = await conn.fetchval("""
+                    INSERT INTO finanzas2.cont_categoria (empresa_id, nombre, tipo) VALUES ($1, 'Luz', 'egreso')
+                    RETURNING id
+                """, empresa_id)
+
+                async def cache(*rangos):
+                    for desde, hasta in rangos:
+                        await conn.execute("""
+                            INSERT INTO finanzas2.cont_reporte_cache
+                                (empresa_id, clave, fecha_desde, fecha_hasta, etag, media_type, payload)
+                            VALUES ($1, $2, $3, $4, 'e', 'application/json', '')
+                        """, empresa_id, f"r:{desde}", desde, hasta)
+
+                await cache((date(2026, 1, 1), date(2026, 1, 31)), (date(2026, 2, 1), date(2026, 2, 28)))
+                # same values: nothing to purge
+                await conn.execute("UPDATE finanzas2.cont_tipo_cambio SET tasa_venta = 3.75")
+                await conn.execute("UPDATE finanzas2.cont_categoria SET nombre = 'Luz' WHERE id = $1", categoria_id)
+                sin_cambios = await claves(conn)
+                # a February rate can only change reports reaching February
+                await conn.execute("UPDATE finanzas2.cont_tipo_cambio SET tasa_venta = 3.80")
+                tras_tasa = await claves(conn)
+                await conn.execute("UPDATE finanzas2.cont_categoria SET nombre = 'Energía' WHERE id = $1",
+                                   categoria_id)
+                return sin_cambios, tras_tasa, await claves(conn)
+
+        sin_cambios, tras_tasa, tras_categoria = testdb.run(main)
+        assert sin_cambios == ["r:2026-01-01", "r:2026-02-01"]
+        assert tras_tasa == ["r:2026-01-01"]
+        assert tras_categoria == []
+
+    def test_lookup_changes_purge(self, testdb):
+        empresa_id = testdb.empresa_id
+
+        async def main(pool):
+            async with pool.acquire() as conn:
+                otra = await conn.fetchval("INSERT INTO finanzas2.cont_empresa (nombre) VALUES ('Otra') RETURNING id")
+                proveedor_id = await conn.fetchval("""
+                    INSERT INTO finanzas2.cont_tercero (empresa_id, nombre, numero_documento, es_proveedor)
+                    VALUES ($1, 'Proveedor', '20100000001', TRUE) RETURNING id
+                """, empresa_id)
+                _, _, factura_id = await seed(conn, empresa_id)
+
+                async def cache():
+                    """January and February reports for both empresas"""
+                    for emp, prefijo in [(empresa_id, "r"), (otra, "otra")]:
+                        for desde, hasta in [(date(2026, 1, 1), date(2026, 1, 31)), (date(2026, 2, 1), date(2026, 2, 28))]:
+                            await conn.execute("""
+                                INSERT INTO finanzas2.cont_reporte_cache
+                                    (empresa_id, clave, fecha_desde, fecha_hasta, etag, media_type, payload)
+                                VALUES ($1, $2, $3, $4, 'e', 'application/json', '')
+                                ON CONFLICT DO NOTHING
+                            """, emp, f"{prefijo}:{desde}", desde, hasta)
+
+                async def claves():
+                    rows = await conn.fetch("SELECT clave FROM finanzas2.cont_reporte_cache ORDER BY clave")
+                    return [r['clave'] for r in rows]
+
+                pasos = {}
+                await cache()
+                # unchanged values purge nothing; a payment on a January factura only purges January
+                await conn.execute("UPDATE finanzas2.cont_tercero SET nombre = nombre")
+                await conn.execute("UPDATE finanzas2.cont_factura_proveedor SET saldo_pendiente = 40 WHERE id = $1",
+                                   factura_id)
+                pasos["saldo"] = await claves()
+                await cache()
+                await conn.execute("UPDATE finanzas2.cont_tercero SET nombre = 'Proveedor SAC' WHERE id = $1",
+                                   proveedor_id)
+                pasos["tercero"] = await claves()
+                await cache()
+                await conn.execute("INSERT INTO finanzas2.cont_config_empresa (empresa_id) VALUES ($1)", empresa_id)
+                pasos["config"] = await claves()
+                await cache()
+                await conn.execute("INSERT INTO finanzas2.cont_moneda (codigo, nombre, simbolo) VALUES ('EUR', 'Euro', 'E')")
+                await conn.execute("UPDATE finanzas2.cont_moneda SET es_principal = TRUE WHERE codigo = 'EUR'")
+                pasos["moneda"] = await claves()
+                return pasos
+
+        pasos = testdb.run(main)
+        otra = ["otra:2026-01-01", "otra:2026-02-01"]
+        assert pasos["saldo"] == otra + ["r:2026-02-01"]
+        assert pasos["tercero"] == otra
+        assert pasos["config"] == otra
+        assert pasos["moneda"] == []
@@ -0,0 +1,67 @@
+"""
+Test period locks (periodos cerrados) for Finanzas 4.0 API
+Tests that:
+1. Writes dated inside a closed month are rejected with 400
+2. Reports for ranges entirely inside closed months carry immutable Cache-Control + ETag
+3. If-None-Match with the same ETag returns 304
+4. Reopening the month allows writes again
+"""
+import pytest
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+EMPRESA_ID = 3
+ANIO, MES = 2001, 1
+PARAMS = {"empresa_id": EMPRESA_ID}
+
+
+@pytest.fixture
+def periodo_cerrado():
+    response = requests.post(f"{BASE_URL}/api/periodos-cerrados", params=PARAMS, json={"anio": ANIO, "mes": MES})
+    assert response.status_code == 200, response.text
+    yield
+    requests.delete(f"{BASE_URL}/api/periodos-cerrados/{ANIO}/{MES}", params=PARAMS)
+
+
+class TestPeriodosCerrados:
+
+    def test_write_in_closed_period_rejected(self, periodo_cerrado):
+        cuentas = requests.get(f"{BASE_URL}/api/cuentas-financieras", params=PARAMS).json()
+        if not cuentas:
+            pytest.skip("No cuentas financieras available")
+        gasto_data = {
+            "fecha": f"{ANIO}-{MES:02d}-15",
+            "moneda_id": 1,
+            "beneficiario_nombre": "TEST Periodo Cerrado",
+            "lineas": [{"descripcion": "TEST", "importe": 100.00, "igv_aplica": False}],
+            "pagos": [{"cuenta_financiera_id": cuentas[0]["id"], "medio_pago": "efectivo", "monto": 100.00}],
+        }
+        response = requests.post(f"{BASE_URL}/api/gastos", params=PARAMS, json=gasto_data)
+        assert response.status_code == 400, response.text
+        assert "cerrado" in response.json()["detail"]
+        print(f"✓ Write rejected: {response.json()['detail']}")
+
+    def test_closed_report_is_immutable(self, periodo_cerrado):
+        params = {**PARAMS, "fecha_desde": f"{ANIO}-{MES:02d}-01", "fecha_hasta": f"{ANIO}-{MES:02d}-31"}
+        response = requests.get(f"{BASE_URL}/api/reportes/flujo-caja", params=params)
+        assert response.status_code == 200
+        assert "immutable" in response.headers.get("Cache-Control", "")
+        etag = response.headers.get("ETag")
+        assert etag
+
+        response = requests.get(f"{BASE_URL}/api/reportes/flujo-caja", params=params,
+                                headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        print(f"✓ Closed-period report cached with ETag {etag}")
+
+    def test_open_report_not_cached(self):
+        params = {**PARAMS, "fecha_desde": "2001-02-01", "fecha_hasta": "2001-02-28"}
+        response = requests.get(f"{BASE_URL}/api/reportes/flujo-caja", params=params)
+        assert response.status_code == 200
+        assert "immutable" not in response.headers.get("Cache-Control", "")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,91 @@
+"""
+Test parsing of Odoo x_pagos into payment rows:
+1. Several formas de pago with amounts, currency marks and references
+2. Thousands separators and decimal commas
+3. Empty / unparseable text yields no payments
+4. Accepting payments numbers them from the PAG-I correlativo block across
+   sequential acceptances, and an accepted venta is never accepted twice
+   (against Postgres, needs TEST_DATABASE_URL)
+"""
+from datetime import datetime
+
+from pg_testdb import testdb  # noqa: F401
+from pos_pagos import PagoOdoo, _UPSERT_PAGOS_ODOO_SQL, aceptar_pagos_odoo, parse_x_pagos
+
+
+class TestParseXPagos:
+
+    def test_multiple_payments(self):
+        assert parse_x_pagos("Efectivo: 50.00, Yape S/ 30 (Op. 123456)") == [
+            PagoOdoo("Efectivo", 50.0, None),
+            PagoOdoo("Yape", 30.0, "123456"),
+        ]
+
+    def test_separators_and_references(self):
+        pagos = parse_x_pagos("Tarjeta Visa: 1,250.50 Ref: 00981\nTransferencia BCP = 20,5 | Plin: 10")
+        assert pagos == [
+            PagoOdoo("Tarjeta Visa", 1250.5, "00981"),
+            PagoOdoo("Transferencia BCP", 20.5, None),
+            PagoOdoo("Plin", 10.0, None),
+        ]
+
+    def test_nothing_to_parse(self):
+        assert parse_x_pagos(None) == []
+        assert parse_x_pagos("") == []
+        assert parse_x_pagos("Pendiente de pago") == []
+
+    def test_upsert_skips_unchanged_rows(self):
+        assert "ON CONFLICT (venta_pos_id, secuencia) DO UPDATE" in _UPSERT_PAGOS_ODOO_SQL
+        assert "IS DISTINCT FROM" in _UPSERT_PAGOS_ODOO_SQL
+
+
+class TestAceptarPagosOdoo:
+
+    def test_numbering_and_reacceptance(self, testdb):
+        empresa_id = testdb.empresa_id
+        prefijo = f"PAG-I-{datetime.now().year}-"
+
+        async def main(pool):
+            async with pool.acquire() as conn:
+                await conn.execute("""
+                    INSERT INTO finanzas2.cont_moneda (codigo, nombre, simbolo, es_principal) VALUES ('PEN', 'Sol', 'S/', TRUE)
+                """)
+                caja = await conn.fetchval("""
+                    INSERT INTO finanzas2.cont_cuenta_financiera (empresa_id, nombre, tipo) VALUES ($1, 'Caja', 'caja')
+                    RETURNING id
+                """, empresa_id)
+                # Payments registered one by one earlier already used numbers up to 7
+                await conn.execute("""
+                    INSERT INTO finanzas2.cont_correlativos (empresa_id, tipo_documento, prefijo, ultimo_numero)
+                    VALUES ($1, 'pago_ingreso', $2, 7)
+                """, empresa_id, prefijo)
+                ventas = {}
+                for odoo_id, x_pagos, total in [(1, "Efectivo: 50, Yape: 30 (Op. 99)", 80), (2, "Efectivo: 20", 20)]:
+                    ventas[odoo_id] = await conn.fetchval("""
+                        INSERT INTO finanzas2.cont_venta_pos (empresa_id, odoo_id, name, date_order, amount_total, x_pagos)
+                        VALUES ($1, $2, $3, '2026-03-10 12:00', $4, $5) RETURNING id
+                    """, empresa_id, odoo_id, f"POS/{odoo_id:03d}", total, x_pagos)
+
+                cuentas = {"Efectivo": caja, "Yape": caja}
+                resultados = []
+                for venta in (1, 2, 1):
+                    async with conn.transaction():
+                        resultados.append(await aceptar_pagos_odoo(conn, empresa_id, cuentas, venta_ids=[ventas[venta]]))
+                pagos = await conn.fetch("""
+                    SELECT p.numero, a.documento_id, p.monto_total FROM finanzas2.cont_pago p
+                    JOIN finanzas2.cont_pago_aplicacion a ON a.pago_id = p.id ORDER BY p.numero
+                """)
+                ultimo = await conn.fetchval("""
+                    SELECT ultimo_numero FROM finanzas2.cont_correlativos WHERE empresa_id = $1 AND prefijo = $2
+                """, empresa_id, prefijo)
+                return ventas, resultados, pagos, ultimo
+
+        ventas, resultados, pagos, ultimo = testdb.run(main)
+        assert resultados == [{"confirmadas": 1, "pagos": 2}, {"confirmadas": 1, "pagos": 1},
+                              {"confirmadas": 0, "pagos": 0}]
+        assert [(p['numero'], p['documento_id'], float(p['monto_total'])) for p in pagos] == [
+            (f"{prefijo}00008", ventas[1], 50.0),
+            (f"{prefijo}00009", ventas[1], 30.0),
+            (f"{prefijo}00010", ventas[2], 20.0),
+        ]
+        assert ultimo == 10
@@ -0,0 +1,297 @@
+"""
+Test the Odoo POS sync transforms:
+1. Odoo pos.order records map onto cont_venta_pos columns (many2one, False values)
+2. The bulk upsert is idempotent, rewrites only changed orders and leaves orders
+   already processed locally alone (against Postgres, needs TEST_DATABASE_URL)
+3. Line sync inserts new, updates changed and deletes vanished lines, leaving
+   unchanged ones unwritten (against Postgres, needs TEST_DATABASE_URL)
+4. Page cursors are ANDed with the base domain
+5. Scheduler targets (scoped to one empresa) and job rows are parsed for the status endpoint
+6. Multi-company runs aggregate the caller's per-target results into one report
+7. Against the Odoo stub and Postgres (needs TEST_DATABASE_URL): progress reports
+   count the page just written; an Odoo failure mid-sync fails the run and only
+   advances the watermark past written pages; a fan-out fits a small pool
+"""
+import asyncio
+import xmlrpc.client
+from datetime import datetime
+
+import pytest
+
+import pos_sync
+from odoo_service import OdooClientRegistry
+from odoo_stub import start_stub
+from pg_testdb import testdb  # noqa: F401
+from pos_sync import (
+    LINE_COLUMNS, ORDER_COLUMN_TYPES, ORDER_COLUMNS, PosSyncScheduler, build_run_report, empresa_sync_targets,
+    get_sync_watermark, job_to_dict, parse_line, parse_order, parse_sync_targets, sync_lines, sync_pos_orders,
+    upsert_orders,
+)
+from producto_odoo import ProductoDimension
+from test_odoo_service import make_service
+
+
+class TestParseOrder:
+
+    def test_many2one_and_false_values(self):
+        values = parse_order({
+            "id": 9, "date_order": "2026-03-01 15:30:00", "name": "POS/009",
+            "partner_id": [5, "Cliente"], "x_tienda": [2, "Gamarra"], "vendedor_id": False,
+            "company_id": [1, "Ambission"], "x_pagos": False, "order_cancel": [3, "POS/003"],
+            "reserva_use_id": False, "amount_total": 120.5,
+        })
+        assert values["date_order"] == datetime(2026, 3, 1, 15, 30)
+        assert (values["partner_id"], values["partner_name"]) == (5, "Cliente")
+        assert (values["tienda_id"], values["tienda_name"]) == (2, "Gamarra")
+        assert values["vendedor_id"] is None and values["vendedor_name"] is None
+        assert values["x_pagos"] is None
+        assert values["order_cancel"] == "POS/003"
+        assert values["reserva_use_id"] is None
+
+    def test_columns_follow_parse_order(self):
+        assert ORDER_COLUMNS[0] == "odoo_id"
+        assert set(parse_order({"id": 1}).keys()) == set(ORDER_COLUMN_TYPES)
+
+
+def orders_page(amount=100.0, ids=(1, 2, 3)):
+    return [{"id": i, "date_order": "2026-03-01 10:00:00", "name": f"POS/{i:03d}", "amount_total": amount + i,
+             "partner_id": [5, "Cliente"], "write_date": "2026-03-01 10:00:00"} for i in ids]
+
+
+class TestUpsertOrders:
+    """upsert_orders against Postgres (needs TEST_DATABASE_URL)"""
+
+    def run(self, testdb, *pages, estados=None):
+        """Upsert each page in turn (`estados` set after the first); returns per page the
+        id map and {odoo_id: (xmin, amount_total)}"""
+        async def main(pool):
+            results = []
+            async with pool.acquire() as conn:
+                for n, page in enumerate(pages):
+                    venta_ids = await upsert_orders(conn, page, testdb.empresa_id)
+                    for odoo_id, estado in (estados or {}).items() if n == 0 else ():
+                        await conn.execute("UPDATE finanzas2.cont_venta_pos SET estado_local = $2 WHERE odoo_id = $1",
+                                           odoo_id, estado)
+                    rows = await conn.fetch("SELECT odoo_id, xmin::text::bigint AS xmin, amount_total "
+                                            "FROM finanzas2.cont_venta_pos")
+                    results.append((venta_ids, {r['odoo_id']: (r['xmin'], float(r['amount_total'])) for r in rows}))
+            return results
+        return testdb.run(main)
+
+    def test_repeated_page_is_idempotent(self, testdb):
+        (ids1, rows1), (ids2, rows2) = self.run(testdb, orders_page(), orders_page())
+        assert ids1 == ids2 and sorted(ids1) == [1, 2, 3]
+        assert rows1 == rows2
+
+    def test_only_changed_rows_are_rewritten(self, testdb):
+        page = orders_page()
+        page2 = orders_page()
+        page2[1]["amount_total"] = 500.0
+        (ids1, rows1), (ids2, rows2) = self.run(testdb, page, page2)
+        # unchanged orders still come back so their lines are synced
+        assert ids2 == ids1
+        assert rows2[1] == rows1[1] and rows2[3] == rows1[3]
+        assert rows2[2][0] != rows1[2][0] and rows2[2][1] == 500.0
+
+    def test_processed_orders_are_left_alone(self, testdb):
+        estados = {1: "confirmada", 2: "credito", 3: "descartada"}
+        _, (ids2, rows2) = self.run(testdb, orders_page(), orders_page(amount=900.0), estados=estados)
+        assert ids2 == {}
+        assert {i: amount for i, (_, amount) in rows2.items()} == {1: 101.0, 2: 102.0, 3: 103.0}
+
+
+class TestLineSync:
+
+    def test_parse_line(self):
+        row = parse_line({"id": 11, "product_id": [100, "Polo"], "product_code": False,
+                          "qty": 2, "marca": "Ambission", "tipo": "Polo"}, venta_pos_id=5)
+        assert list(row) == LINE_COLUMNS
+        assert (row["odoo_line_id"], row["venta_pos_id"], row["product_id"]) == (11, 5, 100)
+        assert row["product_code"] == ""
+
+    def test_diff_against_existing_lines(self, testdb):
+        """Odoo adds line 14, changes 12 and drops 13; line 11 is untouched (needs TEST_DATABASE_URL)"""
+        def line(line_id, qty, product=(100, "Polo")):
+            return {"id": line_id, "product_id": list(product), "qty": qty, "price_unit": 50.0}
+
+        async def main(pool):
+            async with pool.acquire() as conn:
+                venta_ids = await upsert_orders(conn, orders_page(ids=(1,)), testdb.empresa_id)
+                antes = await sync_lines(conn, venta_ids, {1: [line(11, 1), line(12, 1), line(13, 1)]},
+                                         testdb.empresa_id)
+                xmin = await conn.fetchval("SELECT xmin::text FROM finanzas2.cont_venta_pos_linea "
+                                           "WHERE odoo_line_id = 11")
+                counts = await sync_lines(conn, venta_ids, {1: [line(11, 1), line(12, 3), line(14, 2, (101, "Jean"))]},
+                                          testdb.empresa_id)
+                rows = await conn.fetch("""
+                    SELECT odoo_line_id, product_name, qty, xmin::text AS xmin FROM finanzas2.cont_venta_pos_linea
+                    WHERE venta_pos_id = $1 ORDER BY odoo_line_id
+                """, venta_ids[1])
+                return antes, counts, rows, xmin
+
+        antes, counts, rows, xmin = testdb.run(main)
+        assert antes == {"lines_inserted": 3, "lines_updated": 0, "lines_deleted": 0}
+        assert counts == {"lines_inserted": 1, "lines_updated": 1, "lines_deleted": 1}
+        assert [(r['odoo_line_id'], r['product_name'], float(r['qty'])) for r in rows] == [
+            (11, "Polo", 1), (12, "Polo", 3), (14, "Jean", 2)]
+        # the unchanged line was not rewritten
+        assert rows[0]['xmin'] == xmin
+
+
+class TestPagination:
+
+    def test_after_cursor_is_anded(self):
+        odoo = make_service()
+        odoo.get_pos_orders(days_back=7, after=("2026-03-01 10:00:00", [42, 7]), limit=50)
+        (domain,), kwargs = odoo.models.last
+        assert domain[0][0] == 'date_order'
+        assert domain[1:] == [('write_date', '>=', "2026-03-01 10:00:00"), ('id', 'not in', [42, 7])]
+        assert kwargs['limit'] == 50
+
+
+class TestScheduler:
+
+    def test_parse_sync_targets(self):
+        assert parse_sync_targets("ambission:1, proyectomoda:2,") == [("ambission", 1), ("proyectomoda", 2)]
+        assert parse_sync_targets("") == []
+
+    def test_empresa_sync_targets(self):
+        spec = "ambission:1,proyectomoda:2,ambission:3"
+        assert empresa_sync_targets(spec, 2, ["ambission", "proyectomoda"]) == [("proyectomoda", 2)]
+        assert empresa_sync_targets(spec, 9, ["ambission", "proyectomoda"]) == []
+        assert empresa_sync_targets("", 9, ["ambission", "proyectomoda"]) == [("ambission", 9), ("proyectomoda", 9)]
+
+    def test_job_to_dict(self):
+        job = job_to_dict({
+            "id": 1, "estado": "completado", "stats": '{"synced": 3}', "error": None,
+            "started_at": datetime(2026, 3, 1, 10, 0, 0), "finished_at": datetime(2026, 3, 1, 10, 0, 12),
+        })
+        assert job["stats"] == {"synced": 3}
+        assert job["duration_seconds"] == 12.0
+        assert job_to_dict({"id": 2, "stats": None, "started_at": None})["duration_seconds"] is None
+
+
+class TestRunReport:
+
+    def job(self, company, estado, stats=None, error=None, start=0, end=None):
+        return {
+            "company": company, "empresa_id": 1, "estado": estado, "stats": stats or {}, "error": error,
+            "started_at": datetime(2026, 3, 1, 10, 0, start),
+            "finished_at": datetime(2026, 3, 1, 10, 0, end) if end is not None else None,
+        }
+
+    def test_partial_run(self):
+        report = build_run_report("r1", [
+            self.job("ambission", "completado", {"synced": 10, "fetched": 12, "mode": "full"}, start=0, end=30),
+            self.job("proyectomoda", "error", error="timeout", start=1, end=20),
+        ])
+        assert report["estado"] == "parcial"
+        assert report["totals"] == {"synced": 10, "fetched": 12}
+        assert report["errors"] == [{"company": "proyectomoda", "empresa_id": 1, "error": "timeout"}]
+        # Slowest company sets the duration
+        assert report["duration_seconds"] == 30.0
+
+    def test_scoped_to_empresa(self, testdb):
+        """A run id only reports the caller's empresa jobs (needs TEST_DATABASE_URL)"""
+        async def main(pool):
+            otra = await pool.fetchval("INSERT INTO finanzas2.cont_empresa (nombre) VALUES ('Otra') RETURNING id")
+            await pool.execute("""
+                INSERT INTO finanzas2.cont_odoo_sync_job (company, empresa_id, estado, run_id)
+                VALUES ('ambission', $1, 'completado', 'r3'), ('proyectomoda', $2, 'completado', 'r3')
+            """, testdb.empresa_id, otra)
+            scheduler = PosSyncScheduler()
+            return (await scheduler.run_report(pool, "r3", testdb.empresa_id),
+                    await scheduler.run_report(pool, "r3", otra + 1))
+
+        report, ajena = testdb.run(main)
+        assert [(j["company"], j["empresa_id"]) for j in report["jobs"]] == [("ambission", testdb.empresa_id)]
+        assert ajena is None
+
+    def test_running_run(self):
+        report = build_run_report("r2", [
+            self.job("ambission", "completado", {"synced": 1}, end=5),
+            self.job("proyectomoda", "ejecutando"),
+        ])
+        assert report["estado"] == "ejecutando"
+        assert report["duration_seconds"] is None
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    """Odoo stub with 250 orders; pos_sync gets fresh Odoo clients and product cache"""
+    server = start_stub(orders=250, lines_per_order=2)
+    monkeypatch.setenv("ODOO_URL", server.url)
+    monkeypatch.setattr(pos_sync, "odoo_clients", OdooClientRegistry())
+    monkeypatch.setattr(pos_sync, "producto_dimension", ProductoDimension())
+    yield server
+    server.shutdown()
+
+
+def sync(testdb, **kwargs):
+    async def main(pool):
+        return await sync_pos_orders(pool, "ambission", testdb.empresa_id, days_back=3650, page_size=100, **kwargs)
+    return testdb.run(main)
+
+
+def fetch(testdb, sql, *args):
+    async def main(pool):
+        return await pool.fetch(sql, *args)
+    return testdb.run(main)
+
+
+class TestSyncAgainstStub:
+
+    def test_progress_counts_each_page(self, testdb, stub):
+        progress = []
+
+        async def on_progress(stats):
+            progress.append(stats)
+
+        stats = sync(testdb, on_progress=on_progress)
+        assert [(p["pages"], p["fetched"]) for p in progress] == [(1, 100), (2, 200), (3, 250)]
+        assert progress[-1]["fetched"] == progress[-1]["total"] == stats["fetched"] == 250
+
+    @pytest.mark.parametrize("call", [("pos.order", "search_read"), ("pos.order.line", "search_read")])
+    def test_odoo_failure_on_page_two(self, testdb, stub, call):
+        stub.fail_at[call] = 2
+        with pytest.raises(xmlrpc.client.Fault):
+            sync(testdb)
+        ventas = fetch(testdb, "SELECT odoo_id FROM finanzas2.cont_venta_pos ORDER BY odoo_id")
+        assert [r['odoo_id'] for r in ventas] == list(range(1, 101))
+
+        async def watermark(pool):
+            async with pool.acquire() as conn:
+                return await get_sync_watermark(conn, "ambission", testdb.empresa_id)
+        assert testdb.run(watermark)[1] == 100
+
+    def test_pages_within_one_second(self, testdb, stub):
+        """More than a page of orders stored with microseconds in one second, id order reversed"""
+        segundo = datetime(2026, 6, 1, 12, 0, 0)
+        for order in stub.data.orders:
+            stub.data.touch({order["id"]}, segundo.replace(microsecond=1000 * (251 - order["id"])))
+
+        async def main(pool):
+            return await asyncio.wait_for(
+                sync_pos_orders(pool, "ambission", testdb.empresa_id, days_back=3650, page_size=100), timeout=30)
+
+        stats = testdb.run(main)
+        assert (stats["fetched"], stats["pages"]) == (250, 3)
+        ventas = fetch(testdb, "SELECT odoo_id FROM finanzas2.cont_venta_pos ORDER BY odoo_id")
+        assert [r['odoo_id'] for r in ventas] == list(range(1, 251))
+        # the next run starts again at that second and stops once every order there is read
+        stub.data.touch({7}, datetime(2026, 6, 1, 12, 0, 1, 500))
+        stats = testdb.run(main)
+        assert (stats["mode"], stats["fetched"], stats["pages"]) == ("incremental", 250, 3)
+
+    def test_fan_out_fits_a_small_pool(self, testdb, stub):
+        """Two companies at once on a 3-connection pool finish instead of starving each other"""
+        async def main(pool):
+            scheduler = PosSyncScheduler()
+            run = await scheduler.start_run(pool, [("ambission", testdb.empresa_id), ("proyectomoda", testdb.empresa_id)],
+                                            days_back=3650)
+            await asyncio.wait_for(asyncio.gather(*scheduler._tasks), timeout=30)
+            return await scheduler.run_report(pool, run["run_id"], testdb.empresa_id)
+
+        report = testdb.run(main, max_size=3)
+        assert report["estado"] == "completado", report["errors"]
+        assert [j["stats"]["fetched"] for j in report["jobs"]] == [250, 250]
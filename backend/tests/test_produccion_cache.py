@@ -0,0 +1,39 @@
+"""
+Test the in-memory produccion lookup index:
+1. Substring search matches ILIKE '%q%' semantics across fields (case-insensitive)
+2. Results keep the snapshot order and respect the limit
+3. Short queries (< 3 chars) still match via linear scan
+"""
+from produccion_cache import IndiceBusqueda
+
+ROWS = [
+    {"id": 1, "nombre": "Botón metálico", "codigo": "BT-001"},
+    {"id": 2, "nombre": "Cierre invisible", "codigo": "CR-010"},
+    {"id": 3, "nombre": "Hilo poliéster", "codigo": "HL-100"},
+    {"id": 4, "nombre": "Botón plástico", "codigo": None},
+]
+
+
+class TestIndiceBusqueda:
+    indice = IndiceBusqueda(ROWS, ["nombre", "codigo"])
+
+    def test_no_search_returns_first_rows(self):
+        assert [r["id"] for r in self.indice.buscar(None, 2)] == [1, 2]
+
+    def test_case_insensitive_substring(self):
+        assert [r["id"] for r in self.indice.buscar("BOTÓN", 10)] == [1, 4]
+        assert [r["id"] for r in self.indice.buscar("visib", 10)] == [2]
+
+    def test_matches_codigo(self):
+        assert [r["id"] for r in self.indice.buscar("hl-1", 10)] == [3]
+
+    def test_short_query(self):
+        assert [r["id"] for r in self.indice.buscar("10", 10)] == [2, 3]
+
+    def test_no_match_and_limit(self):
+        assert self.indice.buscar("zzz", 10) == []
+        assert len(self.indice.buscar("bot", 1)) == 1
+
+    def test_match_does_not_span_fields(self):
+        # "metálico" + "BT-001" must not match "cobt"
+        assert self.indice.buscar("cobt", 10) == []
@@ -0,0 +1,47 @@
+"""
+Test the local Odoo product dimension:
+1. Changed products are resolved against changed or already mirrored templates
+2. A template edit propagates marca/tipo to every mirrored product under it
+3. POS lines are enriched from the in-process catalog without RPC calls
+"""
+from producto_odoo import ProductoDimension, ProductoOdoo
+
+
+def dimension():
+    dim = ProductoDimension()
+    dim.productos = {
+        100: ProductoOdoo(500, "PL-1", "Ambission", "Polo"),
+        101: ProductoOdoo(500, "PL-2", "Ambission", "Polo"),
+        102: ProductoOdoo(501, "JN-1", "Basic", "Jean"),
+    }
+    return dim
+
+
+class TestMerge:
+
+    def test_new_product_under_known_template(self):
+        dim = dimension()
+        conocidos = {p.template_id: p for p in dim.productos.values()}
+        changed = dim._merge([{"id": 103, "product_tmpl_id": [501, "Jean"], "default_code": "JN-2"}], {}, conocidos)
+        assert changed == {103: ProductoOdoo(501, "JN-2", "Basic", "Jean")}
+        assert dim.productos[103].marca == "Basic"
+
+    def test_template_edit_propagates(self):
+        dim = dimension()
+        templates = {500: {"id": 500, "marca": [9, "Proyecto Moda"], "tipo": [3, "Polo"]}}
+        changed = dim._merge([], templates, {})
+        assert set(changed) == {100, 101}
+        assert dim.productos[100].marca == dim.productos[101].marca == "Proyecto Moda"
+        assert dim.productos[102].marca == "Basic"
+
+    def test_missing(self):
+        assert dimension().missing([100, 999, None, 999]) == [999]
+
+
+class TestEnrich:
+
+    def test_lines_enriched_locally(self):
+        lines = [{"id": 1, "product_id": [102, "Jean"]}, {"id": 2, "product_id": [999, "Nuevo"]}]
+        dimension().enrich(lines)
+        assert (lines[0]["product_code"], lines[0]["marca"], lines[0]["tipo"]) == ("JN-1", "Basic", "Jean")
+        assert "marca" not in lines[1]
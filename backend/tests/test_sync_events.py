@@ -0,0 +1,48 @@
+"""
+Test POS sync progress events:
+1. Without a LISTEN connection, published events reach every local subscriber
+2. A slow subscriber drops its oldest events instead of blocking publishers
+3. ETA follows the current order rate
+"""
+import asyncio
+
+from pos_sync import estimate_eta
+from sync_events import SUBSCRIBER_QUEUE_SIZE, SyncEventBus
+
+
+class TestSyncEventBus:
+
+    def test_local_fan_out(self):
+        bus = SyncEventBus()
+
+        async def scenario():
+            a, b = bus.subscribe(), bus.subscribe()
+            await bus.publish(None, {"tipo": "progreso", "job_id": 1})
+            bus.unsubscribe(b)
+            await bus.publish(None, {"tipo": "completado", "job_id": 1})
+            return [a.get_nowait()["tipo"], a.get_nowait()["tipo"]], b.qsize()
+
+        received, b_size = asyncio.run(scenario())
+        assert received == ["progreso", "completado"]
+        assert b_size == 1
+
+    def test_slow_subscriber_drops_oldest(self):
+        bus = SyncEventBus()
+
+        async def scenario():
+            q = bus.subscribe()
+            for i in range(SUBSCRIBER_QUEUE_SIZE + 5):
+                await bus.publish(None, {"n": i})
+            return q.qsize(), q.get_nowait()["n"]
+
+        size, first = asyncio.run(scenario())
+        assert size == SUBSCRIBER_QUEUE_SIZE
+        assert first == 5
+
+
+class TestEta:
+
+    def test_rate_based(self):
+        assert estimate_eta({"fetched": 200, "total": 1000}, elapsed=10.0) == 40.0
+        assert estimate_eta({"fetched": 0, "total": 1000}, elapsed=1.0) is None
+        assert estimate_eta({"fetched": 10, "total": None}, elapsed=1.0) is None
@@ -0,0 +1,57 @@
+"""
+Test as-of exchange-rate lookups:
+1. SerieTipoCambio returns the latest rate dated on or before the query date
+2. Dates before the first rate return None
+3. TipoCambioService loads lazily and reloads after invalidate()
+"""
+import asyncio
+from datetime import date
+
+from tipo_cambio_service import SerieTipoCambio, TipoCambioService
+
+
+class FakeConn:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+
+    async def fetch(self, query, *args):
+        self.queries += 1
+        return self.rows
+
+
+class TestSerieTipoCambio:
+    serie = SerieTipoCambio([
+        (date(2026, 1, 5), 3.70, 3.72),
+        (date(2026, 1, 2), 3.68, 3.71),
+        (date(2026, 1, 6), 3.69, 3.73),
+    ])
+
+    def test_exact_date(self):
+        assert self.serie.tasa(date(2026, 1, 5)) == 3.72
+        assert self.serie.tasa(date(2026, 1, 5), "compra") == 3.70
+
+    def test_gap_uses_previous_rate(self):
+        # Weekend / holiday: rate of the last registered day applies
+        assert self.serie.tasa(date(2026, 1, 4)) == 3.71
+        assert self.serie.tasa(date(2026, 3, 1)) == 3.73
+
+    def test_before_first_rate(self):
+        assert self.serie.tasa(date(2025, 12, 31)) is None
+
+
+class TestTipoCambioService:
+    def test_lazy_load_and_invalidate(self):
+        conn = FakeConn([{'fecha': date(2026, 1, 2), 'tasa_compra': 3.68, 'tasa_venta': 3.71}])
+        service = TipoCambioService()
+
+        async def run():
+            assert await service.tasa_vigente(conn, 2, date(2026, 1, 10)) == 3.71
+            assert await service.tasa_vigente(conn, 2, date(2026, 1, 11)) == 3.71
+            assert conn.queries == 1
+            service.invalidate(2)
+            await service.tasa_vigente(conn, 2, date(2026, 1, 11))
+            assert conn.queries == 2
+            assert await service.tasa_vigente(conn, None, date(2026, 1, 11)) is None
+
+        asyncio.run(run())
@@ -0,0 +1,128 @@
+import asyncio
+import bisect
+import logging
+import time
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def tipo_cambio_asof_join(moneda_col: str, fecha_col: str, alias: str = "tc") -> str:
+    """
+    SQL fragment for a set-based "rate in effect on date" lookup.
+
+    Joins each row with the latest cont_tipo_cambio row for its currency whose
+    fecha is <= the row's date. Served by UNIQUE(moneda_id, fecha), so bulk
+    conversion in reports costs one index probe per row instead of one query.
+    Exposes {alias}.tasa_compra, {alias}.tasa_venta and {alias}.tc_fecha.
+    """
+    return f"""
+        LEFT JOIN LATERAL (
+            SELECT tcx.tasa_compra, tcx.tasa_venta, tcx.fecha AS tc_fecha
+            FROM finanzas2.cont_tipo_cambio tcx
+            WHERE tcx.moneda_id = {moneda_col} AND tcx.fecha <= {fecha_col}
+            ORDER BY tcx.fecha DESC
+            LIMIT 1
+        ) {alias} ON TRUE
+    """
+
+
+def monto_principal_sql(importe: str, tasa_documento: str = "NULL", moneda_alias: str = "mon",
+                        alias: str = "tc") -> str:
+    """
+    SQL expression converting `importe` to the principal currency.
+
+    Rows whose currency ({moneda_alias}) is principal or unknown keep their
+    amount; others use the document's own rate, else the as-of rate of
+    tipo_cambio_asof_join. Without either it is NULL, never a silent 1:1;
+    pair it with tipo_cambio_faltante_sql to report those rows.
+    """
+    return (f"({importe} * CASE WHEN {moneda_alias}.es_principal IS NOT FALSE THEN 1 "
+            f"ELSE COALESCE({tasa_documento}, {alias}.tasa_venta) END)")
+
+
+def tipo_cambio_faltante_sql(fecha_col: str, tasa_documento: str = "NULL", moneda_alias: str = "mon",
+                             alias: str = "tc") -> str:
+    """Aggregate listing the distinct {moneda, fecha} of rows monto_principal_sql cannot convert"""
+    return (f"COALESCE(jsonb_agg(DISTINCT jsonb_build_object('moneda', {moneda_alias}.codigo, 'fecha', {fecha_col})) "
+            f"FILTER (WHERE {moneda_alias}.es_principal IS FALSE AND {tasa_documento} IS NULL "
+            f"AND {alias}.tasa_venta IS NULL), '[]'::jsonb)")
+
+
+class SerieTipoCambio:
+    """Sorted rate series for one currency, answering as-of lookups with bisect"""
+
+    __slots__ = ("fechas", "compra", "venta")
+
+    def __init__(self, rows: List[Tuple[date, float, float]]):
+        rows = sorted(rows, key=lambda r: r[0])
+        self.fechas = [r[0] for r in rows]
+        self.compra = [float(r[1]) for r in rows]
+        self.venta = [float(r[2]) for r in rows]
+
+    def __len__(self) -> int:
+        return len(self.fechas)
+
+    def tasa(self, fecha: date, campo: str = "venta") -> Optional[float]:
+        """Rate in effect on `fecha` (latest rate dated on or before it), or None"""
+        i = bisect.bisect_right(self.fechas, fecha)
+        if i == 0:
+            return None
+        return (self.venta if campo == "venta" else self.compra)[i - 1]
+
+
+class TipoCambioService:
+    """
+    In-memory cache of cont_tipo_cambio, one SerieTipoCambio per moneda_id.
+
+    Series load lazily on first use and are dropped by invalidate() when a rate
+    is written. max_age bounds staleness when another worker wrote the rate.
+    """
+
+    def __init__(self, max_age: float = 300.0):
+        self.max_age = max_age
+        self._series: Dict[int, SerieTipoCambio] = {}
+        self._loaded_at: Dict[int, float] = {}
+        self._lock = asyncio.Lock()
+
+    def _fresh(self, moneda_id: int) -> bool:
+        loaded_at = self._loaded_at.get(moneda_id)
+        return loaded_at is not None and time.monotonic() - loaded_at < self.max_age
+
+    async def get_serie(self, conn, moneda_id: int) -> SerieTipoCambio:
+        if self._fresh(moneda_id):
+            return self._series[moneda_id]
+        async with self._lock:
+            if self._fresh(moneda_id):
+                return self._series[moneda_id]
+            rows = await conn.fetch("""
+                SELECT fecha, tasa_compra, tasa_venta
+                FROM finanzas2.cont_tipo_cambio
+                WHERE moneda_id = $1
+                ORDER BY fecha
+            """, moneda_id)
+            serie = SerieTipoCambio([(r['fecha'], r['tasa_compra'], r['tasa_venta']) for r in rows])
+            self._series[moneda_id] = serie
+            self._loaded_at[moneda_id] = time.monotonic()
+            logger.info(f"Loaded {len(serie)} exchange rates for moneda {moneda_id}")
+            return serie
+
+    async def tasa_vigente(self, conn, moneda_id: Optional[int], fecha: Optional[date],
+                           campo: str = "venta") -> Optional[float]:
+        """Rate for `moneda_id` in effect on `fecha`; None if unknown"""
+        if not moneda_id or not fecha:
+            return None
+        serie = await self.get_serie(conn, moneda_id)
+        return serie.tasa(fecha, campo)
+
+    def invalidate(self, moneda_id: Optional[int] = None):
+        if moneda_id is None:
+            self._series.clear()
+            self._loaded_at.clear()
+        else:
+            self._series.pop(moneda_id, None)
+            self._loaded_at.pop(moneda_id, None)
+
+
+tipo_cambio_service = TipoCambioService()
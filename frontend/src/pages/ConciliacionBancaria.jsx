@@ -1,7 +1,7 @@
 import React, { useState, useEffect, useCallback } from 'react';
 import { 
   getCuentasFinancieras, getMovimientosBanco, getPagos,
-  importarExcelBanco, getConciliaciones, conciliarMovimientos, previsualizarExcelBanco,
+  importarExcelBanco, getImportacionBanco, getConciliaciones, conciliarMovimientos, previsualizarExcelBanco,
   crearGastoBancario, getCategorias
 } from '../services/api';
 import { useEmpresa } from '../context/EmpresaContext';
@@ -147,12 +147,31 @@ export const ConciliacionBancaria = () => {
     try {
       setImporting(true);
       const result = await importarExcelBanco(uploadFile, cuentaSeleccionada, bancoSeleccionado);
-      const data = result.data;
-      
+      if (result.data.duplicado) {
+        toast.info(result.data.message);
+        setShowPreviewModal(false);
+        setUploadFile(null);
+        setPreviewData(null);
+        return;
+      }
+      // The import runs as a background job; poll it until it finishes
+      let job = null;
+      do {
+        await new Promise((resolve) => setTimeout(resolve, 1500));
+        job = (await getImportacionBanco(result.data.job_id)).data;
+      } while (!['completado', 'error'].includes(job.estado));
+      const data = job.stats;
+
+      if (job.estado === 'error') {
+        toast.error(`Importación interrumpida en la fila ${job.fila_checkpoint}: ${job.error}`);
+        return;
+      }
       let msg = '';
       if (data.imported > 0) msg += `${data.imported} nuevos`;
       if (data.updated > 0) msg += `${msg ? ', ' : ''}${data.updated} actualizados`;
       if (data.skipped > 0) msg += `${msg ? ', ' : ''}${data.skipped} omitidos (ya conciliados)`;
+      if (data.repetidos > 0) msg += `${msg ? ', ' : ''}${data.repetidos} ya importados antes`;
+      if (data.errores > 0) msg += `${msg ? ', ' : ''}${data.errores} filas con error`;
       
       toast.success(msg || 'Importación completada');
       setShowPreviewModal(false);
@@ -1129,7 +1148,7 @@ export const ConciliacionBancaria = () => {
                   <input
                     id="excel-input"
                     type="file"
-                    accept=".xlsx,.xls"
+                    accept=".xlsx,.xls,.csv,.txt"
                     style={{ display: 'none' }}
                     onChange={(e) => setUploadFile(e.target.files[0])}
                   />
@@ -1146,7 +1165,7 @@ export const ConciliacionBancaria = () => {
                       <Upload size={40} color="#94a3b8" style={{ marginBottom: '0.75rem' }} />
                       <div style={{ fontWeight: 500 }}>Click para seleccionar archivo</div>
                       <div style={{ fontSize: '0.8125rem', color: '#64748b', marginTop: '0.25rem' }}>
-                        Formatos: .xlsx, .xls
+                        Formatos: .xlsx, .xls, .csv, .txt
                       </div>
                     </>
                   )}
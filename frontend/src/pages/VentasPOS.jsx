@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { 
-  getVentasPOS, syncVentasPOS, confirmarVentaPOS, desconfirmarVentaPOS,
+  getVentasPOS, syncVentasPOS, getSyncVentasPOSStatus, syncVentasPOSEventsUrl, confirmarVentaPOS, desconfirmarVentaPOS,
   marcarCreditoVentaPOS, descartarVentaPOS,
   getPagosVentaPOS, getPagosOficialesVentaPOS, addPagoVentaPOS, updatePagoVentaPOS, deletePagoVentaPOS,
   getCuentasFinancieras, getLineasVentaPOS
@@ -47,6 +47,7 @@ export const VentasPOS = () => {
   const [ventas, setVentas] = useState([]);
   const [loading, setLoading] = useState(true);
   const [syncing, setSyncing] = useState(false);
+  const [syncProgress, setSyncProgress] = useState(null);
   const [submitting, setSubmitting] = useState(false);
   const [activeTab, setActiveTab] = useState('pendiente');
   
@@ -146,17 +147,64 @@ export const VentasPOS = () => {
     }
   };
 
+  const FINAL_SYNC_STATES = ['completado', 'error', 'omitido'];
+
+  // Poll the job status; used when the event stream is unavailable
+  const pollSyncJob = async (company, jobId) => {
+    let job = null;
+    do {
+      await new Promise((resolve) => setTimeout(resolve, 2000));
+      job = (await getSyncVentasPOSStatus(company, jobId)).data.job;
+    } while (job && !FINAL_SYNC_STATES.includes(job.estado));
+    return job;
+  };
+
+  // Follow the sync job over Server-Sent Events until it finishes
+  const followSyncJob = (company, jobId) => new Promise((resolve) => {
+    const source = new EventSource(syncVentasPOSEventsUrl(company, jobId));
+    const finish = (job) => {
+      source.close();
+      setSyncProgress(null);
+      resolve(job);
+    };
+    source.addEventListener('estado', (e) => {
+      const { job } = JSON.parse(e.data);
+      if (job && FINAL_SYNC_STATES.includes(job.estado)) finish(job);
+    });
+    source.addEventListener('progreso', (e) => {
+      const { stats, eta_seconds } = JSON.parse(e.data);
+      setSyncProgress({ ...stats, eta: eta_seconds });
+    });
+    FINAL_SYNC_STATES.forEach((tipo) => source.addEventListener(tipo, (e) => {
+      const event = JSON.parse(e.data);
+      finish({ estado: tipo, stats: event.stats || {}, error: event.error });
+    }));
+    source.onerror = () => {
+      source.close();
+      pollSyncJob(company, jobId).then(finish);
+    };
+  });
+
   const handleSync = async (company) => {
     try {
       setSyncing(true);
-      const response = await syncVentasPOS(company, 30);
-      toast.success(`Sincronizadas ${response.data.synced} ventas de ${company}`);
+      const { data } = await syncVentasPOS(company, 30);
+      // Sync runs in the background; follow its job until it finishes
+      const job = await followSyncJob(company, data.job_id);
+      if (job?.estado === 'completado') {
+        toast.success(`Sincronizadas ${job.stats.synced ?? 0} ventas de ${company}`);
+      } else if (job?.estado === 'omitido') {
+        toast.info(`Ya hay una sincronización en curso para ${company}`);
+      } else {
+        toast.error(`Error al sincronizar con Odoo: ${job?.error || 'desconocido'}`);
+      }
       loadVentas();
     } catch (error) {
       console.error('Error syncing:', error);
       toast.error('Error al sincronizar con Odoo');
     } finally {
       setSyncing(false);
+      setSyncProgress(null);
     }
   };
 
@@ -580,6 +628,12 @@ export const VentasPOS = () => {
             <RefreshCw size={18} className={syncing ? 'animate-spin' : ''} />
             Sync Proyecto Moda
           </button>
+          {syncProgress && (
+            <span style={{ alignSelf: 'center', fontSize: '0.875rem', color: 'var(--muted)' }} data-testid="sync-progress">
+              {syncProgress.fetched}{syncProgress.total ? ` / ${syncProgress.total}` : ''} pedidos
+              {syncProgress.eta != null ? ` · ~${Math.ceil(syncProgress.eta)} s` : ''}
+            </span>
+          )}
         </div>
       </div>
 
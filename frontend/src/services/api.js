@@ -146,6 +146,15 @@ export const pagarPlanilla = (id, cuentaFinancieraId) =>
 export const getVentasPOS = (params) => api.get('/ventas-pos', { params });
 export const syncVentasPOS = (company, days) => 
   api.post(`/ventas-pos/sync?company=${company}&days_back=${days}`);
+export const getSyncVentasPOSStatus = (company, jobId) => 
+  api.get('/ventas-pos/sync/status', { params: { company, job_id: jobId } });
+// EventSource can't use the axios interceptor, so empresa_id goes in the URL
+export const syncVentasPOSEventsUrl = (company, jobId) => {
+  const params = new URLSearchParams({ company, job_id: jobId });
+  const empresaId = localStorage.getItem('empresaActualId');
+  if (empresaId) params.set('empresa_id', empresaId);
+  return `${API}/ventas-pos/sync/events?${params}`;
+};
 export const confirmarVentaPOS = (id) => api.post(`/ventas-pos/${id}/confirmar`);
 export const desconfirmarVentaPOS = (id) => api.post(`/ventas-pos/${id}/desconfirmar`);
 export const marcarCreditoVentaPOS = (id, fechaVencimiento) => 
@@ -159,6 +168,9 @@ export const getPagosOficialesVentaPOS = (ventaId) => api.get(`/ventas-pos/${ven
 export const addPagoVentaPOS = (ventaId, pago) => api.post(`/ventas-pos/${ventaId}/pagos`, pago);
 export const updatePagoVentaPOS = (ventaId, pagoId, pago) => api.put(`/ventas-pos/${ventaId}/pagos/${pagoId}`, pago);
 export const deletePagoVentaPOS = (ventaId, pagoId) => api.delete(`/ventas-pos/${ventaId}/pagos/${pagoId}`);
+export const getPagosOdooVentaPOS = (ventaId) => api.get(`/ventas-pos/${ventaId}/pagos-odoo`);
+// data: { cuentas: { 'Efectivo': cuentaId, ... }, venta_ids?, fecha_desde?, fecha_hasta? }
+export const aceptarPagosOdooVentasPOS = (data) => api.post('/ventas-pos/pagos-odoo/aceptar', data);
 
 // Ventas POS - Líneas de productos
 export const getLineasVentaPOS = (ventaId) => api.get(`/ventas-pos/${ventaId}/lineas`);
@@ -186,6 +198,8 @@ export const importarExcelBanco = (file, cuentaFinancieraId, banco) => {
     headers: { 'Content-Type': 'multipart/form-data' },
   });
 };
+export const getImportacionBanco = (jobId) => api.get(`/conciliacion/importaciones/${jobId}`);
+export const reanudarImportacionBanco = (jobId) => api.post(`/conciliacion/importaciones/${jobId}/reanudar`);
 export const previsualizarExcelBanco = (file, banco) => {
   const formData = new FormData();
   formData.append('file', file);
@@ -193,6 +207,9 @@ export const previsualizarExcelBanco = (file, banco) => {
     headers: { 'Content-Type': 'multipart/form-data' },
   });
 };
+export const getPropuestasConciliacion = (params) => api.get('/conciliacion/propuestas', { params });
+// data: { cuenta_financiera_id, pares?: [{ banco_id, pago_id }], score_minimo?, fecha_desde?, fecha_hasta? }
+export const aceptarPropuestasConciliacion = (data) => api.post('/conciliacion/propuestas/aceptar', data);
 export const conciliarMovimientos = (bancoIds, pagoIds) => {
   const params = new URLSearchParams();
   bancoIds.forEach(id => params.append('banco_ids', id));